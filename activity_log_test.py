@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+import requests
+import sys
+import json
+from datetime import datetime, timezone, timedelta
+
+class ActivityLogTester:
+    def __init__(self, base_url="https://swayatta-admin.preview.emergentagent.com"):
+        self.base_url = base_url
+        self.api_url = f"{base_url}/api"
+        self.token = None
+        self.user_id = None
+        self.tests_run = 0
+        self.tests_passed = 0
+
+    def log_test(self, name, success, details=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name} - PASSED {details}")
+        else:
+            print(f"❌ {name} - FAILED {details}")
+        return success
+
+    def make_request(self, method, endpoint, data=None, expected_status=200, params=None):
+        """Make HTTP request with proper headers"""
+        url = f"{self.api_url}/{endpoint}"
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+
+        try:
+            if method == 'GET':
+                response = requests.get(url, headers=headers, params=params, timeout=10)
+            elif method == 'POST':
+                response = requests.post(url, json=data, headers=headers, timeout=10)
+
+            success = response.status_code == expected_status
+            return success, response.status_code, response.json() if response.content else {}
+
+        except requests.exceptions.RequestException as e:
+            return False, 0, {"error": str(e)}
+        except json.JSONDecodeError:
+            return False, response.status_code, {"error": "Invalid JSON response"}
+
+    def test_login(self):
+        """Test login functionality"""
+        print("\n🔐 Testing Authentication...")
+
+        # Produce a failed login so the status filter has something to find
+        self.make_request('POST', 'auth/login', {"username": "admin", "password": "wrong-password"}, 401)
+
+        success, status, response = self.make_request(
+            'POST', 'auth/login',
+            {"username": "admin", "password": "admin123"}
+        )
+
+        if success and 'access_token' in response:
+            self.token = response['access_token']
+            self.user_id = response['user']['id']
+            return self.log_test("Admin Login", True, f"Token received")
+        else:
+            return self.log_test("Admin Login", False, f"Status: {status}, Response: {response}")
+
+    def test_filters(self):
+        """Test filtering by user, action and status"""
+        print("\n🔎 Testing Activity Log Filters...")
+
+        success, status, response = self.make_request(
+            'GET', 'activity-logs/search',
+            params={"user_id": self.user_id, "action": "login", "status": "success"}
+        )
+        if not success:
+            return self.log_test("Filter By User/Action/Status", False, f"Status: {status}")
+
+        logs = response.get('logs', [])
+        matches = all(
+            log['user_id'] == self.user_id and log['action'] == "login" and log['status'] == "success"
+            for log in logs
+        )
+        user_filter_success = self.log_test("Filter By User/Action/Status", matches and len(logs) > 0,
+                                            f"Found {len(logs)} matching logs")
+
+        success, status, response = self.make_request(
+            'GET', 'activity-logs/search',
+            params={"module": "auth", "action": "login", "status": "fail"}
+        )
+        failed_logs = response.get('logs', []) if success else []
+        fail_filter_success = self.log_test("Filter Failed Logins", success and len(failed_logs) > 0 and
+                                            all(log['status'] == "fail" for log in failed_logs),
+                                            f"Found {len(failed_logs)} failed logins")
+
+        return user_filter_success and fail_filter_success
+
+    def test_time_range(self):
+        """Test start/end time range filtering"""
+        print("\n🕒 Testing Time Range...")
+
+        end = datetime.now(timezone.utc) - timedelta(days=3650)
+        success, status, response = self.make_request(
+            'GET', 'activity-logs/search', params={"end": end.isoformat()}
+        )
+        return self.log_test("Time Range Excludes Recent Logs", success and response.get('logs') == [],
+                             f"Status: {status}")
+
+    def test_cursor_pagination(self):
+        """Test that cursor pages are disjoint and ordered newest first"""
+        print("\n📄 Testing Cursor Pagination...")
+
+        success, status, first_page = self.make_request('GET', 'activity-logs/search', params={"limit": 2})
+        if not success or not first_page.get('next_cursor'):
+            return self.log_test("Cursor Pagination", False, f"Status: {status}, Response: {first_page}")
+
+        success, status, second_page = self.make_request(
+            'GET', 'activity-logs/search', params={"limit": 2, "cursor": first_page['next_cursor']}
+        )
+        if not success:
+            return self.log_test("Cursor Pagination", False, f"Status: {status}")
+
+        first_ids = {log['id'] for log in first_page['logs']}
+        second_ids = {log['id'] for log in second_page['logs']}
+        ordered = all(
+            first_page['logs'][-1]['created_at'] >= log['created_at'] for log in second_page['logs']
+        )
+        return self.log_test("Cursor Pagination", not (first_ids & second_ids) and ordered,
+                             f"Page sizes: {len(first_ids)}, {len(second_ids)}")
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        success, status, response = self.make_request(
+            'GET', 'activity-logs/search', params={"cursor": "not-a-cursor"}, expected_status=400
+        )
+        return self.log_test("Invalid Cursor Rejected", success, f"Status: {status}")
+
+    def run_activity_log_tests(self):
+        """Run all Activity Log tests"""
+        print("🚀 Starting Activity Log API Tests")
+        print("=" * 60)
+
+        if not self.test_login():
+            print("\n❌ Authentication failed. Cannot proceed with other tests.")
+            return False
+
+        test_results = []
+        test_results.append(("Filters", self.test_filters()))
+        test_results.append(("Time Range", self.test_time_range()))
+        test_results.append(("Cursor Pagination", self.test_cursor_pagination()))
+        test_results.append(("Invalid Cursor", self.test_invalid_cursor()))
+
+        print("\n" + "=" * 60)
+        print(f"📊 ACTIVITY LOG TEST SUMMARY")
+        print(f"Tests Run: {self.tests_run}")
+        print(f"Tests Passed: {self.tests_passed}")
+        print(f"Tests Failed: {self.tests_run - self.tests_passed}")
+        print(f"Success Rate: {(self.tests_passed/self.tests_run)*100:.1f}%")
+
+        print(f"\n📋 ACTIVITY LOG TEST RESULTS:")
+        for test_name, result in test_results:
+            status = "✅ PASSED" if result else "❌ FAILED"
+            print(f"   {test_name}: {status}")
+
+        return self.tests_passed == self.tests_run
+
+def main():
+    tester = ActivityLogTester()
+    success = tester.run_activity_log_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
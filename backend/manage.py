@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Maintenance commands for the backend.
+
+Run from the backend directory with the same environment as the API:
+
+    python manage.py rebuild-rollups
+    python manage.py rebuild-pipeline
+    python manage.py reconcile-counters
+    python manage.py archive-logs --older-than-days 30
+"""
+
+import asyncio
+from typing import Optional
+
+import typer
+
+import server
+
+app = typer.Typer(help="Backend maintenance commands")
+
+def run(coro):
+    """Run one command's coroutine, then close the Mongo client"""
+    try:
+        return asyncio.run(coro)
+    finally:
+        server.client.close()
+
+@app.command("rebuild-rollups")
+def rebuild_rollups():
+    """Recompute the sales dashboard rollups from the companies collection"""
+    async def rebuild():
+        if not await server.acquire_lease("sales_rollup_rebuild", 300):
+            typer.echo("A rebuild is already running", err=True)
+            raise typer.Exit(code=1)
+        try:
+            return await server.rebuild_sales_rollups()
+        finally:
+            await server.release_lease("sales_rollup_rebuild")
+
+    typer.echo(f"Rebuilt {run(rebuild())} rollup documents")
+
+@app.command("rebuild-pipeline")
+def rebuild_pipeline():
+    """Recompute the opportunity stage totals from the opportunities collection"""
+    async def rebuild():
+        if not await server.acquire_lease("pipeline_rebuild", 300):
+            typer.echo("A rebuild is already running", err=True)
+            raise typer.Exit(code=1)
+        try:
+            return await server.rebuild_pipeline_totals()
+        finally:
+            await server.release_lease("pipeline_rebuild")
+
+    typer.echo(f"Rebuilt {run(rebuild())} stage total documents")
+
+@app.command("reconcile-counters")
+def reconcile_counters():
+    """Repair company contact counters and SPOC pointers that drifted"""
+    typer.echo(f"Repaired counters on {run(server.reconcile_company_counters())} companies")
+
+@app.command("archive-logs")
+def archive_logs(older_than_days: Optional[int] = typer.Option(None, help="Defaults to ACTIVITY_LOG_ARCHIVE_AFTER_DAYS")):
+    """Move old activity logs into the gzipped NDJSON archive"""
+    typer.echo(f"Archived {run(server.archive_activity_logs(older_than_days))} activity logs")
+
+if __name__ == "__main__":
+    app()
@@ -1,36 +1,312 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Body, status, UploadFile, File, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.routing import APIRoute
 from motor.motor_asyncio import AsyncIOMotorClient
+import pymongo
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne, monitoring
+from pymongo.collation import Collation
+from pymongo.errors import OperationFailure, DuplicateKeyError, BulkWriteError, PyMongoError
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from pydantic import ValidationError
 from pydantic import BaseModel, Field, EmailStr
 from datetime import datetime, timezone, timedelta
 from typing import List, Optional, Dict, Any
 import os
+import asyncio
+import time
+import gzip
+import hashlib
+import math
+import socket
 import jwt
 import bcrypt
 import uuid
 import json
+import base64
+import csv
+import io
 import logging
+import threading
+import contextvars
+import anyio
+import numpy as np
+import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
+from urllib.parse import quote
 from pathlib import Path
 from dotenv import load_dotenv
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection pool. A request that cannot get a connection within
+# MONGO_WAIT_QUEUE_TIMEOUT_MS fails fast (503) instead of queueing behind slow queries.
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '5'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+# zstd and snappy need the zstandard / python-snappy packages; zlib is always available
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', 'zlib')
+MONGO_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', '-1'))
+
+# Route classes: a per-request query time budget (None = unbounded) and where reads may go.
+# Secondary reads can lag the primary by up to MONGO_MAX_STALENESS_SECONDS.
+DB_ROUTE_CLASSES = {
+    "default": {
+        "budget_ms": int(os.environ.get('MONGO_DEFAULT_BUDGET_MS', '5000')),
+        "read_preference": "primary"
+    },
+    "search": {
+        "budget_ms": int(os.environ.get('MONGO_SEARCH_BUDGET_MS', '3000')),
+        "read_preference": os.environ.get('MONGO_SEARCH_READ_PREFERENCE', 'primary')
+    },
+    "reporting": {
+        "budget_ms": int(os.environ.get('MONGO_REPORTING_BUDGET_MS', '15000')),
+        "read_preference": os.environ.get('MONGO_REPORTING_READ_PREFERENCE', 'primary')
+    },
+    # Uploads, imports and bulk edits: bounded by the pool wait timeout only
+    "bulk": {"budget_ms": None, "read_preference": "primary"},
+}
+
+# Endpoint function name -> route class; endpoints not listed are "default"
+ENDPOINT_ROUTE_CLASSES = {
+    "get_companies": "search",
+    "get_contacts": "search",
+    "get_leads": "search",
+    "get_opportunities": "search",
+    "get_activity_logs": "search",
+    "search_activity_logs": "search",
+    "get_sales_dashboard": "reporting",
+    "get_opportunity_pipeline": "reporting",
+    "get_company_hierarchy": "reporting",
+    "get_document_usage": "reporting",
+    "export_users": "reporting",
+    "export_roles": "reporting",
+    "export_companies": "reporting",
+    "export_contacts": "reporting",
+    "export_import_job_errors": "reporting",
+    "upload_company_document": "bulk",
+    "import_contacts": "bulk",
+    "import_companies": "bulk",
+    "bulk_update_contacts": "bulk",
+    "rebuild_sales_dashboard": "bulk",
+}
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+class DatabaseMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool usage and query budget timeouts for this worker"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.checkout_failures: Dict[str, int] = {}
+        self.timeouts: Dict[str, int] = {}
+        self.avoided_queries: Dict[str, int] = {}
+    
+    def record_timeout(self, route_class: str, path: str):
+        with self.lock:
+            for key in (route_class, f"{route_class} {path}"):
+                self.timeouts[key] = self.timeouts.get(key, 0) + 1
+    
+    def record_avoided(self, avoided: Dict[str, int]):
+        with self.lock:
+            for kind, count in avoided.items():
+                self.avoided_queries[kind] = self.avoided_queries.get(kind, 0) + count
+    
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "checkout_failures": dict(self.checkout_failures),
+                "timeouts": dict(self.timeouts),
+                "avoided_queries": dict(self.avoided_queries)
+            }
+    
+    def connection_checked_out(self, event):
+        with self.lock:
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+    
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.checked_out -= 1
+    
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+    
+    # Remaining pool events are not tracked
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+db_metrics = DatabaseMetrics()
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    compressors=MONGO_COMPRESSORS,
+    appname="sawayatta-erp",
+    event_listeners=[db_metrics]
+)
 db = client[os.environ['DB_NAME']]
 
+def route_database(read_preference: str):
+    """Database handle reading with the given preference"""
+    if read_preference == "primary":
+        return db
+    return client.get_database(
+        os.environ['DB_NAME'],
+        read_preference=READ_PREFERENCES[read_preference](max_staleness=MONGO_MAX_STALENESS_SECONDS)
+    )
+
+route_databases = {name: route_database(c["read_preference"]) for name, c in DB_ROUTE_CLASSES.items()}
+current_route_class: contextvars.ContextVar[str] = contextvars.ContextVar("current_route_class", default="default")
+
+def read_db():
+    """Database for reads that tolerate replica lag, per the current route class's read preference"""
+    return route_databases[current_route_class.get()]
+
+class DatabaseBudgetRoute(APIRoute):
+    """Runs each endpoint (dependencies included) under its route class's query budget.
+    pymongo turns the remaining budget into maxTimeMS on every query; a timeout becomes a 503.
+    Also carries the route's access rules from ROUTE_PERMISSIONS, which authorize_route enforces."""
+    
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        self.access_rules = {method: route_access_rule(method, self.path) for method in self.methods}
+    
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        route_class = ENDPOINT_ROUTE_CLASSES.get(self.endpoint.__name__, "default")
+        budget_ms = DB_ROUTE_CLASSES[route_class]["budget_ms"]
+        
+        async def budgeted_handler(request: Request) -> Response:
+            request.scope["route"] = self  # read by authorize_route
+            token = current_route_class.set(route_class)
+            try:
+                with pymongo.timeout(budget_ms / 1000 if budget_ms else None):
+                    return await handler(request)
+            except PyMongoError as e:
+                if not e.timeout:
+                    raise
+                db_metrics.record_timeout(route_class, self.path)
+                logger.warning(f"Database timeout on {request.method} {self.path} ({route_class}, budget {budget_ms}ms): {e}")
+                return JSONResponse(
+                    status_code=503,
+                    content={"detail": "The database is busy. Please retry shortly."},
+                    headers={"Retry-After": "1"}
+                )
+            finally:
+                current_route_class.reset(token)
+        
+        return budgeted_handler
+
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'sawayatta-erp-super-secret-key-2024')
 JWT_ALGORITHM = 'HS256'
-JWT_EXPIRATION_HOURS = 24
+# Access tokens are short-lived; clients renew them with a refresh token, which rotates on every use
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', '15'))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRE_DAYS', '7'))
+
+# Revoked token ids are kept in MongoDB until the tokens they block would have expired anyway, and
+# pulled into each worker's in-memory denylist every TOKEN_REVOCATION_SYNC_SECONDS. Each pull
+# re-reads the last TOKEN_REVOCATION_SYNC_OVERLAP_SECONDS to tolerate clock skew between workers.
+TOKEN_REVOCATION_SYNC_SECONDS = float(os.environ.get('TOKEN_REVOCATION_SYNC_SECONDS', '2'))
+TOKEN_REVOCATION_SYNC_OVERLAP_SECONDS = 30
+TOKEN_REVOCATION_LEEWAY_SECONDS = 60
+TOKEN_DENYLIST_CAPACITY = int(os.environ.get('TOKEN_DENYLIST_CAPACITY', '10000'))
+
+# Activity log retention (enforced by a TTL index on created_at)
+ACTIVITY_LOG_RETENTION_DAYS = int(os.environ.get('ACTIVITY_LOG_RETENTION_DAYS', '90'))
+ACTIVITY_LOG_MAX_PAGE_SIZE = 500
+
+# Activity log archival: entries older than N days move to gzipped NDJSON partitions on disk
+ACTIVITY_LOG_ARCHIVE_ENABLED = os.environ.get('ACTIVITY_LOG_ARCHIVE_ENABLED', 'true').lower() == 'true'
+ACTIVITY_LOG_ARCHIVE_AFTER_DAYS = int(os.environ.get('ACTIVITY_LOG_ARCHIVE_AFTER_DAYS', '30'))
+ACTIVITY_LOG_ARCHIVE_DIR = Path(os.environ.get('ACTIVITY_LOG_ARCHIVE_DIR', str(ROOT_DIR / 'archives' / 'activity_logs')))
+ACTIVITY_LOG_ARCHIVE_INTERVAL_SECONDS = int(os.environ.get('ACTIVITY_LOG_ARCHIVE_INTERVAL_SECONDS', '3600'))
+ACTIVITY_LOG_ARCHIVE_BATCH_SIZE = 5000
+
+# Bulk import jobs
+IMPORT_UPLOAD_DIR = ROOT_DIR / 'uploads' / 'imports'
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '2000'))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Bulk contact operations: ids per request, and operations per bulk_write
+CONTACT_BULK_MAX_IDS = 50000
+CONTACT_BULK_CHUNK_SIZE = 10000
+
+# Per-company contact counters are recomputed from the contacts this often (one worker, via a lease)
+COMPANY_COUNTER_RECONCILE_INTERVAL_SECONDS = int(os.environ.get('COMPANY_COUNTER_RECONCILE_INTERVAL_SECONDS', '86400'))
+
+# Company documents
+COMPANY_DOCUMENT_DIR = ROOT_DIR / 'uploads' / 'company_documents'
+COMPANY_DOCUMENT_MAX_BYTES = 10 * 1024 * 1024
+COMPANY_DOCUMENT_BLOB_DIR = COMPANY_DOCUMENT_DIR / 'blobs'
+COMPANY_DOCUMENT_INCOMING_DIR = COMPANY_DOCUMENT_DIR / 'incoming'
+DOCUMENT_GC_GRACE_HOURS = int(os.environ.get('DOCUMENT_GC_GRACE_HOURS', '24'))
+DOCUMENT_GC_INTERVAL_SECONDS = int(os.environ.get('DOCUMENT_GC_INTERVAL_SECONDS', '3600'))
+COMPANY_DOCUMENT_TYPES = [
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "image/png",
+    "image/jpeg"
+]
+DOCUMENT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# Document storage backend: "local" (COMPANY_DOCUMENT_DIR) or "s3" (any S3-compatible service;
+# set S3_ENDPOINT_URL for MinIO or another stand-in)
+DOCUMENT_STORAGE_BACKEND = os.environ.get('DOCUMENT_STORAGE_BACKEND', 'local')
+S3_BUCKET = os.environ.get('S3_BUCKET', '')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None
+S3_REGION = os.environ.get('S3_REGION', 'us-east-1')
+S3_KEY_PREFIX = os.environ.get('S3_KEY_PREFIX', 'company_documents/')
+S3_MULTIPART_PART_SIZE = int(os.environ.get('S3_MULTIPART_PART_SIZE', str(8 * 1024 * 1024)))  # S3 minimum is 5MB
+S3_PRESIGNED_URL_EXPIRY_SECONDS = int(os.environ.get('S3_PRESIGNED_URL_EXPIRY_SECONDS', '300'))
+
+# Per-worker cache of master data id -> name maps used to expand references
+MASTER_DATA_CACHE_TTL_SECONDS = int(os.environ.get('MASTER_DATA_CACHE_TTL_SECONDS', '300'))
+
+# Per-worker cache of compiled role permission sets. RBAC edits clear it in the worker that made
+# them; other workers pick the change up within the TTL.
+ROLE_PERMISSION_CACHE_TTL_SECONDS = int(os.environ.get('ROLE_PERMISSION_CACHE_TTL_SECONDS', '30'))
+
+# Case-insensitive equality for emails and names; matching indexes are built with the same collation
+CASE_INSENSITIVE = Collation(locale="en", strength=2)
+
+# Identifies this worker process when holding leases on shared background jobs
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+PROCESS_STARTED_AT = time.time()
+
+# Startup seeding runs in one worker under a lease; the others wait up to STARTUP_SEED_WAIT_SECONDS
+STARTUP_SEED_LEASE_SECONDS = 120
+STARTUP_SEED_WAIT_SECONDS = int(os.environ.get('STARTUP_SEED_WAIT_SECONDS', '30'))
 
 # Create the main app
 app = FastAPI(title="Sawayatta ERP API", version="1.0.0")
-api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # CORS Middleware
 app.add_middleware(
@@ -39,6 +315,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Configure logging
@@ -86,6 +363,7 @@ class Role(BaseAuditModel):
     name: str
     code: Optional[str] = None
     description: Optional[str] = None
+    parent_role_ids: List[str] = []  # inherits their effective permissions
 
 class Permission(BaseAuditModel):
     name: str
@@ -109,6 +387,7 @@ class RolePermission(BaseAuditModel):
     module_id: str
     menu_id: str
     permission_id: str
+    effect: str = Field(default="allow", pattern=r"^(allow|deny)$")  # deny removes an inherited grant
 
 class Department(BaseAuditModel):
     name: str
@@ -203,16 +482,60 @@ class Lead(BaseAuditModel):
     owner_user_id: Optional[str] = None
     expected_value: Optional[float] = None
     currency: str = "USD"
+    converted_opportunity_id: Optional[str] = None
 
 class Opportunity(BaseAuditModel):
     name: str
     company_id: Optional[str] = None
+    lead_id: Optional[str] = None
     stage: str = "Qualification"  # Qualification/Proposal/Negotiation/Won/Lost
     amount: Optional[float] = None
     currency: str = "USD"
     close_date: Optional[datetime] = None
     owner_user_id: Optional[str] = None
 
+class LeadCreate(BaseModel):
+    title: str = Field(..., min_length=1, max_length=200)
+    company_id: Optional[str] = None
+    contact_id: Optional[str] = None
+    source: Optional[str] = Field(None, max_length=100)
+    status: str = Field(default="New", pattern=r"^(New|Qualified|Disqualified)$")
+    owner_user_id: Optional[str] = None
+    expected_value: Optional[float] = Field(None, ge=0)
+    currency: str = Field(default="USD", min_length=3, max_length=3)
+
+class LeadUpdate(BaseModel):
+    title: Optional[str] = Field(None, min_length=1, max_length=200)
+    company_id: Optional[str] = None
+    contact_id: Optional[str] = None
+    source: Optional[str] = Field(None, max_length=100)
+    status: Optional[str] = Field(None, pattern=r"^(New|Qualified|Disqualified)$")
+    owner_user_id: Optional[str] = None
+    expected_value: Optional[float] = Field(None, ge=0)
+    currency: Optional[str] = Field(None, min_length=3, max_length=3)
+
+class OpportunityCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=200)
+    company_id: Optional[str] = None
+    stage: str = Field(default="Qualification", pattern=r"^(Qualification|Proposal|Negotiation|Won|Lost)$")
+    amount: Optional[float] = Field(None, ge=0)
+    currency: str = Field(default="USD", min_length=3, max_length=3)
+    close_date: Optional[datetime] = None
+    owner_user_id: Optional[str] = None
+
+class OpportunityUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=200)
+    company_id: Optional[str] = None
+    stage: Optional[str] = Field(None, pattern=r"^(Qualification|Proposal|Negotiation|Won|Lost)$")
+    amount: Optional[float] = Field(None, ge=0)
+    currency: Optional[str] = Field(None, min_length=3, max_length=3)
+    close_date: Optional[datetime] = None
+    owner_user_id: Optional[str] = None
+
+class ActivityLogPage(BaseModel):
+    logs: List[ActivityLog]
+    next_cursor: Optional[str] = None
+
 # Auth Models
 class LoginRequest(BaseModel):
     username: str
@@ -220,9 +543,196 @@ class LoginRequest(BaseModel):
 
 class LoginResponse(BaseModel):
     access_token: str
+    refresh_token: str
     token_type: str = "bearer"
+    expires_in: int
     user: Dict[str, Any]
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class PermissionCheck(BaseModel):
+    permission: str
+    module: Optional[str] = None
+    menu: Optional[str] = None
+    path: Optional[str] = None  # a menu path, instead of module and menu
+
+class PermissionCheckRequest(BaseModel):
+    checks: List[PermissionCheck] = Field(..., max_length=500)
+
+class TokenResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
+# ================ REQUEST CONTEXT ================
+
+class RequestContext:
+    """What the current request has already loaded: the user, role permission sets and reference
+    names. Repeated lookups within the request are answered from here and counted in `avoided`
+    (lookups that would otherwise have gone to MongoDB or the worker-wide caches), per kind."""
+    
+    def __init__(self):
+        self.user: Optional[User] = None
+        self.permission_sets: Dict[str, Any] = {}  # role_id -> RolePermissionSet
+        self.reference_names: Dict[str, Dict[str, Optional[str]]] = {}  # collection -> {id: name}
+        self.avoided: Dict[str, int] = {}
+    
+    def record_avoided(self, kind: str, count: int = 1):
+        if count:
+            self.avoided[kind] = self.avoided.get(kind, 0) + count
+
+# Set by the bind_request_context middleware; None outside a request (startup, background tasks)
+request_context: contextvars.ContextVar[Optional[RequestContext]] = contextvars.ContextVar("request_context", default=None)
+
+def record_avoided(kind: str, count: int = 1):
+    context = request_context.get()
+    if context:
+        context.record_avoided(kind, count)
+
+# ================ TOKEN REVOCATION ================
+
+class BloomFilter:
+    """Fixed-size bit array over string keys: "definitely absent" or "maybe present".
+    Sized for `capacity` keys at roughly `error_rate` false positives."""
+    
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+    
+    def positions(self, key: str):
+        # Double hashing: hash_count positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+    
+    def add(self, key: str):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+    
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+class TokenDenylist:
+    """This worker's copy of the revoked token ids. The bloom filter answers the common case (not
+    revoked) outright; its hits are confirmed against the exact map, which also holds each id's
+    expiry so entries are dropped once the tokens they block could no longer be used."""
+    
+    def __init__(self, capacity: int = TOKEN_DENYLIST_CAPACITY):
+        self.capacity = capacity
+        self.expires: Dict[str, float] = {}  # token id -> unix time after which it can be forgotten
+        self.bloom = BloomFilter(capacity)
+        self.synced_through: Optional[datetime] = None  # latest revoked_at pulled from MongoDB
+    
+    def add(self, token_id: str, expires_at: float):
+        if token_id in self.expires:
+            self.expires[token_id] = max(self.expires[token_id], expires_at)
+            return
+        self.expires[token_id] = expires_at
+        if len(self.expires) > self.capacity:
+            self.rebuild()
+        else:
+            self.bloom.add(token_id)
+    
+    def is_revoked(self, *token_ids: Optional[str]) -> bool:
+        return any(token_id and token_id in self.bloom and token_id in self.expires for token_id in token_ids)
+    
+    def prune(self, now: float):
+        expired = [token_id for token_id, expires_at in self.expires.items() if expires_at <= now]
+        for token_id in expired:
+            del self.expires[token_id]
+        if expired:
+            self.rebuild()
+    
+    def rebuild(self):
+        # A bloom filter cannot remove keys, and overfilling it raises the false positive rate
+        self.capacity = max(self.capacity, 2 * len(self.expires))
+        self.bloom = BloomFilter(self.capacity)
+        for token_id in self.expires:
+            self.bloom.add(token_id)
+
+token_denylist = TokenDenylist()
+
+def revocation_expiry() -> datetime:
+    """How long a revoked id must be remembered: until any access token it covers has expired"""
+    return datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES, seconds=TOKEN_REVOCATION_LEEWAY_SECONDS)
+
+async def revoke_token_ids(token_ids: List[str], user_id: Optional[str]):
+    """Deny access tokens carrying any of these ids (jti or sid): in this worker at once, in the
+    others at their next sync"""
+    if not token_ids:
+        return
+    now = datetime.now(timezone.utc)
+    expires_at = revocation_expiry()
+    await db.revoked_tokens.insert_many([
+        {"jti": token_id, "user_id": user_id, "revoked_at": now, "expires_at": expires_at}
+        for token_id in token_ids
+    ])
+    for token_id in token_ids:
+        token_denylist.add(token_id, expires_at.timestamp())
+
+async def revoke_sessions(query: dict) -> int:
+    """End the matching login sessions: their refresh tokens stop working and their access tokens
+    are denied by session id"""
+    sessions = await db.auth_sessions.find(
+        {**query, "revoked_at": None}, {"_id": 0, "id": 1, "user_id": 1}
+    ).to_list(None)
+    if not sessions:
+        return 0
+    session_ids = [session["id"] for session in sessions]
+    await db.auth_sessions.update_many(
+        {"id": {"$in": session_ids}}, {"$set": {"revoked_at": datetime.now(timezone.utc)}}
+    )
+    for user_id in {session["user_id"] for session in sessions}:
+        await revoke_token_ids([session["id"] for session in sessions if session["user_id"] == user_id], user_id)
+    return len(sessions)
+
+def session_tokens(user_id: str, session_id: str, refresh_token_id: str) -> dict:
+    return {
+        "access_token": create_access_token(user_id, session_id),
+        "refresh_token": create_refresh_token(user_id, session_id, refresh_token_id),
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+async def start_session(user_id: str) -> dict:
+    """Record a login session and issue its first token pair"""
+    now = datetime.now(timezone.utc)
+    session = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "refresh_jti": uuid.uuid4().hex,
+        "created_at": now,
+        "refreshed_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        "revoked_at": None
+    }
+    await db.auth_sessions.insert_one(session)
+    return session_tokens(user_id, session["id"], session["refresh_jti"])
+
+async def sync_token_denylist():
+    """Pull ids revoked by other workers since the last sync into this worker's denylist"""
+    query = {"expires_at": {"$gt": datetime.now(timezone.utc)}}
+    if token_denylist.synced_through:
+        query["revoked_at"] = {
+            "$gte": token_denylist.synced_through - timedelta(seconds=TOKEN_REVOCATION_SYNC_OVERLAP_SECONDS)
+        }
+    async for entry in db.revoked_tokens.find(query, {"_id": 0, "jti": 1, "revoked_at": 1, "expires_at": 1}):
+        token_denylist.add(entry["jti"], entry["expires_at"].replace(tzinfo=timezone.utc).timestamp())
+        if not token_denylist.synced_through or entry["revoked_at"] > token_denylist.synced_through:
+            token_denylist.synced_through = entry["revoked_at"]
+    token_denylist.prune(time.time())
+
+async def run_token_denylist_sync():
+    """Keep this worker's denylist current; every worker runs its own"""
+    while True:
+        await asyncio.sleep(TOKEN_REVOCATION_SYNC_SECONDS)
+        try:
+            await sync_token_denylist()
+        except Exception as e:
+            logger.error(f"Token denylist sync error: {e}")
+
 # ================ UTILITIES ================
 
 def hash_password(password: str) -> str:
@@ -233,25 +743,47 @@ def verify_password(password: str, hashed: str) -> bool:
     """Verify password against hash"""
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
-def create_jwt_token(data: dict) -> str:
+def create_jwt_token(data: dict, lifetime: timedelta) -> str:
     """Create JWT token"""
-    expire = datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
+    expire = datetime.now(timezone.utc) + lifetime
     to_encode = data.copy()
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-def decode_jwt_token(token: str) -> dict:
+def create_access_token(user_id: str, session_id: str) -> str:
+    """Short-lived bearer token; its own id (jti) and its session id (sid) can both be revoked"""
+    return create_jwt_token(
+        {"user_id": user_id, "type": "access", "jti": uuid.uuid4().hex, "sid": session_id},
+        timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
+def create_refresh_token(user_id: str, session_id: str, token_id: str) -> str:
+    """Long-lived token accepted only by /auth/refresh, valid while it is its session's current one"""
+    return create_jwt_token(
+        {"user_id": user_id, "type": "refresh", "jti": token_id, "sid": session_id},
+        timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+
+def decode_jwt_token(token: str, token_type: str = "access") -> dict:
     """Decode JWT token"""
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
-
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get current user from JWT token"""
+    if payload.get("type") != token_type:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if token_denylist.is_revoked(payload.get("jti"), payload.get("sid")):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    return payload
+
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Get current user from JWT token; loaded once per request (authorize_route normally has already)"""
+    context = request_context.get()
+    if context and context.user:
+        context.record_avoided("user")
+        return context.user
     try:
         payload = decode_jwt_token(credentials.credentials)
         user_id = payload.get("user_id")
@@ -263,7 +795,13 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             raise HTTPException(status_code=401, detail="User not found")
         
         user.pop('_id', None)
-        return User(**parse_from_mongo(user))
+        current_user = User(**parse_from_mongo(user))
+        if context:
+            context.user = current_user
+        return current_user
+    except (HTTPException, PyMongoError):
+        # A database failure is not an authentication failure; timeouts become 503s upstream
+        raise
     except Exception as e:
         raise HTTPException(status_code=401, detail="Invalid authentication")
 
@@ -271,32 +809,8 @@ async def check_permission(user: User, module_name: str, menu_name: str, permiss
     """Check if user has specific permission for module/menu"""
     if not user.role_id:
         return False
-    
-    # Find the module
-    module = await db.modules.find_one({"name": module_name, "status": "active"})
-    if not module:
-        return False
-    
-    # Find the menu
-    menu = await db.menus.find_one({"name": menu_name, "module_id": module["id"]})
-    if not menu:
-        return False
-    
-    # Find the permission
-    permission = await db.permissions.find_one({"name": permission_name, "status": "active"})
-    if not permission:
-        return False
-    
-    # Check role permission
-    role_perm = await db.role_permissions.find_one({
-        "role_id": user.role_id,
-        "module_id": module["id"],
-        "menu_id": menu["id"],
-        "permission_id": permission["id"],
-        "is_active": True
-    })
-    
-    return role_perm is not None
+    permission_set = await get_role_permission_set(user.role_id)
+    return permission_set.allows(module_name, menu_name, permission_name)
 
 # Permission helper functions
 async def has_permission_by_menu_id(user: User, menu_id: str, permission_name: str):
@@ -334,16 +848,12 @@ async def has_delete(user: User, menu_id: str):
 async def has_export(user: User, menu_id: str):
     return await has_permission_by_menu_id(user, menu_id, "Export")
 
-async def require_permission(module_name: str, menu_name: str, permission_name: str):
-    """Dependency to require specific permission"""
-    def permission_checker(current_user: User = Depends(get_current_user)):
-        async def check():
-            has_permission = await check_permission(current_user, module_name, menu_name, permission_name)
-            if not has_permission:
-                raise HTTPException(status_code=403, detail="Insufficient permissions")
-            return current_user
-        return check()
-    return Depends(permission_checker)
+async def require_permission(user: User, module_name: str, menu_name: str, permission_name: str):
+    """Raise 403 unless the user holds the permission. For checks that depend on the record being
+    accessed; fixed per-route requirements belong in ROUTE_PERMISSIONS."""
+    if not await check_permission(user, module_name, menu_name, permission_name):
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    return user
 
 async def log_activity(module_name: str, table_name: str, action: str, status: str, 
                       user_id: Optional[str] = None, details: Optional[Dict] = None):
@@ -397,42 +907,426 @@ def prepare_for_json(data: dict) -> dict:
     # Parse from MongoDB format
     return parse_from_mongo(data)
 
+async def update_one_and_fetch(collection, query: dict, update, not_found: str,
+                               return_document: bool = ReturnDocument.AFTER,
+                               expected_version: Optional[int] = None) -> dict:
+    """Apply an update and return the document (after it, by default) in one round trip.
+    Existence conditions such as is_active or soft delete go in `query`; no match raises 404.
+    With expected_version the write only applies to that version; a mismatch raises 412."""
+    if expected_version is not None:
+        query = {**query, "version": expected_version}
+    document = await collection.find_one_and_update(
+        query, update, projection={"_id": 0}, return_document=return_document
+    )
+    if document is None:
+        if expected_version is not None:
+            # Only failed conditional writes pay for this read, to tell a conflict from a missing document
+            query.pop("version")
+            current = await collection.find_one(query, {"_id": 0, "version": 1})
+            if current:
+                raise version_conflict(current.get("version"))
+        raise HTTPException(status_code=404, detail=not_found)
+    return document
+
+def parse_expected_version(if_match: Optional[str], expected_version: Optional[int] = None) -> Optional[int]:
+    """Version a conditional write expects, from an If-Match ETag or the expected_version parameter"""
+    if if_match and if_match.strip() != "*":
+        tag = if_match.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        try:
+            version = int(tag.strip('"'))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="If-Match must be an ETag returned by this API")
+        if expected_version is not None and expected_version != version:
+            raise HTTPException(status_code=400, detail="If-Match and expected_version disagree")
+        return version
+    return expected_version
+
+def version_conflict(current_version: Optional[int]) -> HTTPException:
+    return HTTPException(
+        status_code=412,
+        detail={"message": "The record was changed by someone else. Reload and retry.", "current_version": current_version}
+    )
+
+def version_etag(document: dict) -> str:
+    """ETag of a versioned company or contact"""
+    return f'"{document.get("version", 1)}"'
+
+def apply_merge_patch(target: Any, patch: Any) -> Any:
+    """JSON merge patch (RFC 7396): null removes a member, objects merge, anything else replaces"""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+def merge_patch_diff(existing: dict, fields: dict, removable: List[str]) -> tuple:
+    """Minimal ($set, $unset) that turns the stored document into `fields`.
+    Fields in `removable` that are absent from `fields` are unset when stored with a value
+    (a stored null already reads as absent)."""
+    set_fields = {k: v for k, v in fields.items() if existing.get(k) != v}
+    unset_fields = {k: "" for k in removable if k not in fields and existing.get(k) is not None}
+    return set_fields, unset_fields
+
+def build_audit_entry(user_id: str, action: str, resource_type: str, resource_id: str, details: str) -> dict:
+    """Build an audit trail activity log document"""
+    return ActivityLog(
+        module_name="audit",
+        table_name=resource_type.lower(),
+        action=action.lower(),
+        status="success",
+        user_id=user_id,
+        details={
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "details": details
+        }
+    ).dict()
+
 async def log_audit_trail(user_id: str, action: str, resource_type: str, resource_id: str, details: str):
     """Log audit trail for important actions"""
-    await log_activity("audit", resource_type.lower(), action.lower(), "success", user_id, {
-        "resource_type": resource_type,
-        "resource_id": resource_id,
-        "details": details
-    })
+    await db.activity_logs.insert_one(build_audit_entry(user_id, action, resource_type, resource_id, details))
+
+async def log_audit_trail_many(entries: List[dict]):
+    """Write a batch of audit entries built with build_audit_entry in one round trip"""
+    if entries:
+        await db.activity_logs.insert_many(entries, ordered=False)
 
 async def get_user_permissions(user_id: str) -> List[Dict]:
     """Get user permissions by user ID"""
-    user = await db.users.find_one({"id": user_id, "is_active": True})
+    context = request_context.get()
+    if context and context.user and context.user.id == user_id:
+        context.record_avoided("user")
+        user = {"role_id": context.user.role_id}
+    else:
+        user = await db.users.find_one({"id": user_id, "is_active": True}, {"_id": 0, "role_id": 1})
     if not user or not user.get("role_id"):
         return []
+    return list((await get_role_permission_set(user["role_id"])).entries)
+
+# ================ ACCESS CONTROL ================
+
+# Access rule for each (method, path under /api). A (module, menu, permission) triple must be
+# granted to the caller's role, where permission may be a tuple of alternatives; AUTHENTICATED
+# only needs a valid token and PUBLIC not even that. Registering a route that is missing here
+# fails at import, so nothing is reachable without a declared rule.
+PUBLIC = "public"
+AUTHENTICATED = "authenticated"
+ROUTE_PERMISSIONS = {
+    # Authentication and navigation
+    ("POST", "/auth/login"): PUBLIC,
+    ("POST", "/auth/refresh"): PUBLIC,
+    ("GET", "/auth/me"): AUTHENTICATED,
+    ("POST", "/auth/logout"): AUTHENTICATED,
+    ("GET", "/auth/permissions"): AUTHENTICATED,
+    ("POST", "/auth/permissions/check"): AUTHENTICATED,
+    ("GET", "/nav/sidebar"): AUTHENTICATED,
+    
+    # User Management. Role, department, designation, permission, module and menu lists feed
+    # dropdowns on other screens (user and contact forms), so reading them only needs a login.
+    ("GET", "/users/export"): ("User Management", "Users", "Export"),
+    ("GET", "/users"): ("User Management", "Users", "View"),
+    ("POST", "/users"): ("User Management", "Users", "Add"),
+    ("PUT", "/users/{user_id}"): ("User Management", "Users", "Edit"),
+    ("DELETE", "/users/{user_id}"): ("User Management", "Users", "Delete"),
+    ("GET", "/roles/export"): ("User Management", "Roles", "Export"),
+    ("GET", "/roles"): AUTHENTICATED,
+    ("POST", "/roles"): ("User Management", "Roles", "Add"),
+    ("PUT", "/roles/{role_id}"): ("User Management", "Roles", "Edit"),
+    ("DELETE", "/roles/{role_id}"): ("User Management", "Roles", "Delete"),
+    ("GET", "/departments"): AUTHENTICATED,
+    ("POST", "/departments"): ("User Management", "Departments", "Add"),
+    ("PUT", "/departments/{dept_id}"): ("User Management", "Departments", "Edit"),
+    ("DELETE", "/departments/{dept_id}"): ("User Management", "Departments", "Delete"),
+    ("GET", "/designations"): AUTHENTICATED,
+    ("POST", "/designations"): ("User Management", "Designations", "Add"),
+    ("PUT", "/designations/{desig_id}"): ("User Management", "Designations", "Edit"),
+    ("DELETE", "/designations/{desig_id}"): ("User Management", "Designations", "Delete"),
+    ("GET", "/permissions"): AUTHENTICATED,
+    ("POST", "/permissions"): ("User Management", "Permissions", "Add"),
+    ("PUT", "/permissions/{perm_id}"): ("User Management", "Permissions", "Edit"),
+    ("DELETE", "/permissions/{perm_id}"): ("User Management", "Permissions", "Delete"),
+    ("GET", "/modules"): AUTHENTICATED,
+    ("POST", "/modules"): ("User Management", "Modules", "Add"),
+    ("PUT", "/modules/{module_id}"): ("User Management", "Modules", "Edit"),
+    ("DELETE", "/modules/{module_id}"): ("User Management", "Modules", "Delete"),
+    ("GET", "/menus"): AUTHENTICATED,
+    ("POST", "/menus"): ("User Management", "Menus", "Add"),
+    ("PUT", "/menus/{menu_id}"): ("User Management", "Menus", "Edit"),
+    ("DELETE", "/menus/{menu_id}"): ("User Management", "Menus", "Delete"),
+    ("GET", "/role-permissions"): ("User Management", "Role Permissions", "View"),
+    ("POST", "/role-permissions"): ("User Management", "Role Permissions", "Add"),
+    ("PUT", "/role-permissions/{rp_id}"): ("User Management", "Role Permissions", "Edit"),
+    ("DELETE", "/role-permissions/{rp_id}"): ("User Management", "Role Permissions", "Delete"),
+    ("GET", "/role-permissions/matrix/{role_id}"): ("User Management", "Role Permissions", "View"),
+    ("POST", "/role-permissions/matrix/{role_id}"): ("User Management", "Role Permissions", "Edit"),
+    ("GET", "/role-permissions/unassigned-modules/{role_id}"): ("User Management", "Role Permissions", "View"),
+    ("POST", "/role-permissions/add-module"): ("User Management", "Role Permissions", "Add"),
+    
+    # System
+    ("GET", "/activity-logs"): ("System", "Activity Logs", "View"),
+    ("GET", "/activity-logs/search"): ("System", "Activity Logs", "View"),
+    ("GET", "/system/startup-metrics"): ("System", "Activity Logs", "View"),
+    ("GET", "/system/db-metrics"): ("System", "Activity Logs", "View"),
+    
+    # Company master data (form dropdowns)
+    ("GET", "/company-types"): AUTHENTICATED,
+    ("GET", "/account-types"): AUTHENTICATED,
+    ("GET", "/regions"): AUTHENTICATED,
+    ("GET", "/business-types"): AUTHENTICATED,
+    ("GET", "/industries"): AUTHENTICATED,
+    ("GET", "/sub-industries"): AUTHENTICATED,
+    ("GET", "/countries"): AUTHENTICATED,
+    ("GET", "/states"): AUTHENTICATED,
+    ("GET", "/cities"): AUTHENTICATED,
+    ("GET", "/currencies"): AUTHENTICATED,
+    
+    # Companies and their documents
+    ("GET", "/companies"): ("Sales", "Companies", "View"),
+    ("GET", "/companies/export"): ("Sales", "Companies", "Export"),
+    ("POST", "/companies/import"): ("Sales", "Companies", "Add"),
+    ("POST", "/companies/upload-document"): ("Sales", "Companies", ("Add", "Edit")),
+    ("GET", "/companies/{company_id}"): ("Sales", "Companies", "View"),
+    ("GET", "/companies/{company_id}/hierarchy"): ("Sales", "Companies", "View"),
+    ("GET", "/companies/{company_id}/overview"): ("Sales", "Companies", "View"),
+    ("POST", "/companies"): ("Sales", "Companies", "Add"),
+    ("PUT", "/companies/{company_id}"): ("Sales", "Companies", "Edit"),
+    ("PATCH", "/companies/{company_id}"): ("Sales", "Companies", "Edit"),
+    ("DELETE", "/companies/{company_id}"): ("Sales", "Companies", "Delete"),
+    ("GET", "/documents/usage"): ("Sales", "Companies", "View"),
+    ("GET", "/documents/{sha256}"): ("Sales", "Companies", "View"),
+    ("HEAD", "/documents/{sha256}"): ("Sales", "Companies", "View"),
+    ("GET", "/dashboard/sales"): ("Sales", "Companies", "View"),
+    ("POST", "/dashboard/sales/rebuild"): ("Sales", "Companies", "Edit"),
+    
+    # Contacts (bulk delete additionally needs Delete, checked in the handler)
+    ("GET", "/contacts"): ("Sales", "Contacts", "View"),
+    ("GET", "/contacts/export"): ("Sales", "Contacts", "Export"),
+    ("POST", "/contacts/import"): ("Sales", "Contacts", "Add"),
+    ("POST", "/contacts/bulk"): ("Sales", "Contacts", "Edit"),
+    ("GET", "/contacts/{contact_id}"): ("Sales", "Contacts", "View"),
+    ("POST", "/contacts"): ("Sales", "Contacts", "Add"),
+    ("PUT", "/contacts/{contact_id}"): ("Sales", "Contacts", "Edit"),
+    ("PATCH", "/contacts/{contact_id}"): ("Sales", "Contacts", "Edit"),
+    ("DELETE", "/contacts/{contact_id}"): ("Sales", "Contacts", "Delete"),
+    
+    # Import jobs: the menu depends on the job's type, so the handler checks it
+    ("GET", "/import-jobs/{job_id}"): AUTHENTICATED,
+    ("GET", "/import-jobs/{job_id}/errors"): AUTHENTICATED,
+    
+    # Leads and opportunities
+    ("GET", "/leads"): ("Sales", "Leads", "View"),
+    ("GET", "/leads/{lead_id}"): ("Sales", "Leads", "View"),
+    ("POST", "/leads"): ("Sales", "Leads", "Add"),
+    ("PUT", "/leads/{lead_id}"): ("Sales", "Leads", "Edit"),
+    ("DELETE", "/leads/{lead_id}"): ("Sales", "Leads", "Delete"),
+    ("POST", "/leads/{lead_id}/convert"): ("Sales", "Opportunities", "Add"),
+    ("GET", "/opportunities"): ("Sales", "Opportunities", "View"),
+    ("GET", "/opportunities/pipeline"): ("Sales", "Opportunities", "View"),
+    ("GET", "/opportunities/{opportunity_id}"): ("Sales", "Opportunities", "View"),
+    ("POST", "/opportunities"): ("Sales", "Opportunities", "Add"),
+    ("PUT", "/opportunities/{opportunity_id}"): ("Sales", "Opportunities", "Edit"),
+    ("DELETE", "/opportunities/{opportunity_id}"): ("Sales", "Opportunities", "Delete"),
+}
+
+def route_access_rule(method: str, path: str):
+    rule = ROUTE_PERMISSIONS.get((method, path.removeprefix("/api")))
+    if rule is None:
+        raise RuntimeError(f"No access rule for {method} {path}; add it to ROUTE_PERMISSIONS")
+    return rule
+
+class RolePermissionSet:
+    """A role's grants compiled to names: set lookups instead of per-check queries"""
+    
+    def __init__(self, entries: List[Dict[str, str]]):
+        self.entries = entries  # [{"module", "menu", "permission", "path"}], the /auth/permissions shape
+        self.grants = frozenset((e["module"], e["menu"], e["permission"]) for e in entries)
+        self.path_grants = frozenset((e["path"], e["permission"]) for e in entries)
+        # Derived from the grants and menu paths alone, so every worker reports the same version for
+        # the same set, and a renamed path (which changes allows_path answers) changes it
+        self.version = hashlib.sha256(
+            json.dumps(sorted(self.grants) + sorted(self.path_grants)).encode()
+        ).hexdigest()[:16]
+    
+    def allows(self, module_name: str, menu_name: str, permission) -> bool:
+        alternatives = (permission,) if isinstance(permission, str) else permission
+        return any((module_name, menu_name, p) in self.grants for p in alternatives)
+    
+    def allows_path(self, path: str, permission: str) -> bool:
+        return (path, permission) in self.path_grants
+
+role_permission_cache: Dict[str, tuple] = {}  # role_id -> (loaded_at, RolePermissionSet)
+
+def role_descendants(parents: Dict[str, List[str]], role_ids) -> set:
+    """The given roles and every role inheriting from them, directly or not"""
+    children: Dict[str, List[str]] = {}
+    for role_id, parent_ids in parents.items():
+        for parent_id in parent_ids:
+            children.setdefault(parent_id, []).append(role_id)
+    found, pending = set(), list(role_ids)
+    while pending:
+        role_id = pending.pop()
+        if role_id not in found:
+            found.add(role_id)
+            pending.extend(children.get(role_id, []))
+    return found
+
+def role_ancestors(parents: Dict[str, List[str]], role_ids) -> set:
+    """The given roles and every role they inherit from, directly or not"""
+    found, pending = set(), list(role_ids)
+    while pending:
+        role_id = pending.pop()
+        if role_id not in found:
+            found.add(role_id)
+            pending.extend(parents.get(role_id, []))
+    return found
+
+async def load_role_parents() -> Dict[str, List[str]]:
+    """Active role id -> its active parent role ids"""
+    roles = await db.roles.find({"is_active": True}, {"_id": 0, "id": 1, "parent_role_ids": 1}).to_list(None)
+    active = {role["id"] for role in roles}
+    return {role["id"]: [p for p in role.get("parent_role_ids") or [] if p in active] for role in roles}
+
+async def validate_parent_roles(role_id: str, parent_role_ids: List[str], existing_role: bool = False):
+    """Parents must be active roles, and inheriting from them must not close a cycle.
+    existing_role: role_id must itself be an active role (updates)."""
+    parents = await load_role_parents()
+    if existing_role and role_id not in parents:
+        raise HTTPException(status_code=404, detail="Role not found")
+    if set(parent_role_ids) - set(parents):
+        raise HTTPException(status_code=400, detail="Parent role not found")
+    if role_id in role_ancestors(parents, parent_role_ids):
+        raise HTTPException(status_code=400, detail="A role cannot inherit from itself or a role that inherits from it")
+
+async def recompute_role_permissions(role_ids: Optional[List[str]] = None) -> Dict[str, list]:
+    """Recompute the stored effective permissions of the given roles and of every role inheriting
+    from them (all roles when None) in one batch: a role's own grants plus everything its parents
+    effectively hold, minus its own denies. Returns the new closures by role id."""
+    parents = await load_role_parents()
+    affected = set(parents) if role_ids is None else role_descendants(parents, role_ids) & set(parents)
+    # Deleted roles keep no closure
+    if role_ids is None:
+        await db.role_permission_closures.delete_many({"role_id": {"$nin": list(parents)}})
+    elif any(role_id not in parents for role_id in role_ids):
+        await db.role_permission_closures.delete_many({"role_id": {"$in": [r for r in role_ids if r not in parents]}})
+    if not affected:
+        invalidate_role_permissions()
+        return {}
+    
+    rows, modules, menus, permissions = await asyncio.gather(
+        db.role_permissions.find(
+            {"role_id": {"$in": list(role_ancestors(parents, affected))}, "is_active": True},
+            {"_id": 0, "role_id": 1, "module_id": 1, "menu_id": 1, "permission_id": 1, "effect": 1}
+        ).to_list(None),
+        db.modules.find({"status": "active"}, {"_id": 0, "id": 1, "name": 1}).to_list(None),
+        db.menus.find({}, {"_id": 0, "id": 1, "name": 1, "path": 1}).to_list(None),
+        db.permissions.find({"status": "active"}, {"_id": 0, "id": 1, "name": 1}).to_list(None),
+    )
+    modules = {m["id"]: m for m in modules}
+    menus = {m["id"]: m for m in menus}
+    permissions = {p["id"]: p for p in permissions}
+    
+    allows: Dict[str, set] = {}
+    denies: Dict[str, set] = {}
+    for row in rows:
+        grant = (row["module_id"], row["menu_id"], row["permission_id"])
+        (denies if row.get("effect") == "deny" else allows).setdefault(row["role_id"], set()).add(grant)
+    
+    effective: Dict[str, set] = {}
+    
+    def resolve(role_id: str) -> set:
+        if role_id not in effective:
+            effective[role_id] = set()  # placeholder, so a cycle in stored data cannot recurse forever
+            grants = set(allows.get(role_id, ()))
+            for parent_id in parents.get(role_id, []):
+                grants |= resolve(parent_id)
+            effective[role_id] = grants - denies.get(role_id, set())
+        return effective[role_id]
+    
+    closures = {}
+    for role_id in affected:
+        # Compact form: one entry per menu listing its granted permission names
+        by_menu: Dict[str, list] = {}
+        for module_id, menu_id, permission_id in resolve(role_id):
+            module, menu, permission = modules.get(module_id), menus.get(menu_id), permissions.get(permission_id)
+            if module and menu and permission:
+                by_menu.setdefault((module["name"], menu["name"], menu["path"]), []).append(permission["name"])
+        closures[role_id] = [
+            {"module": module_name, "menu": menu_name, "path": path, "permissions": sorted(names)}
+            for (module_name, menu_name, path), names in sorted(by_menu.items())
+        ]
     
-    # Get all role permissions for this user
-    role_permissions = await db.role_permissions.find({
-        "role_id": user["role_id"],
-        "is_active": True
-    }).to_list(length=None)
-    
-    permissions = []
-    for rp in role_permissions:
-        # Get module, menu, and permission details
-        module = await db.modules.find_one({"id": rp["module_id"], "status": "active"})
-        menu = await db.menus.find_one({"id": rp["menu_id"]})
-        permission = await db.permissions.find_one({"id": rp["permission_id"], "status": "active"})
-        
-        if module and menu and permission:
-            permissions.append({
-                "module": module["name"],
-                "menu": menu["name"],
-                "permission": permission["name"],
-                "path": menu["path"]
-            })
-    
-    return permissions
+    now = datetime.now(timezone.utc)
+    await db.role_permission_closures.bulk_write([
+        ReplaceOne(
+            {"role_id": role_id},
+            {"role_id": role_id, "ancestor_ids": sorted(role_ancestors(parents, [role_id]) - {role_id}),
+             "menus": menus_granted, "computed_at": now},
+            upsert=True
+        )
+        for role_id, menus_granted in closures.items()
+    ], ordered=False)
+    invalidate_role_permissions()
+    return closures
+
+async def compile_role_permissions(role_id: str) -> RolePermissionSet:
+    """Load a role's precomputed effective permissions (one query); computed on first use"""
+    closure = await db.role_permission_closures.find_one({"role_id": role_id}, {"_id": 0, "menus": 1})
+    if closure:
+        menus_granted = closure["menus"]
+    else:
+        menus_granted = (await recompute_role_permissions([role_id])).get(role_id, [])
+    return RolePermissionSet([
+        {"module": menu["module"], "menu": menu["menu"], "permission": permission, "path": menu["path"]}
+        for menu in menus_granted
+        for permission in menu["permissions"]
+    ])
+
+async def get_role_permission_set(role_id: str) -> RolePermissionSet:
+    """Compiled permission set for a role (cached). Within a request every check sees the same set."""
+    context = request_context.get()
+    if context and role_id in context.permission_sets:
+        context.record_avoided("permissions")
+        return context.permission_sets[role_id]
+    cached = role_permission_cache.get(role_id)
+    if cached and time.monotonic() - cached[0] < ROLE_PERMISSION_CACHE_TTL_SECONDS:
+        permission_set = cached[1]
+    else:
+        permission_set = await compile_role_permissions(role_id)
+        role_permission_cache[role_id] = (time.monotonic(), permission_set)
+    if context:
+        context.permission_sets[role_id] = permission_set
+    return permission_set
+
+def invalidate_role_permissions():
+    """Drop every compiled set; role permissions, modules, menus and permissions all feed them"""
+    role_permission_cache.clear()
+
+async def authorize_route(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """The access check for every /api route, run once per request from its ROUTE_PERMISSIONS rule"""
+    rule = request.scope["route"].access_rules[request.method]
+    if rule == PUBLIC:
+        return
+    if credentials is None:
+        raise HTTPException(status_code=403, detail="Not authenticated")
+    current_user = await get_current_user(request, credentials)
+    if rule == AUTHENTICATED:
+        return
+    module_name, menu_name, permission = rule
+    if not current_user.role_id or not (await get_role_permission_set(current_user.role_id)).allows(
+        module_name, menu_name, permission
+    ):
+        raise HTTPException(status_code=403, detail="Access denied. Permission required.")
+
+api_router = APIRouter(prefix="/api", route_class=DatabaseBudgetRoute, dependencies=[Depends(authorize_route)])
 
 # ================ NAVIGATION ENDPOINTS ================
 
@@ -443,58 +1337,42 @@ async def get_sidebar_navigation(current_user: User = Depends(get_current_user))
         return {"modules": []}
     
     try:
-        # Get all role permissions for this user
-        role_permissions = await db.role_permissions.find({
-            "role_id": current_user.role_id,
-            "is_active": True
-        }).to_list(length=None)
-        
-        if not role_permissions:
+        # Menus the role can View, inherited grants and denies included
+        permission_set = await get_role_permission_set(current_user.role_id)
+        visible = {(e["module"], e["menu"]) for e in permission_set.entries if e["permission"] == "View"}
+        if not visible:
             return {"modules": []}
         
-        # Get all modules, menus, and permissions that user has access to
-        accessible_modules = {}
+        modules = await db.modules.find(
+            {"name": {"$in": list({module_name for module_name, _ in visible})}, "status": "active"}
+        ).to_list(length=None)
+        modules_by_id = {module["id"]: module for module in modules}
+        menus = await db.menus.find({"module_id": {"$in": list(modules_by_id)}}).to_list(length=None)
         
-        for rp in role_permissions:
-            # Get permission details
-            permission = await db.permissions.find_one({
-                "id": rp["permission_id"],
-                "status": "active"
-            })
+        accessible_modules = {}
+        for menu in menus:
+            module = modules_by_id[menu["module_id"]]
+            if (module["name"], menu["name"]) not in visible:
+                continue
+            module_id = module["id"]
             
-            # Only include if user has 'View' permission
-            if permission and permission["name"] == "View":
-                # Get module details
-                module = await db.modules.find_one({
-                    "id": rp["module_id"],
-                    "status": "active"
-                })
-                
-                # Get menu details
-                menu = await db.menus.find_one({
-                    "id": rp["menu_id"]
-                })
-                
-                if module and menu:
-                    module_id = module["id"]
-                    
-                    if module_id not in accessible_modules:
-                        accessible_modules[module_id] = {
-                            "id": module["id"],
-                            "name": module["name"],
-                            "description": module.get("description"),
-                            "order_index": getattr(module, 'order_index', 0),
-                            "menus": {}
-                        }
-                    
-                    # Add menu to module
-                    accessible_modules[module_id]["menus"][menu["id"]] = {
-                        "id": menu["id"],
-                        "name": menu["name"],
-                        "path": menu["path"],
-                        "parent": menu.get("parent"),
-                        "order_index": menu["order_index"]
-                    }
+            if module_id not in accessible_modules:
+                accessible_modules[module_id] = {
+                    "id": module["id"],
+                    "name": module["name"],
+                    "description": module.get("description"),
+                    "order_index": module.get("order_index", 0),
+                    "menus": {}
+                }
+            
+            # Add menu to module
+            accessible_modules[module_id]["menus"][menu["id"]] = {
+                "id": menu["id"],
+                "name": menu["name"],
+                "path": menu["path"],
+                "parent": menu.get("parent"),
+                "order_index": menu["order_index"]
+            }
         
         # Convert to final structure and sort
         result_modules = []
@@ -572,8 +1450,8 @@ async def login(request: LoginRequest):
             {"$set": {"last_login_at": datetime.now(timezone.utc).isoformat()}}
         )
         
-        # Create token
-        token = create_jwt_token({"user_id": user_data["id"]})
+        # Start a session: short-lived access token plus a rotating refresh token
+        tokens = await start_session(user_data["id"])
         
         # Log successful login
         await log_activity("auth", "users", "login", "success", user_data["id"])
@@ -583,7 +1461,7 @@ async def login(request: LoginRequest):
         user_data.pop("_id", None)
         user_data = parse_from_mongo(user_data)
         
-        return LoginResponse(access_token=token, user=user_data)
+        return LoginResponse(**tokens, user=user_data)
     
     except HTTPException:
         raise
@@ -598,9 +1476,38 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
     user_dict.pop("password_hash", None)
     return user_dict
 
+@api_router.post("/auth/refresh", response_model=TokenResponse)
+async def refresh_tokens(request: RefreshRequest):
+    """Exchange a refresh token for a new token pair. Each refresh token works once: presenting one
+    that was already rotated out means it leaked, so the whole session is ended."""
+    payload = decode_jwt_token(request.refresh_token, "refresh")
+    session_id, user_id = payload.get("sid"), payload.get("user_id")
+    now = datetime.now(timezone.utc)
+    refresh_jti = uuid.uuid4().hex
+    session = await db.auth_sessions.find_one_and_update(
+        {"id": session_id, "user_id": user_id, "refresh_jti": payload.get("jti"), "revoked_at": None},
+        {"$set": {"refresh_jti": refresh_jti, "refreshed_at": now, "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)}},
+        projection={"_id": 0, "id": 1}
+    )
+    if not session:
+        if await revoke_sessions({"id": session_id}):
+            await log_activity("auth", "users", "refresh_reuse", "fail", user_id, {"session_id": session_id})
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    
+    if not await db.users.find_one({"id": user_id, "is_active": True}, {"_id": 1}):
+        await revoke_sessions({"id": session_id})
+        raise HTTPException(status_code=401, detail="User not found")
+    
+    return TokenResponse(**session_tokens(user_id, session_id, refresh_jti))
+
 @api_router.post("/auth/logout")
-async def logout(current_user: User = Depends(get_current_user)):
-    """Logout endpoint"""
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: User = Depends(get_current_user)
+):
+    """Logout endpoint: ends the session, so its access and refresh tokens stop working"""
+    payload = decode_jwt_token(credentials.credentials)
+    await revoke_sessions({"id": payload.get("sid"), "user_id": current_user.id})
     await log_activity("auth", "users", "logout", "success", current_user.id)
     return {"message": "Logged out successfully"}
 
@@ -608,44 +1515,51 @@ async def logout(current_user: User = Depends(get_current_user)):
 async def get_current_user_permissions(current_user: User = Depends(get_current_user)):
     """Get current user's permissions"""
     if not current_user.role_id:
-        return {"permissions": []}
+        return {"permissions": [], "version": RolePermissionSet([]).version}
     
-    # Get all role permissions for this user
-    role_permissions = await db.role_permissions.find({
-        "role_id": current_user.role_id,
-        "is_active": True
-    }).to_list(length=None)
-    
-    permissions = []
-    for rp in role_permissions:
-        # Get module, menu, and permission details
-        module = await db.modules.find_one({"id": rp["module_id"], "status": "active"})
-        menu = await db.menus.find_one({"id": rp["menu_id"]})
-        permission = await db.permissions.find_one({"id": rp["permission_id"], "status": "active"})
-        
-        if module and menu and permission:
-            permissions.append({
-                "module": module["name"],
-                "menu": menu["name"],
-                "permission": permission["name"],
-                "path": menu["path"]
-            })
-    
-    return {"permissions": permissions}
+    permission_set = await get_role_permission_set(current_user.role_id)
+    return {"permissions": list(permission_set.entries), "version": permission_set.version}
+
+@api_router.post("/auth/permissions/check")
+async def check_current_user_permissions(
+    check_request: PermissionCheckRequest,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """Answer many permission checks at once, in request order, from the compiled permission set.
+    The ETag covers the permission set version and the checks asked, so a client can revalidate
+    with If-None-Match and keep its copy (304) until the role's permissions change."""
+    for index, check in enumerate(check_request.checks):
+        if not check.path and not (check.module and check.menu):
+            raise HTTPException(status_code=422, detail=f"checks[{index}]: give a path, or a module and menu")
+    
+    permission_set = (await get_role_permission_set(current_user.role_id)
+                      if current_user.role_id else RolePermissionSet([]))
+    asked = hashlib.sha256(json.dumps([check.dict() for check in check_request.checks]).encode()).hexdigest()[:16]
+    etag = f'"{permission_set.version}-{asked}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    results = [
+        permission_set.allows_path(check.path, check.permission) if check.path
+        else permission_set.allows(check.module, check.menu, check.permission)
+        for check in check_request.checks
+    ]
+    return JSONResponse({"version": permission_set.version, "results": results}, headers=headers)
 
 # ================ ROLE PERMISSION MANAGEMENT ENDPOINTS ================
 
 @api_router.get("/role-permissions/matrix/{role_id}")
 async def get_role_permission_matrix(role_id: str, current_user: User = Depends(get_current_user)):
-    """Get permission matrix for a specific role"""
-    # Check View permission for Role Permissions
-    has_permission = await check_permission(current_user, "User Management", "Role Permissions", "View")
-    if not has_permission:
-        raise HTTPException(status_code=403, detail="Insufficient permissions to view role permissions")
-    
+    """Get permission matrix for a specific role. `granted` and `denied` are the role's own rows;
+    `effective` also counts what it inherits from its parent roles."""
     # Get all permissions
     permissions = await db.permissions.find({"status": "active"}).to_list(length=None)
     permissions_dict = {p["id"]: p for p in permissions}
+    effective = await get_role_permission_set(role_id)
     
     # Get all modules and their menus
     modules = await db.modules.find({"status": "active"}).to_list(length=None)
@@ -675,10 +1589,12 @@ async def get_role_permission_matrix(role_id: str, current_user: User = Depends(
             }).to_list(length=None)
             
             # Create permission map for this menu
+            effects = {rp["permission_id"]: rp.get("effect", "allow") for rp in role_perms}
             for perm in permissions:
-                has_perm = any(rp["permission_id"] == perm["id"] for rp in role_perms)
                 menu_permissions[perm["name"]] = {
-                    "granted": has_perm,
+                    "granted": effects.get(perm["id"]) == "allow",
+                    "denied": effects.get(perm["id"]) == "deny",
+                    "effective": effective.allows(module["name"], menu["name"], perm["name"]),
                     "permission_id": perm["id"],
                     "description": perm.get("description", "")
                 }
@@ -701,12 +1617,8 @@ async def update_role_permission_matrix(
     matrix_update: dict, 
     current_user: User = Depends(get_current_user)
 ):
-    """Update role permission matrix"""
-    # Check Edit permission for Role Permissions
-    has_permission = await check_permission(current_user, "User Management", "Role Permissions", "Edit")
-    if not has_permission:
-        raise HTTPException(status_code=403, detail="Insufficient permissions to edit role permissions")
-    
+    """Update role permission matrix. `denied: true` records an explicit deny, which removes the
+    permission even when a parent role grants it."""
     updates = matrix_update.get("updates", [])
     
     for update in updates:
@@ -714,6 +1626,7 @@ async def update_role_permission_matrix(
         module_id = update.get("module_id")
         permission_id = update.get("permission_id")
         granted = update.get("granted", False)
+        effect = "deny" if update.get("denied", False) else "allow"
         
         if not all([menu_id, module_id, permission_id]):
             continue
@@ -726,7 +1639,7 @@ async def update_role_permission_matrix(
             "permission_id": permission_id
         })
         
-        if granted:
+        if granted or effect == "deny":
             if not existing:
                 # Create new role permission
                 role_perm = RolePermission(
@@ -734,16 +1647,17 @@ async def update_role_permission_matrix(
                     module_id=module_id,
                     menu_id=menu_id,
                     permission_id=permission_id,
+                    effect=effect,
                     created_by=current_user.id
                 )
                 rp_dict = prepare_for_mongo(role_perm.dict())
                 rp_dict.pop('_id', None)
                 await db.role_permissions.insert_one(rp_dict)
-            elif not existing.get("is_active", True):
-                # Reactivate existing permission
+            elif not existing.get("is_active", True) or existing.get("effect", "allow") != effect:
+                # Reactivate existing permission, or switch it between allow and deny
                 await db.role_permissions.update_one(
                     {"id": existing["id"]},
-                    {"$set": {"is_active": True, "updated_by": current_user.id, "updated_at": datetime.now(timezone.utc).isoformat()}}
+                    {"$set": {"is_active": True, "effect": effect, "updated_by": current_user.id, "updated_at": datetime.now(timezone.utc).isoformat()}}
                 )
         else:
             if existing and existing.get("is_active", True):
@@ -753,6 +1667,7 @@ async def update_role_permission_matrix(
                     {"$set": {"is_active": False, "updated_by": current_user.id, "updated_at": datetime.now(timezone.utc).isoformat()}}
                 )
     
+    await recompute_role_permissions([role_id])
     await log_activity("user_management", "role_permissions", "update", "success", current_user.id, {
         "role_id": role_id,
         "updates_count": len(updates)
@@ -763,11 +1678,6 @@ async def update_role_permission_matrix(
 @api_router.get("/role-permissions/unassigned-modules/{role_id}")
 async def get_unassigned_modules(role_id: str, current_user: User = Depends(get_current_user)):
     """Get modules not yet assigned to a role"""
-    # Check View permission for Role Permissions
-    has_permission = await check_permission(current_user, "User Management", "Role Permissions", "View")
-    if not has_permission:
-        raise HTTPException(status_code=403, detail="Insufficient permissions to view role permissions")
-    
     # Get all modules
     all_modules = await db.modules.find({"status": "active"}).to_list(length=None)
     
@@ -792,11 +1702,6 @@ async def add_module_to_role(
     current_user: User = Depends(get_current_user)
 ):
     """Add a module to a role with specified permissions"""
-    # Check Add permission for Role Permissions
-    has_permission = await check_permission(current_user, "User Management", "Role Permissions", "Add")
-    if not has_permission:
-        raise HTTPException(status_code=403, detail="Insufficient permissions to add role permissions")
-    
     role_id = assignment_data.get("role_id")
     module_id = assignment_data.get("module_id")
     permissions = assignment_data.get("permissions", [])  # [{"menu_id": "...", "permission_ids": ["..."]}]
@@ -832,6 +1737,7 @@ async def add_module_to_role(
                 await db.role_permissions.insert_one(rp_dict)
                 created_count += 1
     
+    await recompute_role_permissions([role_id])
     await log_activity("user_management", "role_permissions", "create", "success", current_user.id, {
         "role_id": role_id,
         "module_id": module_id,
@@ -845,11 +1751,6 @@ async def add_module_to_role(
 @api_router.get("/users/export")
 async def export_users(current_user: User = Depends(get_current_user)):
     """Export users to Excel"""
-    # Check Export permission
-    has_permission = await check_permission(current_user, "User Management", "Users", "Export")
-    if not has_permission:
-        raise HTTPException(status_code=403, detail="Insufficient permissions to export users")
-    
     # For now, return CSV data (Excel implementation would require additional dependencies)
     users = await db.users.find({"is_active": True}).to_list(length=None)
     
@@ -866,10 +1767,6 @@ async def export_users(current_user: User = Depends(get_current_user)):
 @api_router.get("/roles/export")
 async def export_roles(current_user: User = Depends(get_current_user)):
     """Export roles to Excel"""
-    has_permission = await check_permission(current_user, "User Management", "Roles", "Export")
-    if not has_permission:
-        raise HTTPException(status_code=403, detail="Insufficient permissions to export roles")
-    
     roles = await db.roles.find({"is_active": True}).to_list(length=None)
     
     csv_data = "Name,Code,Description,Created At\n"
@@ -888,11 +1785,6 @@ async def export_roles(current_user: User = Depends(get_current_user)):
 @api_router.get("/users", response_model=List[User])
 async def get_users(current_user: User = Depends(get_current_user)):
     """Get all users"""
-    # Check View permission
-    has_permission = await check_permission(current_user, "User Management", "Users", "View")
-    if not has_permission:
-        raise HTTPException(status_code=403, detail="Insufficient permissions to view users")
-    
     users = await db.users.find({"is_active": True}).to_list(length=None)
     result = []
     for user in users:
@@ -904,11 +1796,6 @@ async def get_users(current_user: User = Depends(get_current_user)):
 @api_router.post("/users", response_model=User)
 async def create_user(user_data: UserCreate, current_user: User = Depends(get_current_user)):
     """Create new user"""
-    # Check Add permission
-    has_permission = await check_permission(current_user, "User Management", "Users", "Add")
-    if not has_permission:
-        raise HTTPException(status_code=403, detail="Insufficient permissions to create users")
-    
     # Check if user exists
     existing = await db.users.find_one({
         "$or": [
@@ -937,25 +1824,13 @@ async def create_user(user_data: UserCreate, current_user: User = Depends(get_cu
 @api_router.put("/users/{user_id}")
 async def update_user(user_id: str, user_data: UserUpdate, current_user: User = Depends(get_current_user)):
     """Update user"""
-    # Check Edit permission
-    has_permission = await check_permission(current_user, "User Management", "Users", "Edit")
-    if not has_permission:
-        raise HTTPException(status_code=403, detail="Insufficient permissions to edit users")
-    
-    existing = await db.users.find_one({"id": user_id, "is_active": True})
-    if not existing:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     user_dict = user_data.dict(exclude_unset=True)
     user_dict['updated_by'] = current_user.id
     user_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
     
-    await db.users.update_one({"id": user_id}, {"$set": user_dict})
-    
-    updated_user = await db.users.find_one({"id": user_id})
-    if not updated_user:
-        raise HTTPException(status_code=404, detail="User not found after update")
-    updated_user.pop('_id', None)
+    updated_user = await update_one_and_fetch(
+        db.users, {"id": user_id, "is_active": True}, {"$set": user_dict}, "User not found"
+    )
     
     await log_activity("user_management", "users", "update", "success", current_user.id, {"user_id": user_id})
     
@@ -967,11 +1842,6 @@ async def update_user(user_id: str, user_data: UserUpdate, current_user: User =
 @api_router.delete("/users/{user_id}")
 async def delete_user(user_id: str, current_user: User = Depends(get_current_user)):
     """Soft delete user"""
-    # Check Delete permission
-    has_permission = await check_permission(current_user, "User Management", "Users", "Delete")
-    if not has_permission:
-        raise HTTPException(status_code=403, detail="Insufficient permissions to delete users")
-    
     existing = await db.users.find_one({"id": user_id, "is_active": True})
     if not existing:
         raise HTTPException(status_code=404, detail="User not found")
@@ -983,6 +1853,7 @@ async def delete_user(user_id: str, current_user: User = Depends(get_current_use
         {"id": user_id}, 
         {"$set": {"is_active": False, "updated_by": current_user.id, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    await revoke_sessions({"user_id": user_id})
     
     await log_activity("user_management", "users", "delete", "success", current_user.id, {"user_id": user_id})
     return {"message": "User deleted successfully"}
@@ -1005,10 +1876,13 @@ async def create_role(role_data: Role, current_user: User = Depends(get_current_
     # Fix the duplicate created_by issue
     role_dict = role_data.dict()
     role_dict['created_by'] = current_user.id
+    role_dict['parent_role_ids'] = list(dict.fromkeys(role_data.parent_role_ids))
     role = Role(**role_dict)
+    await validate_parent_roles(role.id, role.parent_role_ids)
     role_dict = prepare_for_mongo(role.dict())
     role_dict.pop('_id', None)
     await db.roles.insert_one(role_dict)
+    await recompute_role_permissions([role.id])
     
     await log_activity("user_management", "roles", "create", "success", current_user.id, {"role_id": role.id})
     
@@ -1017,25 +1891,26 @@ async def create_role(role_data: Role, current_user: User = Depends(get_current_
 @api_router.put("/roles/{role_id}", response_model=Role)
 async def update_role(role_id: str, role_data: Role, current_user: User = Depends(get_current_user)):
     """Update role"""
-    existing = await db.roles.find_one({"id": role_id, "is_active": True})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Role not found")
-    
     # Only update the fields that should be updated, exclude auto-generated fields
     role_dict = role_data.dict(exclude={'id', 'created_at', 'created_by', 'is_active'})
+    role_dict['parent_role_ids'] = list(dict.fromkeys(role_data.parent_role_ids))
     role_dict['updated_by'] = current_user.id
     role_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
     role_dict.pop('_id', None)
+    if role_dict['parent_role_ids']:
+        await validate_parent_roles(role_id, role_dict['parent_role_ids'], existing_role=True)
     
-    await db.roles.update_one({"id": role_id}, {"$set": role_dict})
-    
-    updated_role = await db.roles.find_one({"id": role_id})
-    if not updated_role:
-        raise HTTPException(status_code=404, detail="Role not found after update")
-    updated_role.pop('_id', None)
+    # The previous document tells whether the parents changed, still in one round trip
+    previous_role = await update_one_and_fetch(
+        db.roles, {"id": role_id, "is_active": True}, {"$set": role_dict}, "Role not found",
+        return_document=ReturnDocument.BEFORE
+    )
+    if (previous_role.get("parent_role_ids") or []) != role_dict['parent_role_ids']:
+        # Its own closure and those of every role inheriting from it
+        await recompute_role_permissions([role_id])
     
     await log_activity("user_management", "roles", "update", "success", current_user.id, {"role_id": role_id})
-    return Role(**parse_from_mongo(updated_role))
+    return Role(**parse_from_mongo({**previous_role, **role_dict}))
 
 @api_router.delete("/roles/{role_id}")
 async def delete_role(role_id: str, current_user: User = Depends(get_current_user)):
@@ -1049,6 +1924,7 @@ async def delete_role(role_id: str, current_user: User = Depends(get_current_use
         {"$set": {"is_active": False, "updated_by": current_user.id, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     
+    await recompute_role_permissions([role_id])
     await log_activity("user_management", "roles", "delete", "success", current_user.id, {"role_id": role_id})
     return {"message": "Role deleted successfully"}
 
@@ -1089,22 +1965,15 @@ async def create_department(dept_data: Department, current_user: User = Depends(
 @api_router.put("/departments/{dept_id}", response_model=Department)
 async def update_department(dept_id: str, dept_data: Department, current_user: User = Depends(get_current_user)):
     """Update department"""
-    existing = await db.departments.find_one({"id": dept_id, "is_active": True})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Department not found")
-    
     # Only update the fields that should be updated, exclude auto-generated fields
     dept_dict = dept_data.dict(exclude={'id', 'created_at', 'created_by', 'is_active'})
     dept_dict['updated_by'] = current_user.id
     dept_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
     dept_dict.pop('_id', None)
     
-    await db.departments.update_one({"id": dept_id}, {"$set": dept_dict})
-    
-    updated_dept = await db.departments.find_one({"id": dept_id})
-    if not updated_dept:
-        raise HTTPException(status_code=404, detail="Department not found after update")
-    updated_dept.pop('_id', None)
+    updated_dept = await update_one_and_fetch(
+        db.departments, {"id": dept_id, "is_active": True}, {"$set": dept_dict}, "Department not found"
+    )
     
     await log_activity("user_management", "departments", "update", "success", current_user.id, {"department_id": dept_id})
     return Department(**parse_from_mongo(updated_dept))
@@ -1148,29 +2017,24 @@ async def create_designation(desig_data: Designation, current_user: User = Depen
     desig_dict.pop('_id', None)
     await db.designations.insert_one(desig_dict)
     
+    invalidate_master_data("designations")
     await log_activity("user_management", "designations", "create", "success", current_user.id, {"designation_id": designation.id})
     return designation
 
 @api_router.put("/designations/{desig_id}", response_model=Designation)
 async def update_designation(desig_id: str, desig_data: Designation, current_user: User = Depends(get_current_user)):
     """Update designation"""
-    existing = await db.designations.find_one({"id": desig_id, "is_active": True})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Designation not found")
-    
     # Only update the fields that should be updated, exclude auto-generated fields
     desig_dict = desig_data.dict(exclude={'id', 'created_at', 'created_by', 'is_active'})
     desig_dict['updated_by'] = current_user.id
     desig_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
     desig_dict.pop('_id', None)
     
-    await db.designations.update_one({"id": desig_id}, {"$set": desig_dict})
-    
-    updated_desig = await db.designations.find_one({"id": desig_id})
-    if not updated_desig:
-        raise HTTPException(status_code=404, detail="Designation not found after update")
-    updated_desig.pop('_id', None)
+    updated_desig = await update_one_and_fetch(
+        db.designations, {"id": desig_id, "is_active": True}, {"$set": desig_dict}, "Designation not found"
+    )
     
+    invalidate_master_data("designations")
     await log_activity("user_management", "designations", "update", "success", current_user.id, {"designation_id": desig_id})
     return Designation(**parse_from_mongo(updated_desig))
 
@@ -1213,29 +2077,24 @@ async def create_permission(perm_data: Permission, current_user: User = Depends(
     perm_dict.pop('_id', None)
     await db.permissions.insert_one(perm_dict)
     
+    await recompute_role_permissions()
     await log_activity("user_management", "permissions", "create", "success", current_user.id, {"permission_id": permission.id})
     return permission
 
 @api_router.put("/permissions/{perm_id}", response_model=Permission)
 async def update_permission(perm_id: str, perm_data: Permission, current_user: User = Depends(get_current_user)):
     """Update permission"""
-    existing = await db.permissions.find_one({"id": perm_id, "is_active": True})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Permission not found")
-    
     # Only update the fields that should be updated, exclude auto-generated fields
     perm_dict = perm_data.dict(exclude={'id', 'created_at', 'created_by', 'is_active'})
     perm_dict['updated_by'] = current_user.id
     perm_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
     perm_dict.pop('_id', None)
     
-    await db.permissions.update_one({"id": perm_id}, {"$set": perm_dict})
-    
-    updated_perm = await db.permissions.find_one({"id": perm_id})
-    if not updated_perm:
-        raise HTTPException(status_code=404, detail="Permission not found after update")
-    updated_perm.pop('_id', None)
+    updated_perm = await update_one_and_fetch(
+        db.permissions, {"id": perm_id, "is_active": True}, {"$set": perm_dict}, "Permission not found"
+    )
     
+    await recompute_role_permissions()
     await log_activity("user_management", "permissions", "update", "success", current_user.id, {"permission_id": perm_id})
     return Permission(**parse_from_mongo(updated_perm))
 
@@ -1251,6 +2110,7 @@ async def delete_permission(perm_id: str, current_user: User = Depends(get_curre
         {"$set": {"is_active": False, "updated_by": current_user.id, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     
+    await recompute_role_permissions()
     await log_activity("user_management", "permissions", "delete", "success", current_user.id, {"permission_id": perm_id})
     return {"message": "Permission deleted successfully"}
 
@@ -1278,29 +2138,24 @@ async def create_module(module_data: Module, current_user: User = Depends(get_cu
     module_dict.pop('_id', None)
     await db.modules.insert_one(module_dict)
     
+    await recompute_role_permissions()
     await log_activity("user_management", "modules", "create", "success", current_user.id, {"module_id": module.id})
     return module
 
 @api_router.put("/modules/{module_id}", response_model=Module)
 async def update_module(module_id: str, module_data: Module, current_user: User = Depends(get_current_user)):
     """Update module"""
-    existing = await db.modules.find_one({"id": module_id, "is_active": True})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Module not found")
-    
     # Only update the fields that should be updated, exclude auto-generated fields
     module_dict = module_data.dict(exclude={'id', 'created_at', 'created_by', 'is_active'})
     module_dict['updated_by'] = current_user.id
     module_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
     module_dict.pop('_id', None)
     
-    await db.modules.update_one({"id": module_id}, {"$set": module_dict})
-    
-    updated_module = await db.modules.find_one({"id": module_id})
-    if not updated_module:
-        raise HTTPException(status_code=404, detail="Module not found after update")
-    updated_module.pop('_id', None)
+    updated_module = await update_one_and_fetch(
+        db.modules, {"id": module_id, "is_active": True}, {"$set": module_dict}, "Module not found"
+    )
     
+    await recompute_role_permissions()
     await log_activity("user_management", "modules", "update", "success", current_user.id, {"module_id": module_id})
     return Module(**parse_from_mongo(updated_module))
 
@@ -1316,6 +2171,7 @@ async def delete_module(module_id: str, current_user: User = Depends(get_current
         {"$set": {"is_active": False, "updated_by": current_user.id, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     
+    await recompute_role_permissions()
     await log_activity("user_management", "modules", "delete", "success", current_user.id, {"module_id": module_id})
     return {"message": "Module deleted successfully"}
 
@@ -1343,29 +2199,24 @@ async def create_menu(menu_data: Menu, current_user: User = Depends(get_current_
     menu_dict.pop('_id', None)
     await db.menus.insert_one(menu_dict)
     
+    await recompute_role_permissions()
     await log_activity("user_management", "menus", "create", "success", current_user.id, {"menu_id": menu.id})
     return menu
 
 @api_router.put("/menus/{menu_id}", response_model=Menu)
 async def update_menu(menu_id: str, menu_data: Menu, current_user: User = Depends(get_current_user)):
     """Update menu"""
-    existing = await db.menus.find_one({"id": menu_id, "is_active": True})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Menu not found")
-    
     # Only update the fields that should be updated, exclude auto-generated fields
     menu_dict = menu_data.dict(exclude={'id', 'created_at', 'created_by', 'is_active'})
     menu_dict['updated_by'] = current_user.id
     menu_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
     menu_dict.pop('_id', None)
     
-    await db.menus.update_one({"id": menu_id}, {"$set": menu_dict})
-    
-    updated_menu = await db.menus.find_one({"id": menu_id})
-    if not updated_menu:
-        raise HTTPException(status_code=404, detail="Menu not found after update")
-    updated_menu.pop('_id', None)
+    updated_menu = await update_one_and_fetch(
+        db.menus, {"id": menu_id, "is_active": True}, {"$set": menu_dict}, "Menu not found"
+    )
     
+    await recompute_role_permissions()
     await log_activity("user_management", "menus", "update", "success", current_user.id, {"menu_id": menu_id})
     return Menu(**parse_from_mongo(updated_menu))
 
@@ -1381,6 +2232,7 @@ async def delete_menu(menu_id: str, current_user: User = Depends(get_current_use
         {"$set": {"is_active": False, "updated_by": current_user.id, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     
+    await recompute_role_permissions()
     await log_activity("user_management", "menus", "delete", "success", current_user.id, {"menu_id": menu_id})
     return {"message": "Menu deleted successfully"}
 
@@ -1412,29 +2264,24 @@ async def create_role_permission(rp_data: RolePermission, current_user: User = D
     rp_dict.pop('_id', None)
     await db.role_permissions.insert_one(rp_dict)
     
+    await recompute_role_permissions([role_perm.role_id])
     await log_activity("user_management", "role_permissions", "create", "success", current_user.id, {"mapping_id": role_perm.id})
     return role_perm
 
 @api_router.put("/role-permissions/{rp_id}", response_model=RolePermission)
 async def update_role_permission(rp_id: str, rp_data: RolePermission, current_user: User = Depends(get_current_user)):
     """Update role-permission mapping"""
-    existing = await db.role_permissions.find_one({"id": rp_id, "is_active": True})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Role-Permission mapping not found")
-    
     # Only update the fields that should be updated, exclude auto-generated fields
     rp_dict = rp_data.dict(exclude={'id', 'created_at', 'created_by', 'is_active'})
     rp_dict['updated_by'] = current_user.id
     rp_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
     rp_dict.pop('_id', None)
     
-    await db.role_permissions.update_one({"id": rp_id}, {"$set": rp_dict})
-    
-    updated_rp = await db.role_permissions.find_one({"id": rp_id})
-    if not updated_rp:
-        raise HTTPException(status_code=404, detail="Role-Permission mapping not found after update")
-    updated_rp.pop('_id', None)
+    updated_rp = await update_one_and_fetch(
+        db.role_permissions, {"id": rp_id, "is_active": True}, {"$set": rp_dict}, "Role-Permission mapping not found"
+    )
     
+    await recompute_role_permissions()
     await log_activity("user_management", "role_permissions", "update", "success", current_user.id, {"mapping_id": rp_id})
     return RolePermission(**parse_from_mongo(updated_rp))
 
@@ -1450,6 +2297,7 @@ async def delete_role_permission(rp_id: str, current_user: User = Depends(get_cu
         {"$set": {"is_active": False, "updated_by": current_user.id, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     
+    await recompute_role_permissions([existing["role_id"]])
     await log_activity("user_management", "role_permissions", "delete", "success", current_user.id, {"mapping_id": rp_id})
     return {"message": "Role-Permission mapping deleted successfully"}
 
@@ -1457,32 +2305,557 @@ async def delete_role_permission(rp_id: str, current_user: User = Depends(get_cu
 @api_router.get("/activity-logs", response_model=List[ActivityLog])
 async def get_activity_logs(current_user: User = Depends(get_current_user)):
     """Get activity logs"""
-    logs = await db.activity_logs.find().sort("created_at", -1).limit(100).to_list(length=None)
+    logs = await read_db().activity_logs.find().sort([("created_at", -1), ("id", -1)]).limit(100).to_list(length=None)
     result = []
     for log in logs:
         log.pop('_id', None)
         result.append(ActivityLog(**parse_from_mongo(log)))
     return result
 
+def encode_activity_log_cursor(log: dict) -> str:
+    """Encode the (created_at, id) position of a log entry as an opaque cursor"""
+    position = {"t": log["created_at"].isoformat(), "id": log["id"]}
+    return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('utf-8')
+
+def decode_activity_log_cursor(cursor: str) -> tuple:
+    """Decode a cursor produced by encode_activity_log_cursor"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')))
+        return datetime.fromisoformat(position["t"]), position["id"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@api_router.get("/activity-logs/search", response_model=ActivityLogPage)
+async def search_activity_logs(
+    user_id: Optional[str] = None,
+    module: Optional[str] = None,
+    action: Optional[str] = None,
+    status: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    current_user: User = Depends(get_current_user)
+):
+    """Filter activity logs, newest first, with cursor pagination"""
+    limit = max(1, min(limit, ACTIVITY_LOG_MAX_PAGE_SIZE))
+    
+    # Equality filters first so every query is served by one of the compound indexes
+    query = {}
+    if user_id:
+        query["user_id"] = user_id
+    if module:
+        query["module_name"] = module
+    if action:
+        query["action"] = action
+    if status:
+        query["status"] = status
+    
+    created_at_range = {}
+    if start:
+        created_at_range["$gte"] = start
+    if end:
+        created_at_range["$lt"] = end
+    if created_at_range:
+        query["created_at"] = created_at_range
+    
+    # Resume strictly after the last entry of the previous page
+    if cursor:
+        cursor_time, cursor_id = decode_activity_log_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": cursor_time}},
+            {"created_at": cursor_time, "id": {"$lt": cursor_id}}
+        ]
+    
+    logs = await read_db().activity_logs.find(query).sort(
+        [("created_at", DESCENDING), ("id", DESCENDING)]
+    ).limit(limit).to_list(length=None)
+    
+    # Historical ranges continue into the on-disk archive once the hot collection is exhausted
+    if len(logs) < limit and start and to_naive_utc(start) < activity_log_archive_cutoff():
+        if logs:
+            position = (logs[-1]["created_at"], logs[-1]["id"])
+        elif cursor:
+            position = (cursor_time, cursor_id)
+        else:
+            position = None
+        logs += await read_archived_activity_logs(query, start, end, position, limit - len(logs))
+    
+    next_cursor = encode_activity_log_cursor(logs[-1]) if len(logs) == limit else None
+    
+    result = []
+    for log in logs:
+        log.pop('_id', None)
+        result.append(ActivityLog(**parse_from_mongo(log)))
+    return ActivityLogPage(logs=result, next_cursor=next_cursor)
+
+# ================ DATABASE INDEXES ================
+
+async def ensure_activity_log_indexes():
+    """Create the retention TTL index and the compound query indexes for activity logs"""
+    retention_seconds = ACTIVITY_LOG_RETENTION_DAYS * 24 * 60 * 60
+    try:
+        await db.activity_logs.create_index(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=retention_seconds
+        )
+    except OperationFailure:
+        # Retention was changed since the index was built - update it in place
+        await db.command({
+            "collMod": "activity_logs",
+            "index": {"name": "created_at_ttl", "expireAfterSeconds": retention_seconds}
+        })
+    
+    await db.activity_logs.create_indexes([
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_created_at"),
+        IndexModel([("module_name", ASCENDING), ("action", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="module_action_created_at"),
+        IndexModel([("action", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="action_status_created_at"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="status_created_at"),
+        IndexModel([("details.resource_id", ASCENDING), ("created_at", DESCENDING)], name="audit_resource_created_at", sparse=True),
+    ])
+
+async def ensure_contact_indexes():
+    """Indexes backing contact uniqueness checks and bulk import lookups"""
+    await db.contacts.create_indexes([
+        IndexModel([("email", ASCENDING)], name="email_ci", collation=CASE_INSENSITIVE),
+        IndexModel([("company_id", ASCENDING), ("first_name", ASCENDING)], name="company_first_name_ci", collation=CASE_INSENSITIVE),
+        IndexModel([("company_id", ASCENDING), ("spoc", ASCENDING)], name="company_spoc"),
+        IndexModel([("company_id", ASCENDING), ("decision_maker", ASCENDING)], name="company_decision_maker"),
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+    ])
+    await db.import_job_errors.create_index([("job_id", ASCENDING), ("row", ASCENDING)], name="job_row")
+
+async def ensure_company_indexes():
+    """Indexes backing company lookups and duplicate detection"""
+    await db.companies.create_indexes([
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IndexModel([("name", ASCENDING)], name="name_ci", collation=CASE_INSENSITIVE),
+        IndexModel([("gst_number", ASCENDING)], name="gst_number_ci", sparse=True, collation=CASE_INSENSITIVE),
+        IndexModel([("pan_number", ASCENDING)], name="pan_number_ci", sparse=True, collation=CASE_INSENSITIVE),
+        IndexModel([("ancestor_ids", ASCENDING), ("depth", ASCENDING)], name="ancestor_ids_depth"),
+    ])
+
+async def ensure_sales_rollup_indexes():
+    """Rollup documents are addressed by key"""
+    await db.sales_rollups.create_index([("key", ASCENDING)], name="key", unique=True)
+
+async def ensure_sales_pipeline_indexes():
+    """Indexes for lead/opportunity lists and kanban columns, and the stage totals"""
+    await db.leads.create_indexes([
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IndexModel([("status", ASCENDING), ("owner_user_id", ASCENDING), ("created_at", DESCENDING)], name="status_owner_created_at"),
+        IndexModel([("company_id", ASCENDING)], name="company_id"),
+    ])
+    await db.opportunities.create_indexes([
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IndexModel([("stage", ASCENDING), ("owner_user_id", ASCENDING), ("close_date", ASCENDING)], name="stage_owner_close_date"),
+        IndexModel([("owner_user_id", ASCENDING), ("close_date", ASCENDING)], name="owner_close_date"),
+        IndexModel([("company_id", ASCENDING)], name="company_id"),
+    ])
+    await db.pipeline_stage_totals.create_index([("key", ASCENDING)], name="key", unique=True)
+
+async def ensure_document_indexes():
+    """Indexes for the content-addressed document store"""
+    await db.document_blobs.create_indexes([
+        IndexModel([("sha256", ASCENDING)], name="sha256", unique=True),
+        IndexModel([("ref_count", ASCENDING), ("unreferenced_since", ASCENDING)], name="gc_candidates"),
+    ])
+
+async def ensure_auth_indexes():
+    """Sessions and revoked token ids expire on their own (TTL); revoked ids are synced by revoked_at"""
+    await db.auth_sessions.create_indexes([
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IndexModel([("user_id", ASCENDING), ("revoked_at", ASCENDING)], name="user_revoked_at"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ])
+    await db.revoked_tokens.create_indexes([
+        IndexModel([("revoked_at", ASCENDING)], name="revoked_at"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ])
+
+async def ensure_role_permission_indexes():
+    """Role permission rows are read per role; each role has one precomputed closure"""
+    await db.role_permissions.create_index([("role_id", ASCENDING), ("is_active", ASCENDING)], name="role_active")
+    await db.role_permission_closures.create_index([("role_id", ASCENDING)], name="role_id", unique=True)
+
+async def ensure_indexes():
+    """Create all indexes the API relies on (idempotent)"""
+    await ensure_activity_log_indexes()
+    await ensure_auth_indexes()
+    await ensure_role_permission_indexes()
+    await ensure_contact_indexes()
+    await ensure_company_indexes()
+    await ensure_document_indexes()
+    await ensure_sales_rollup_indexes()
+    await ensure_sales_pipeline_indexes()
+
+# ================ BACKGROUND JOBS ================
+
+background_tasks: set = set()
+
+async def acquire_lease(name: str, ttl_seconds: int) -> bool:
+    """Take or renew a named lease so only one worker runs a job at a time"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.system_locks.find_one_and_update(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"owner": WORKER_ID}]},
+            {"$set": {"owner": WORKER_ID, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Another worker holds an unexpired lease
+        return False
+
+async def renew_lease(name: str, ttl_seconds: int):
+    """Keep renewing a lease this worker holds, at a third of its TTL, until cancelled; for work
+    that may outlast one TTL"""
+    while True:
+        await asyncio.sleep(ttl_seconds / 3)
+        if not await acquire_lease(name, ttl_seconds):
+            logger.warning(f"Lease {name} was taken over by another worker")
+
+async def release_lease(name: str):
+    """Release a lease held by this worker"""
+    await db.system_locks.delete_one({"_id": name, "owner": WORKER_ID})
+
+def start_background_task(coro):
+    """Run a coroutine for the lifetime of the app; cancelled on shutdown.
+    Runs in a fresh context so it does not inherit the starting request's query budget."""
+    task = contextvars.Context().run(asyncio.create_task, coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# ================ ACTIVITY LOG ARCHIVE ================
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Normalize a datetime to naive UTC, the form Mongo returns"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def activity_log_archive_cutoff() -> datetime:
+    """Entries created before this instant live in the archive, not in Mongo"""
+    return to_naive_utc(datetime.now(timezone.utc) - timedelta(days=ACTIVITY_LOG_ARCHIVE_AFTER_DAYS))
+
+def load_archive_manifest() -> dict:
+    """Read the archive manifest (blocking - call via a thread)"""
+    manifest_path = ACTIVITY_LOG_ARCHIVE_DIR / "manifest.json"
+    if not manifest_path.exists():
+        return {"partitions": {}}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+def save_archive_manifest(manifest: dict):
+    """Atomically replace the archive manifest (blocking - call via a thread)"""
+    ACTIVITY_LOG_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    manifest["updated_at"] = datetime.now(timezone.utc).isoformat()
+    tmp_path = ACTIVITY_LOG_ARCHIVE_DIR / f".manifest.{WORKER_ID.replace(':', '_')}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, ACTIVITY_LOG_ARCHIVE_DIR / "manifest.json")
+
+def write_archive_partition(day: str, logs: List[dict]) -> dict:
+    """Write one day's logs to a gzipped NDJSON part file (blocking - call via a thread)
+
+    The part is named after its first entry, so re-archiving a batch after a crash
+    overwrites the same file instead of duplicating entries.
+    """
+    partition_dir = ACTIVITY_LOG_ARCHIVE_DIR / day.replace("-", "/")
+    partition_dir.mkdir(parents=True, exist_ok=True)
+    part_name = f"part-{logs[0]['id']}.ndjson.gz"
+    tmp_path = partition_dir / f".{part_name}.tmp"
+    
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for log in logs:
+            record = {k: v for k, v in log.items() if k != "_id"}
+            record["created_at"] = log["created_at"].isoformat()
+            f.write(json.dumps(record, default=str) + "\n")
+    os.replace(tmp_path, partition_dir / part_name)
+    
+    return {
+        "file": f"{day.replace('-', '/')}/{part_name}",
+        "count": len(logs),
+        "min_created_at": logs[0]["created_at"].isoformat(),
+        "max_created_at": logs[-1]["created_at"].isoformat(),
+        "bytes": (partition_dir / part_name).stat().st_size
+    }
+
+def read_archive_partition(relative_path: str) -> List[dict]:
+    """Load every entry of one part file (blocking - call via a thread)"""
+    logs = []
+    with gzip.open(ACTIVITY_LOG_ARCHIVE_DIR / relative_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            log = json.loads(line)
+            log["created_at"] = datetime.fromisoformat(log["created_at"])
+            logs.append(log)
+    return logs
+
+async def archive_activity_logs(older_than_days: Optional[int] = None) -> int:
+    """Move activity logs older than the cutoff from Mongo into date-partitioned archive files"""
+    days = ACTIVITY_LOG_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    manifest = await asyncio.to_thread(load_archive_manifest)
+    archived = 0
+    
+    while True:
+        # Always the primary: what is read here is deleted below
+        batch = await db.activity_logs.find({"created_at": {"$lt": cutoff}}).sort(
+            [("created_at", ASCENDING), ("id", ASCENDING)]
+        ).limit(ACTIVITY_LOG_ARCHIVE_BATCH_SIZE).to_list(length=None)
+        if not batch:
+            break
+        
+        partitions: Dict[str, List[dict]] = {}
+        for log in batch:
+            partitions.setdefault(log["created_at"].date().isoformat(), []).append(log)
+        
+        for day, logs in partitions.items():
+            part = await asyncio.to_thread(write_archive_partition, day, logs)
+            manifest["partitions"].setdefault(day, {})[part["file"]] = part
+        
+        # Persist the manifest before deleting so archived entries are always discoverable
+        await asyncio.to_thread(save_archive_manifest, manifest)
+        await db.activity_logs.delete_many({"_id": {"$in": [log["_id"] for log in batch]}})
+        archived += len(batch)
+    
+    if archived:
+        logger.info(f"Archived {archived} activity logs older than {days} days")
+    return archived
+
+async def read_archived_activity_logs(
+    query: dict,
+    start: datetime,
+    end: Optional[datetime],
+    position: Optional[tuple],
+    limit: int
+) -> List[dict]:
+    """Read archived logs newest first, scanning only partitions that overlap the range"""
+    manifest = await asyncio.to_thread(load_archive_manifest)
+    
+    start = to_naive_utc(start)
+    end = to_naive_utc(end) if end else None
+    first_day = start.date().isoformat()
+    last_day = (end or datetime.max).date().isoformat()
+    if position:
+        last_day = min(last_day, position[0].date().isoformat())
+    
+    equality_filters = {
+        field: query[field] for field in ("user_id", "module_name", "action", "status") if field in query
+    }
+    
+    def matches(log: dict) -> bool:
+        if any(log.get(field) != value for field, value in equality_filters.items()):
+            return False
+        if log["created_at"] < start or (end and log["created_at"] >= end):
+            return False
+        if position and (log["created_at"], log["id"]) >= position:
+            return False
+        return True
+    
+    results = []
+    for day in sorted(manifest["partitions"], reverse=True):
+        if day > last_day:
+            continue
+        if day < first_day or len(results) >= limit:
+            break
+        
+        day_logs = []
+        for relative_path in manifest["partitions"][day]:
+            day_logs.extend(
+                log for log in await asyncio.to_thread(read_archive_partition, relative_path) if matches(log)
+            )
+        day_logs.sort(key=lambda log: (log["created_at"], log["id"]), reverse=True)
+        results.extend(day_logs[:limit - len(results)])
+    
+    return results
+
+async def run_activity_log_archiver():
+    """Periodically archive old activity logs; one worker at a time via a lease"""
+    while True:
+        try:
+            if await acquire_lease("activity_log_archiver", ACTIVITY_LOG_ARCHIVE_INTERVAL_SECONDS):
+                await archive_activity_logs()
+        except Exception as e:
+            logger.error(f"Activity log archiver error: {e}")
+        await asyncio.sleep(ACTIVITY_LOG_ARCHIVE_INTERVAL_SECONDS)
+
 # ================ STARTUP EVENT ================
 
+# Per-worker cold-start timings, reported at GET /system/startup-metrics
+startup_metrics: Dict[str, Any] = {
+    "worker_id": WORKER_ID,
+    "process_started_at": datetime.fromtimestamp(PROCESS_STARTED_AT, timezone.utc).isoformat(),
+    "phases_ms": {},
+    "seeded": False,
+    "seed_wait_ms": 0.0,
+    "startup_ms": None,
+    "first_request_ms": None
+}
+
+def elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+@app.middleware("http")
+async def bind_request_context(request: Request, call_next):
+    """Give each request a fresh RequestContext; report what it avoided in X-Avoided-Queries"""
+    context = RequestContext()
+    token = request_context.set(context)
+    try:
+        response = await call_next(request)
+    finally:
+        request_context.reset(token)
+    if context.avoided:
+        response.headers["X-Avoided-Queries"] = ", ".join(
+            f"{kind}={count}" for kind, count in sorted(context.avoided.items())
+        )
+        db_metrics.record_avoided(context.avoided)
+    return response
+
+@app.middleware("http")
+async def record_first_request(request: Request, call_next):
+    """Record time from process start to the first served request"""
+    response = await call_next(request)
+    if startup_metrics["first_request_ms"] is None:
+        startup_metrics["first_request_ms"] = round((time.time() - PROCESS_STARTED_AT) * 1000, 1)
+        logger.info(f"Cold start: first request served {startup_metrics['first_request_ms']}ms after process start")
+    return response
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize default data"""
+    started = time.perf_counter()
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.error(f"Index creation error: {e}")
+    startup_metrics["phases_ms"]["indexes"] = elapsed_ms(started)
+    
+    # Load the denylist before serving, so a restarted worker never accepts a revoked token
+    phase_started = time.perf_counter()
+    try:
+        await sync_token_denylist()
+    except Exception as e:
+        logger.error(f"Token denylist load error: {e}")
+    startup_metrics["phases_ms"]["token_denylist"] = elapsed_ms(phase_started)
+    start_background_task(run_token_denylist_sync())
+    
+    if ACTIVITY_LOG_ARCHIVE_ENABLED:
+        if ACTIVITY_LOG_ARCHIVE_AFTER_DAYS >= ACTIVITY_LOG_RETENTION_DAYS:
+            logger.warning("ACTIVITY_LOG_ARCHIVE_AFTER_DAYS >= ACTIVITY_LOG_RETENTION_DAYS: logs expire before they are archived")
+        start_background_task(run_activity_log_archiver())
+    start_background_task(run_document_gc())
+    start_background_task(run_company_counter_reconciler())
+    
+    phase_started = time.perf_counter()
+    try:
+        await backfill_company_hierarchy()
+        await backfill_record_versions()
+    except Exception as e:
+        logger.error(f"Company hierarchy backfill error: {e}")
+    startup_metrics["phases_ms"]["hierarchy_backfill"] = elapsed_ms(phase_started)
+    
+    phase_started = time.perf_counter()
+    try:
+        # First run: build the rollups once; afterwards company writes keep them current
+        if not await db.sales_rollups.count_documents({}, limit=1) and await acquire_lease("sales_rollup_rebuild", 300):
+            await rebuild_sales_rollups()
+            await release_lease("sales_rollup_rebuild")
+        if not await db.pipeline_stage_totals.count_documents({}, limit=1) and await acquire_lease("pipeline_rebuild", 300):
+            await rebuild_pipeline_totals()
+            await release_lease("pipeline_rebuild")
+    except Exception as e:
+        logger.error(f"Sales rollup build error: {e}")
+    startup_metrics["phases_ms"]["rollups"] = elapsed_ms(phase_started)
+    
+    phase_started = time.perf_counter()
+    try:
+        startup_metrics["seeded"] = await run_startup_seeding()
+    except Exception as e:
+        logger.error(f"Startup error: {e}")
+    startup_metrics["phases_ms"]["seeding"] = elapsed_ms(phase_started)
+    
+    startup_metrics["startup_ms"] = elapsed_ms(started)
+    logger.info(f"Worker {WORKER_ID} started in {startup_metrics['startup_ms']}ms: {startup_metrics['phases_ms']}")
+
+async def backfill_record_versions():
+    """Give companies and contacts that predate versioning version 1 (idempotent)"""
+    for collection in (db.companies, db.contacts):
+        await collection.update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+
+async def run_startup_seeding() -> bool:
+    """Seed default data from one worker; the others wait for it (bounded) instead of racing"""
+    started = time.perf_counter()
+    deadline = time.monotonic() + STARTUP_SEED_WAIT_SECONDS
+    while not await acquire_lease("startup_seed", STARTUP_SEED_LEASE_SECONDS):
+        if time.monotonic() >= deadline:
+            logger.warning("Timed out waiting for another worker to seed default data")
+            return False
+        await asyncio.sleep(0.25)
+    startup_metrics["seed_wait_ms"] = elapsed_ms(started)
+    # Seeding can outlast one lease TTL on a slow database; another worker must not start seeding too
+    renewal = asyncio.create_task(renew_lease("startup_seed", STARTUP_SEED_LEASE_SECONDS))
+    
     try:
-        # Create default admin user if not exists
-        admin_user = await db.users.find_one({"username": "admin", "is_active": True})
-        if not admin_user:
+        # Re-checked under the lease, so a worker that waited finds the data present and skips
+        seeded = False
+        if not await db.users.find_one({"username": "admin", "is_active": True}, {"_id": 1}):
             await initialize_rbac_system()
             logger.info("RBAC system initialized with default admin user: admin/admin123")
-        
-        # Always check and initialize company master data
-        if await db.company_types.count_documents({}) == 0:
+            seeded = True
+        if not await db.company_types.find_one({}, {"_id": 1}):
             await initialize_company_master_data()
             logger.info("Company master data initialized")
-            
-    except Exception as e:
-        logger.error(f"Startup error: {e}")
+            seeded = True
+        # Effective role permissions for a fresh database, or one that predates role inheritance
+        if not await db.role_permission_closures.find_one({}, {"_id": 1}):
+            await recompute_role_permissions()
+            logger.info("Role permission closures computed")
+        return seeded
+    finally:
+        renewal.cancel()
+        await release_lease("startup_seed")
+
+@api_router.get("/system/startup-metrics")
+async def get_startup_metrics(current_user: User = Depends(get_current_user)):
+    """Cold-start timings of the worker that served this request"""
+    return startup_metrics
+
+@api_router.get("/system/db-metrics")
+async def get_db_metrics(current_user: User = Depends(get_current_user)):
+    """Connection pool usage, pool settings, query budget timeouts and lookups avoided by
+    request-scoped memoization, for the serving worker"""
+    return {
+        "worker_id": WORKER_ID,
+        "pool": {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            "compressors": MONGO_COMPRESSORS
+        },
+        "route_classes": DB_ROUTE_CLASSES,
+        **db_metrics.snapshot()
+    }
+
+async def seed_collection(collection, documents: List[dict], key_fields: tuple) -> Dict[tuple, dict]:
+    """Insert documents missing by natural key in one batch, leaving existing ones untouched.
+    Returns {natural key: stored document} so callers can reference the stored ids."""
+    def key_filter(document):
+        return {field: document[field] for field in key_fields}
+    
+    await collection.bulk_write(
+        [UpdateOne(key_filter(d), {"$setOnInsert": d}, upsert=True) for d in documents],
+        ordered=False
+    )
+    stored = await collection.find({"$or": [key_filter(d) for d in documents]}, {"_id": 0}).to_list(None)
+    return {tuple(doc.get(field) for field in key_fields): doc for doc in stored}
+
+def seed_model(model_class, **fields) -> dict:
+    """Build a system-created document from an RBAC model"""
+    return prepare_for_mongo(model_class(**fields, created_by="system").dict())
 
 async def initialize_rbac_system():
     """Initialize complete RBAC system with permissions, modules, menus, and roles"""
@@ -1495,14 +2868,9 @@ async def initialize_rbac_system():
         {"name": "Delete", "description": "Delete records (soft delete)"},
         {"name": "Export", "description": "Export data to Excel/CSV"}
     ]
-    
-    created_permissions = {}
-    for perm_data in permissions_data:
-        perm = Permission(**perm_data, created_by="system")
-        perm_dict = prepare_for_mongo(perm.dict())
-        perm_dict.pop('_id', None)
-        await db.permissions.insert_one(perm_dict)
-        created_permissions[perm_data["name"]] = perm.id
+    permissions = await seed_collection(
+        db.permissions, [seed_model(Permission, **p) for p in permissions_data], ("name",)
+    )
     
     # 2. Create default modules
     modules_data = [
@@ -1510,294 +2878,153 @@ async def initialize_rbac_system():
         {"name": "Sales", "description": "Sales and CRM features"},
         {"name": "System", "description": "System administration"}
     ]
-    
-    created_modules = {}
-    for mod_data in modules_data:
-        mod = Module(**mod_data, created_by="system")
-        mod_dict = prepare_for_mongo(mod.dict())
-        mod_dict.pop('_id', None)
-        await db.modules.insert_one(mod_dict)
-        created_modules[mod_data["name"]] = mod.id
+    modules = await seed_collection(db.modules, [seed_model(Module, **m) for m in modules_data], ("name",))
+    module_ids = {name: module["id"] for (name,), module in modules.items()}
     
     # 3. Create default menus
     menus_data = [
         # User Management menus
-        {"name": "Users", "path": "/users", "module_id": created_modules["User Management"], "order_index": 1},
-        {"name": "Roles", "path": "/roles", "module_id": created_modules["User Management"], "order_index": 2},
-        {"name": "Departments", "path": "/departments", "module_id": created_modules["User Management"], "order_index": 3},
-        {"name": "Designations", "path": "/designations", "module_id": created_modules["User Management"], "order_index": 4},
-        {"name": "Permissions", "path": "/permissions", "module_id": created_modules["User Management"], "order_index": 5},
-        {"name": "Modules", "path": "/modules", "module_id": created_modules["User Management"], "order_index": 6},
-        {"name": "Menus", "path": "/menus", "module_id": created_modules["User Management"], "order_index": 7},
-        {"name": "Role Permissions", "path": "/role-permissions", "module_id": created_modules["User Management"], "order_index": 8},
+        {"name": "Users", "path": "/users", "module_id": module_ids["User Management"], "order_index": 1},
+        {"name": "Roles", "path": "/roles", "module_id": module_ids["User Management"], "order_index": 2},
+        {"name": "Departments", "path": "/departments", "module_id": module_ids["User Management"], "order_index": 3},
+        {"name": "Designations", "path": "/designations", "module_id": module_ids["User Management"], "order_index": 4},
+        {"name": "Permissions", "path": "/permissions", "module_id": module_ids["User Management"], "order_index": 5},
+        {"name": "Modules", "path": "/modules", "module_id": module_ids["User Management"], "order_index": 6},
+        {"name": "Menus", "path": "/menus", "module_id": module_ids["User Management"], "order_index": 7},
+        {"name": "Role Permissions", "path": "/role-permissions", "module_id": module_ids["User Management"], "order_index": 8},
         
         # Sales menus
-        {"name": "Companies", "path": "/companies", "module_id": created_modules["Sales"], "order_index": 1},
-        {"name": "Contacts", "path": "/contacts", "module_id": created_modules["Sales"], "order_index": 2},
-        {"name": "Channel Partners", "path": "/channel-partners", "module_id": created_modules["Sales"], "order_index": 3},
-        {"name": "Leads", "path": "/leads", "module_id": created_modules["Sales"], "order_index": 4},
-        {"name": "Opportunities", "path": "/opportunities", "module_id": created_modules["Sales"], "order_index": 5},
+        {"name": "Companies", "path": "/companies", "module_id": module_ids["Sales"], "order_index": 1},
+        {"name": "Contacts", "path": "/contacts", "module_id": module_ids["Sales"], "order_index": 2},
+        {"name": "Channel Partners", "path": "/channel-partners", "module_id": module_ids["Sales"], "order_index": 3},
+        {"name": "Leads", "path": "/leads", "module_id": module_ids["Sales"], "order_index": 4},
+        {"name": "Opportunities", "path": "/opportunities", "module_id": module_ids["Sales"], "order_index": 5},
         
         # System menus
-        {"name": "Activity Logs", "path": "/activity-logs", "module_id": created_modules["System"], "order_index": 1}
+        {"name": "Activity Logs", "path": "/activity-logs", "module_id": module_ids["System"], "order_index": 1}
     ]
-    
-    created_menus = {}
-    for menu_data in menus_data:
-        menu = Menu(**menu_data, created_by="system")
-        menu_dict = prepare_for_mongo(menu.dict())
-        menu_dict.pop('_id', None)
-        await db.menus.insert_one(menu_dict)
-        created_menus[menu_data["name"]] = menu.id
+    menus = await seed_collection(db.menus, [seed_model(Menu, **m) for m in menus_data], ("module_id", "name"))
     
     # 4. Create default role
-    admin_role = Role(
-        name="Super Admin",
-        code="SUPER_ADMIN",
-        description="Full system access",
-        created_by="system"
-    )
-    role_dict = prepare_for_mongo(admin_role.dict())
-    role_dict.pop('_id', None)
-    await db.roles.insert_one(role_dict)
+    roles = await seed_collection(db.roles, [seed_model(
+        Role, name="Super Admin", code="SUPER_ADMIN", description="Full system access"
+    )], ("code",))
+    admin_role_id = roles[("SUPER_ADMIN",)]["id"]
     
     # 5. Create role-permission mappings (give admin all permissions for all menus)
-    for menu_name, menu_id in created_menus.items():
-        menu_doc = await db.menus.find_one({"id": menu_id})
-        if menu_doc:
-            for perm_name, perm_id in created_permissions.items():
-                role_perm = RolePermission(
-                    role_id=admin_role.id,
-                    module_id=menu_doc["module_id"],
-                    menu_id=menu_id,
-                    permission_id=perm_id,
-                    created_by="system"
-                )
-                rp_dict = prepare_for_mongo(role_perm.dict())
-                rp_dict.pop('_id', None)
-                await db.role_permissions.insert_one(rp_dict)
+    await seed_collection(db.role_permissions, [
+        seed_model(RolePermission, role_id=admin_role_id, module_id=menu["module_id"],
+                   menu_id=menu["id"], permission_id=permission["id"])
+        for menu in menus.values()
+        for permission in permissions.values()
+    ], ("role_id", "menu_id", "permission_id"))
     
     # 6. Create default department and designation
-    default_dept = Department(name="IT", created_by="system")
-    dept_dict = prepare_for_mongo(default_dept.dict())
-    dept_dict.pop('_id', None)
-    await db.departments.insert_one(dept_dict)
-    
-    default_desig = Designation(name="Administrator", created_by="system")
-    desig_dict = prepare_for_mongo(default_desig.dict())
-    desig_dict.pop('_id', None)
-    await db.designations.insert_one(desig_dict)
+    departments = await seed_collection(db.departments, [seed_model(Department, name="IT")], ("name",))
+    designations = await seed_collection(db.designations, [seed_model(Designation, name="Administrator")], ("name",))
     
     # 7. Create default admin user
-    admin = User(
+    await seed_collection(db.users, [seed_model(
+        User,
         username="admin",
         email="admin@sawayatta.com",
         password_hash=hash_password("admin123"),
-        role_id=admin_role.id,
-        department_id=default_dept.id,
-        designation_id=default_desig.id,
-        created_by="system"
-    )
-    user_dict = prepare_for_mongo(admin.dict())
-    user_dict.pop('_id', None)
-    await db.users.insert_one(user_dict)
+        role_id=admin_role_id,
+        department_id=departments[("IT",)]["id"],
+        designation_id=designations[("Administrator",)]["id"]
+    )], ("username",))
 
-    # Initialize company registration master data
-    await initialize_company_master_data()
+def master_record(name: str, **fields) -> dict:
+    """Build a system-created master data document"""
+    return {"id": str(uuid.uuid4()), "name": name, **fields, "is_active": True,
+            "created_by": "system", "created_at": datetime.now(timezone.utc)}
 
 async def initialize_company_master_data():
-    """Initialize master data for company registration"""
+    """Initialize master data for company registration; safe to re-run, existing rows are kept"""
+    logger.info("Initializing company registration master data...")
     
-    # Check if data already exists
-    if await db.company_types.count_documents({}) > 0:
-        return
+    await asyncio.gather(
+        # Company Types
+        seed_collection(db.company_types, [master_record(name) for name in [
+            "Private Limited", "Public Limited", "Partnership", "Sole Proprietorship", "LLP"
+        ]], ("name",)),
+        # Account Types
+        seed_collection(db.account_types, [master_record(name) for name in [
+            "Customer", "Prospect", "Partner", "Vendor"
+        ]], ("name",)),
+        # Regions
+        seed_collection(db.regions, [master_record(name) for name in [
+            "North India", "South India", "East India", "West India", "Central India", "Northeast India"
+        ]], ("name",)),
+        # Business Types
+        seed_collection(db.business_types, [master_record(name) for name in ["B2B", "B2C", "B2G", "C2C"]], ("name",)),
+        # Currencies
+        seed_collection(db.currencies, [
+            master_record("Indian Rupee", code="INR", symbol="₹"),
+            master_record("US Dollar", code="USD", symbol="$"),
+            master_record("Euro", code="EUR", symbol="€"),
+        ], ("code",)),
+        # Designations
+        seed_collection(db.designations, [master_record(name) for name in [
+            "Chief Executive Officer", "Chief Technology Officer", "Chief Financial Officer", "Managing Director",
+            "General Manager", "Assistant General Manager", "Deputy General Manager", "Senior Manager", "Manager",
+            "Assistant Manager", "Senior Executive", "Executive", "Senior Associate", "Associate", "Team Lead",
+            "Senior Analyst", "Analyst", "Consultant", "Senior Consultant", "Director"
+        ]], ("name",)),
+    )
     
-    logger.info("Initializing company registration master data...")
+    # Industries and Sub-Industries
+    industries = await seed_collection(db.industries, [master_record(name) for name in [
+        "Technology", "Finance", "Healthcare", "Manufacturing", "Retail", "Education", "Real Estate", "Agriculture"
+    ]], ("name",))
+    sub_industries = {
+        "Technology": ["Software Development", "Cloud Services", "AI/ML", "Cybersecurity"],
+        "Finance": ["Banking", "Insurance", "Investment", "Fintech"],
+        "Healthcare": ["Pharmaceuticals", "Medical Devices", "Telemedicine"],
+        "Manufacturing": ["Automotive", "Electronics", "Textiles"],
+    }
     
-    # Company Types
-    company_types = [
-        {"id": str(uuid.uuid4()), "name": "Private Limited", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Public Limited", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Partnership", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Sole Proprietorship", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "LLP", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-    ]
-    await db.company_types.insert_many(company_types)
-    
-    # Account Types
-    account_types = [
-        {"id": str(uuid.uuid4()), "name": "Customer", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Prospect", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Partner", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Vendor", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-    ]
-    await db.account_types.insert_many(account_types)
-    
-    # Regions
-    regions = [
-        {"id": str(uuid.uuid4()), "name": "North India", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "South India", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "East India", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "West India", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Central India", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Northeast India", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-    ]
-    await db.regions.insert_many(regions)
-    
-    # Business Types
-    business_types = [
-        {"id": str(uuid.uuid4()), "name": "B2B", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "B2C", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "B2G", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "C2C", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-    ]
-    await db.business_types.insert_many(business_types)
-    
-    # Industries
-    industries_data = [
-        {"id": str(uuid.uuid4()), "name": "Technology", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Finance", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Healthcare", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Manufacturing", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Retail", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Education", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Real Estate", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Agriculture", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-    ]
-    await db.industries.insert_many(industries_data)
-    
-    # Sub-Industries
-    tech_id = next(i["id"] for i in industries_data if i["name"] == "Technology")
-    finance_id = next(i["id"] for i in industries_data if i["name"] == "Finance")
-    healthcare_id = next(i["id"] for i in industries_data if i["name"] == "Healthcare")
-    manufacturing_id = next(i["id"] for i in industries_data if i["name"] == "Manufacturing")
-    
-    sub_industries = [
-        # Technology sub-industries
-        {"id": str(uuid.uuid4()), "name": "Software Development", "industry_id": tech_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Cloud Services", "industry_id": tech_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "AI/ML", "industry_id": tech_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Cybersecurity", "industry_id": tech_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        
-        # Finance sub-industries
-        {"id": str(uuid.uuid4()), "name": "Banking", "industry_id": finance_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Insurance", "industry_id": finance_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Investment", "industry_id": finance_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Fintech", "industry_id": finance_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        
-        # Healthcare sub-industries
-        {"id": str(uuid.uuid4()), "name": "Pharmaceuticals", "industry_id": healthcare_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Medical Devices", "industry_id": healthcare_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Telemedicine", "industry_id": healthcare_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        
-        # Manufacturing sub-industries
-        {"id": str(uuid.uuid4()), "name": "Automotive", "industry_id": manufacturing_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Electronics", "industry_id": manufacturing_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Textiles", "industry_id": manufacturing_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-    ]
-    await db.sub_industries.insert_many(sub_industries)
-    
-    # Countries
-    countries = [
-        {"id": str(uuid.uuid4()), "name": "India", "code": "IN", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "United States", "code": "US", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "United Kingdom", "code": "GB", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Canada", "code": "CA", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Australia", "code": "AU", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Germany", "code": "DE", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "France", "code": "FR", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Japan", "code": "JP", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Singapore", "code": "SG", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-    ]
-    await db.countries.insert_many(countries)
-    
-    # States (focusing on India)
-    india_id = next(c["id"] for c in countries if c["name"] == "India")
-    us_id = next(c["id"] for c in countries if c["name"] == "United States")
-    
-    states = [
-        # Indian states
-        {"id": str(uuid.uuid4()), "name": "Maharashtra", "country_id": india_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Karnataka", "country_id": india_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Tamil Nadu", "country_id": india_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Gujarat", "country_id": india_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Delhi", "country_id": india_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Haryana", "country_id": india_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Punjab", "country_id": india_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Rajasthan", "country_id": india_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Uttar Pradesh", "country_id": india_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "West Bengal", "country_id": india_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        
-        # US states (sample)
-        {"id": str(uuid.uuid4()), "name": "California", "country_id": us_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "New York", "country_id": us_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Texas", "country_id": us_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-    ]
-    await db.states.insert_many(states)
-    
-    # Cities (focusing on major Indian cities)
-    maharashtra_id = next(s["id"] for s in states if s["name"] == "Maharashtra")
-    karnataka_id = next(s["id"] for s in states if s["name"] == "Karnataka")
-    delhi_id = next(s["id"] for s in states if s["name"] == "Delhi")
-    gujarat_id = next(s["id"] for s in states if s["name"] == "Gujarat")
-    
-    cities = [
-        # Maharashtra cities
-        {"id": str(uuid.uuid4()), "name": "Mumbai", "state_id": maharashtra_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Pune", "state_id": maharashtra_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Nagpur", "state_id": maharashtra_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        
-        # Karnataka cities
-        {"id": str(uuid.uuid4()), "name": "Bangalore", "state_id": karnataka_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Mysore", "state_id": karnataka_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        
-        # Delhi cities
-        {"id": str(uuid.uuid4()), "name": "New Delhi", "state_id": delhi_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Gurgaon", "state_id": delhi_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        
-        # Gujarat cities
-        {"id": str(uuid.uuid4()), "name": "Ahmedabad", "state_id": gujarat_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Surat", "state_id": gujarat_id, "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-    ]
-    await db.cities.insert_many(cities)
+    # Countries, States (focusing on India) and Cities (focusing on major Indian cities)
+    countries = await seed_collection(db.countries, [
+        master_record(name, code=code) for name, code in [
+            ("India", "IN"), ("United States", "US"), ("United Kingdom", "GB"), ("Canada", "CA"),
+            ("Australia", "AU"), ("Germany", "DE"), ("France", "FR"), ("Japan", "JP"), ("Singapore", "SG")
+        ]
+    ], ("code",))
+    states_by_country = {
+        "IN": ["Maharashtra", "Karnataka", "Tamil Nadu", "Gujarat", "Delhi", "Haryana", "Punjab",
+               "Rajasthan", "Uttar Pradesh", "West Bengal"],
+        "US": ["California", "New York", "Texas"],
+    }
     
-    # Currencies
-    currencies = [
-        {"id": str(uuid.uuid4()), "code": "INR", "name": "Indian Rupee", "symbol": "₹", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "code": "USD", "name": "US Dollar", "symbol": "$", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "code": "EUR", "name": "Euro", "symbol": "€", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-    ]
-    await db.currencies.insert_many(currencies)
-    
-    # Designations
-    designations = [
-        {"id": str(uuid.uuid4()), "name": "Chief Executive Officer", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Chief Technology Officer", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Chief Financial Officer", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Managing Director", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "General Manager", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Assistant General Manager", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Deputy General Manager", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Senior Manager", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Manager", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Assistant Manager", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Senior Executive", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Executive", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Senior Associate", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Associate", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Team Lead", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Senior Analyst", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Analyst", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Consultant", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Senior Consultant", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-        {"id": str(uuid.uuid4()), "name": "Director", "is_active": True, "created_by": "system", "created_at": datetime.now(timezone.utc)},
-    ]
-    await db.designations.insert_many(designations)
+    _, states = await asyncio.gather(
+        seed_collection(db.sub_industries, [
+            master_record(name, industry_id=industries[(industry,)]["id"])
+            for industry, names in sub_industries.items() for name in names
+        ], ("industry_id", "name")),
+        seed_collection(db.states, [
+            master_record(name, country_id=countries[(code,)]["id"])
+            for code, names in states_by_country.items() for name in names
+        ], ("country_id", "name")),
+    )
+    
+    state_ids = {state["name"]: state["id"] for state in states.values()}
+    cities_by_state = {
+        "Maharashtra": ["Mumbai", "Pune", "Nagpur"],
+        "Karnataka": ["Bangalore", "Mysore"],
+        "Delhi": ["New Delhi", "Gurgaon"],
+        "Gujarat": ["Ahmedabad", "Surat"],
+    }
+    await seed_collection(db.cities, [
+        master_record(name, state_id=state_ids[state]) for state, names in cities_by_state.items() for name in names
+    ], ("state_id", "name"))
     
     logger.info("Company registration master data initialized successfully")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in list(background_tasks):
+        task.cancel()
     client.close()
 
 # ================ COMPANY REGISTRATION MODELS ================
@@ -1864,6 +3091,7 @@ class CompanyDocument(BaseModel):
     file_path: str
     file_size: int
     mime_type: str
+    sha256: Optional[str] = None
     uploaded_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Company(BaseAuditModel):
@@ -1882,6 +3110,8 @@ class Company(BaseAuditModel):
     website: Optional[str] = None
     is_child: bool = False
     parent_company_id: Optional[str] = None
+    ancestor_ids: List[str] = []  # Materialized path, root first; maintained on write
+    depth: int = 0
     employee_count: int = Field(..., ge=1)
     
     # Location
@@ -1900,6 +3130,14 @@ class Company(BaseAuditModel):
     company_profile: Optional[str] = None
     documents: List[CompanyDocument] = []
     
+    # Incremented by every edit; conditional writes compare it (If-Match / expected_version)
+    version: int = 1
+    
+    # Contact counters, maintained by the contact write paths
+    contact_count: int = 0
+    decision_maker_count: int = 0
+    spoc_contact_id: Optional[str] = None
+    
     # Scoring & Lead Status
     score: int = Field(default=0, ge=0, le=100)
     lead_status: str = Field(default="cold", pattern=r"^(hot|cold)$")
@@ -1941,6 +3179,7 @@ class CompanyCreate(BaseModel):
     
     # Documents & Profile
     company_profile: Optional[str] = None
+    documents: List[CompanyDocument] = []
     
     # Checklist validation
     valid_gst: bool = False
@@ -1949,6 +3188,67 @@ class CompanyCreate(BaseModel):
 
 # ================ COMPANY REGISTRATION ENDPOINTS ================
 
+# Fields dropped from company documents when empty
+COMPANY_OPTIONAL_FIELDS = ['gst_number', 'pan_number', 'vat_number', 'website', 'parent_company_id', 'company_profile']
+
+def map_company_create(company_data: CompanyCreate) -> dict:
+    """Map CompanyCreate fields to Company model fields"""
+    company_dict = {
+        # Use company_name as name for the Company model
+        "name": company_data.company_name,
+        "domestic_international": company_data.domestic_international,
+        "gst_number": company_data.gst_number,
+        "pan_number": company_data.pan_number,
+        "vat_number": company_data.vat_number,
+        "company_type_id": company_data.company_type_id,
+        "account_type_id": company_data.account_type_id,
+        "region_id": company_data.region_id,
+        "business_type_id": company_data.business_type_id,
+        "industry_id": company_data.industry_id,
+        "sub_industry_id": company_data.sub_industry_id,
+        "website": company_data.website,
+        "is_child": company_data.is_child,
+        "parent_company_id": company_data.parent_company_id,
+        "employee_count": company_data.employee_count,
+        "address": company_data.address,
+        "country_id": company_data.country_id,
+        "state_id": company_data.state_id,
+        "city_id": company_data.city_id,
+        "turnover": [t.dict() for t in company_data.turnover],
+        "profit": [p.dict() for p in company_data.profit],
+        "annual_revenue": company_data.annual_revenue,
+        "revenue_currency": company_data.revenue_currency,
+        "company_profile": company_data.company_profile,
+        "documents": [d.dict() for d in company_data.documents],
+        "valid_gst": company_data.valid_gst,
+        "active_status": company_data.active_status,
+        "parent_linkage_valid": company_data.parent_linkage_valid,
+    }
+    
+    # Remove only specific None values that should not be stored
+    for field in COMPANY_OPTIONAL_FIELDS:
+        if company_dict.get(field) is None:
+            company_dict.pop(field, None)
+    return company_dict
+
+async def find_duplicate_company(name: Optional[str] = None, gst_number: Optional[str] = None,
+                                 pan_number: Optional[str] = None, exclude_id: Optional[str] = None) -> Optional[dict]:
+    """Another company with this name, GST or PAN (case-insensitive, like the import); empty values are not compared"""
+    clauses = [{field: value} for field, value in
+               (("name", name), ("gst_number", gst_number), ("pan_number", pan_number)) if value]
+    if not clauses:
+        return None
+    query = {"$or": clauses}
+    if exclude_id:
+        query["id"] = {"$ne": exclude_id}
+    return await db.companies.find_one(query, {"_id": 0, "id": 1}, collation=CASE_INSENSITIVE)
+
+def check_domestic_tax_id(company_data: CompanyCreate):
+    """Validate India-specific requirements"""
+    if company_data.domestic_international == "Domestic":
+        if not company_data.gst_number and not company_data.pan_number:
+            raise HTTPException(status_code=400, detail="GST or PAN number is required for domestic companies")
+
 # Master data endpoints
 @api_router.get("/company-types")
 async def get_company_types(current_user: User = Depends(get_current_user)):
@@ -2009,51 +3309,799 @@ async def get_currencies(current_user: User = Depends(get_current_user)):
     currencies = await db.currencies.find({"is_active": True}).to_list(None)
     return [prepare_for_json(c) for c in currencies]
 
-# Company CRUD endpoints with RBAC
-async def check_company_access(current_user: User):
-    """Check if user has access to company operations (Admin or Sales Executive)"""
-    user_permissions = await get_user_permissions(current_user.id)
-    has_company_access = any(
-        p.get("module") == "Sales" and p.get("menu") == "Companies" and p.get("permission") in ["View", "Add", "Edit"]
-        for p in user_permissions
+# Streaming uploads
+def write_upload_chunk(fh, hasher, chunk: bytes):
+    """Hash and write one chunk (blocking - call via a thread)"""
+    hasher.update(chunk)
+    fh.write(chunk)
+
+def check_upload_size(size: Optional[int], max_bytes: Optional[int]):
+    if max_bytes is not None and size is not None and size > max_bytes:
+        raise HTTPException(status_code=400, detail=f"File size exceeds {max_bytes // (1024 * 1024)}MB limit")
+
+async def stream_upload_to_file(file: UploadFile, destination: Path, max_bytes: Optional[int] = None) -> tuple:
+    """Copy an upload to disk in fixed-size chunks without blocking the event loop
+
+    The SHA-256 is computed on the fly and the file is written to a temporary name
+    in the same directory, then renamed into place, so readers never see a partial
+    file. Returns (size, sha256 hex digest).
+    """
+    # file.size is None for streamed bodies; when known it lets us fail before reading
+    check_upload_size(file.size, max_bytes)
+    
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(f".{destination.name}.{uuid.uuid4().hex}.part")
+    hasher = hashlib.sha256()
+    size = 0
+    
+    fh = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            check_upload_size(size, max_bytes)
+            await asyncio.to_thread(write_upload_chunk, fh, hasher, chunk)
+        await asyncio.to_thread(fh.close)
+        await asyncio.to_thread(os.replace, tmp_path, destination)
+    except BaseException:
+        await asyncio.to_thread(fh.close)
+        await asyncio.to_thread(tmp_path.unlink, True)
+        raise
+    
+    return size, hasher.hexdigest()
+
+# Content-addressed document store
+# Blobs are keyed blobs/<sha[:2]>/<sha> in the configured storage backend with one document_blobs
+# row each. ref_count counts companies whose documents list the blob; unreferenced blobs are
+# collected after a grace period.
+def document_blob_path(sha256: str) -> Path:
+    return COMPANY_DOCUMENT_BLOB_DIR / sha256[:2] / sha256
+
+def place_document_blob(incoming_path: Path, blob_path: Path):
+    """Move an incoming upload into the blob store, or drop it if the blob exists (blocking)"""
+    if blob_path.exists():
+        incoming_path.unlink(missing_ok=True)
+    else:
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(incoming_path, blob_path)
+
+class LocalDocumentStorage:
+    """Blobs on this node's disk under COMPANY_DOCUMENT_DIR, served by the API"""
+    
+    async def receive(self, file: UploadFile, max_bytes: Optional[int]) -> tuple:
+        """Stream an upload into temporary storage. Returns (incoming ref, size, sha256)."""
+        incoming_path = COMPANY_DOCUMENT_INCOMING_DIR / str(uuid.uuid4())
+        size, sha256 = await stream_upload_to_file(file, incoming_path, max_bytes=max_bytes)
+        return str(incoming_path), size, sha256
+    
+    def blob_location(self, sha256: str) -> str:
+        return str(document_blob_path(sha256).relative_to(ROOT_DIR))
+    
+    async def commit(self, incoming_ref: str, sha256: str):
+        """Move a received upload to its blob location, or drop it if the blob already exists"""
+        await asyncio.to_thread(place_document_blob, Path(incoming_ref), document_blob_path(sha256))
+    
+    async def discard(self, incoming_ref: str):
+        await asyncio.to_thread(Path(incoming_ref).unlink, True)
+    
+    async def delete(self, sha256: str):
+        await asyncio.to_thread(document_blob_path(sha256).unlink, True)
+    
+    async def serve(self, blob: dict, request: Request, headers: dict) -> Response:
+        """Stream the blob, honouring single-range Range/If-Range requests"""
+        path = document_blob_path(blob["sha256"])
+        try:
+            file_size = (await anyio.Path(path).stat()).st_size
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        headers = {**headers, "Cache-Control": DOCUMENT_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+        byte_range = None
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        # If-Range must match strongly; a date or a different ETag means "send the whole file"
+        if range_header and (if_range is None or if_range.strip() == headers["ETag"]):
+            byte_range = parse_byte_range(range_header, file_size)
+        
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+            return DocumentFileResponse(path, start, end, status.HTTP_206_PARTIAL_CONTENT, headers, blob["mime_type"])
+        return DocumentFileResponse(path, 0, file_size - 1, status.HTTP_200_OK, headers, blob["mime_type"])
+
+class S3DocumentStorage:
+    """Blobs in an S3-compatible bucket; downloads are redirected to presigned URLs
+    so file bytes never pass through the API process"""
+    
+    def __init__(self, bucket: str, prefix: str, endpoint_url: Optional[str], region: str):
+        if not bucket:
+            raise RuntimeError("S3_BUCKET must be set when DOCUMENT_STORAGE_BACKEND=s3")
+        self.bucket = bucket
+        self.prefix = prefix
+        # Path-style addressing works with MinIO and other stand-ins that lack bucket DNS
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            config=BotoConfig(signature_version="s3v4", s3={"addressing_style": "path" if endpoint_url else "auto"})
+        )
+    
+    def blob_location(self, sha256: str) -> str:
+        return f"{self.prefix}blobs/{sha256[:2]}/{sha256}"
+    
+    async def receive(self, file: UploadFile, max_bytes: Optional[int]) -> tuple:
+        """Stream an upload to a temporary key as a multipart upload, one part per
+        S3_MULTIPART_PART_SIZE bytes; small files go up in a single PUT.
+        Returns (incoming key, size, sha256)."""
+        check_upload_size(file.size, max_bytes)
+        
+        key = f"{self.prefix}incoming/{uuid.uuid4()}"
+        hasher = hashlib.sha256()
+        size = 0
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+        
+        async def upload_part(body: bytes):
+            part_number = len(parts) + 1
+            response = await asyncio.to_thread(
+                self.client.upload_part,
+                Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body
+            )
+            parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+        
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                check_upload_size(size, max_bytes)
+                await asyncio.to_thread(hasher.update, chunk)
+                buffer += chunk
+                if len(buffer) >= S3_MULTIPART_PART_SIZE:
+                    if upload_id is None:
+                        response = await asyncio.to_thread(
+                            self.client.create_multipart_upload,
+                            Bucket=self.bucket, Key=key, ContentType=file.content_type or "application/octet-stream"
+                        )
+                        upload_id = response["UploadId"]
+                    await upload_part(bytes(buffer))
+                    buffer.clear()
+            
+            if upload_id is None:
+                await asyncio.to_thread(
+                    self.client.put_object,
+                    Bucket=self.bucket, Key=key, Body=bytes(buffer),
+                    ContentType=file.content_type or "application/octet-stream"
+                )
+            else:
+                if buffer:
+                    await upload_part(bytes(buffer))
+                await asyncio.to_thread(
+                    self.client.complete_multipart_upload,
+                    Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+                )
+        except BaseException:
+            if upload_id is not None:
+                await asyncio.to_thread(self.client.abort_multipart_upload, Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+        
+        return key, size, hasher.hexdigest()
+    
+    async def commit(self, incoming_ref: str, sha256: str):
+        """Copy a received upload to its blob key unless the blob already exists, then drop it"""
+        blob_key = self.blob_location(sha256)
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=blob_key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+                raise
+            await asyncio.to_thread(
+                self.client.copy_object,
+                Bucket=self.bucket, Key=blob_key, CopySource={"Bucket": self.bucket, "Key": incoming_ref}
+            )
+        await self.discard(incoming_ref)
+    
+    async def discard(self, incoming_ref: str):
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=incoming_ref)
+    
+    async def delete(self, sha256: str):
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self.blob_location(sha256))
+    
+    async def serve(self, blob: dict, request: Request, headers: dict) -> Response:
+        """Redirect to a short-lived presigned URL; S3 handles Range and caching from there"""
+        url = self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self.blob_location(blob["sha256"]),
+                "ResponseContentType": blob["mime_type"],
+                "ResponseContentDisposition": headers["Content-Disposition"],
+                "ResponseCacheControl": DOCUMENT_CACHE_CONTROL
+            },
+            ExpiresIn=S3_PRESIGNED_URL_EXPIRY_SECONDS
+        )
+        # The redirect itself expires with the signature, so it must not be cached
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+                                headers={"ETag": headers["ETag"], "Cache-Control": "private, no-store"})
+
+def create_document_storage():
+    if DOCUMENT_STORAGE_BACKEND == "s3":
+        return S3DocumentStorage(S3_BUCKET, S3_KEY_PREFIX, S3_ENDPOINT_URL, S3_REGION)
+    if DOCUMENT_STORAGE_BACKEND == "local":
+        return LocalDocumentStorage()
+    raise RuntimeError(f"Unknown DOCUMENT_STORAGE_BACKEND: {DOCUMENT_STORAGE_BACKEND}")
+
+document_storage = create_document_storage()
+
+async def store_document_blob(incoming_ref: str, sha256: str, size: int, mime_type: str) -> dict:
+    """Register a received upload in the blob store, deduplicating by hash"""
+    now = datetime.now(timezone.utc)
+    
+    for attempt in range(10):
+        try:
+            # Claim (or touch) the blob row. Touching an unreferenced blob restarts its grace
+            # period, and a blob mid-collection (gc_pending) cannot be claimed until GC finishes.
+            blob = await db.document_blobs.find_one_and_update(
+                {"sha256": sha256, "gc_pending": {"$ne": True}},
+                [{"$set": {
+                    "sha256": sha256,
+                    "file_path": {"$ifNull": ["$file_path", document_storage.blob_location(sha256)]},
+                    "size": {"$ifNull": ["$size", size]},
+                    "mime_type": {"$ifNull": ["$mime_type", mime_type]},
+                    "ref_count": {"$ifNull": ["$ref_count", 0]},
+                    "created_at": {"$ifNull": ["$created_at", now]},
+                    "unreferenced_since": {"$cond": [{"$gt": [{"$ifNull": ["$ref_count", 0]}, 0]}, None, now]}
+                }}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            break
+        except DuplicateKeyError:
+            # Collected right now - wait for GC to finish, then store it afresh
+            await asyncio.sleep(0.1 * (attempt + 1))
+    else:
+        await document_storage.discard(incoming_ref)
+        raise HTTPException(status_code=503, detail="Document store busy. Try again.")
+    
+    await document_storage.commit(incoming_ref, sha256)
+    return blob
+
+async def update_document_references(old_documents: List[dict], new_documents: List[dict]):
+    """Adjust blob reference counts after a company's documents list changed"""
+    old_hashes = {d.get("sha256") for d in old_documents or [] if d.get("sha256")}
+    new_hashes = {d.get("sha256") for d in new_documents or [] if d.get("sha256")}
+    now = datetime.now(timezone.utc)
+    
+    operations = [
+        UpdateOne({"sha256": sha256}, [
+            {"$set": {"ref_count": {"$add": [{"$ifNull": ["$ref_count", 0]}, delta]}}},
+            {"$set": {"unreferenced_since": {"$cond": [{"$gt": ["$ref_count", 0]}, None, now]}}}
+        ])
+        for hashes, delta in ((new_hashes - old_hashes, 1), (old_hashes - new_hashes, -1))
+        for sha256 in hashes
+    ]
+    if operations:
+        await db.document_blobs.bulk_write(operations, ordered=False)
+
+async def collect_document_garbage() -> int:
+    """Delete blobs that have been unreferenced for longer than the grace period"""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=DOCUMENT_GC_GRACE_HOURS)
+    collected = 0
+    
+    candidates = await db.document_blobs.find(
+        {"$or": [
+            {"ref_count": {"$lte": 0}, "unreferenced_since": {"$lt": cutoff}},
+            {"gc_pending": True}  # left behind by an interrupted run
+        ]},
+        {"_id": 0, "sha256": 1}
+    ).to_list(None)
+    
+    for candidate in candidates:
+        # Mark first so concurrent uploads of the same content wait instead of reusing it
+        blob = await db.document_blobs.find_one_and_update(
+            {"sha256": candidate["sha256"], "$or": [
+                {"ref_count": {"$lte": 0}, "unreferenced_since": {"$lt": cutoff}},
+                {"gc_pending": True}
+            ]},
+            {"$set": {"gc_pending": True}}
+        )
+        if not blob:
+            continue  # re-referenced or touched since the scan
+        await document_storage.delete(blob["sha256"])
+        await db.document_blobs.delete_one({"sha256": blob["sha256"], "gc_pending": True})
+        collected += 1
+    
+    if collected:
+        logger.info(f"Collected {collected} unreferenced document blobs")
+    return collected
+
+async def run_document_gc():
+    """Periodically collect unreferenced document blobs; one worker at a time via a lease"""
+    while True:
+        try:
+            if await acquire_lease("document_gc", DOCUMENT_GC_INTERVAL_SECONDS):
+                await collect_document_garbage()
+        except Exception as e:
+            logger.error(f"Document GC error: {e}")
+        await asyncio.sleep(DOCUMENT_GC_INTERVAL_SECONDS)
+
+@api_router.get("/documents/usage")
+async def get_document_usage(current_user: User = Depends(get_current_user)):
+    """Disk usage of the document store, including what deduplication saves"""
+    stats = await read_db().document_blobs.aggregate([
+        {"$group": {
+            "_id": None,
+            "blob_count": {"$sum": 1},
+            "stored_bytes": {"$sum": "$size"},
+            "referenced_bytes": {"$sum": {"$multiply": ["$size", {"$max": ["$ref_count", 0]}]}},
+            "references": {"$sum": {"$max": ["$ref_count", 0]}},
+            "unreferenced_count": {"$sum": {"$cond": [{"$lte": ["$ref_count", 0]}, 1, 0]}},
+            "unreferenced_bytes": {"$sum": {"$cond": [{"$lte": ["$ref_count", 0]}, "$size", 0]}}
+        }}
+    ]).to_list(None)
+    
+    usage = stats[0] if stats else {
+        "blob_count": 0, "stored_bytes": 0, "referenced_bytes": 0,
+        "references": 0, "unreferenced_count": 0, "unreferenced_bytes": 0
+    }
+    usage.pop("_id", None)
+    usage["deduplicated_bytes"] = max(usage["referenced_bytes"] - (usage["stored_bytes"] - usage["unreferenced_bytes"]), 0)
+    usage["gc_grace_hours"] = DOCUMENT_GC_GRACE_HOURS
+    return usage
+
+# Document download
+class DocumentFileResponse(Response):
+    """Send bytes [start, end] of a file, using the server's zero-copy send when it offers one"""
+    
+    def __init__(self, path: Path, start: int, end: int, status_code: int, headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers={**headers, "content-length": str(end - start + 1)}, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+    
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        remaining = self.end - self.start + 1
+        if scope["method"] == "HEAD" or remaining <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        
+        async with await anyio.open_file(self.path, "rb") as fh:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": fh.wrapped.fileno(),
+                            "offset": self.start, "count": remaining})
+                return
+            await fh.seek(self.start)
+            while remaining > 0:
+                chunk = await fh.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # File shrank underneath us; end the response rather than hang
+            await send({"type": "http.response.body", "body": b""})
+
+def parse_byte_range(range_header: str, file_size: int) -> Optional[tuple]:
+    """Parse a single 'bytes=' range into inclusive (start, end).
+    Returns None when the header should be ignored (malformed or multiple ranges)."""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = (part.strip() for part in spec.partition("-"))
+    if not sep or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last), file_size - 1) if last else file_size - 1
+    else:
+        # Suffix range: the last N bytes ("-0" is unsatisfiable)
+        start = max(file_size - int(last), 0) if int(last) else file_size
+        end = file_size - 1
+    
+    if start >= file_size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    return start, end
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison against an If-None-Match list"""
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+@api_router.api_route("/documents/{sha256}", methods=["GET", "HEAD"])
+async def download_document(
+    sha256: str,
+    request: Request,
+    filename: Optional[str] = None,
+    download: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Serve a stored document through the storage backend. Content is immutable per hash,
+    so the hash is a strong ETag."""
+    blob = await db.document_blobs.find_one({"sha256": sha256.lower(), "gc_pending": {"$ne": True}})
+    if not blob:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    etag = f'"{blob["sha256"]}"'
+    headers = {
+        "ETag": etag,
+        "Content-Disposition": f"{'attachment' if download else 'inline'}; filename*=UTF-8''{quote(filename or blob['sha256'])}"
+    }
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers={**headers, "Cache-Control": DOCUMENT_CACHE_CONTROL})
+    
+    return await document_storage.serve(blob, request, headers)
+
+# Company hierarchy
+# Each company stores its materialized ancestor path (ancestor_ids, root first) and depth, so
+# a subtree is one indexed match on ancestor_ids and an ancestor chain is one $in on ids.
+HIERARCHY_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "parent_company_id": 1, "ancestor_ids": 1, "depth": 1,
+    "employee_count": 1, "annual_revenue": 1, "revenue_currency": 1, "is_active": 1, "active_status": 1
+}
+
+def company_path_below(parent: Optional[dict]) -> List[str]:
+    """ancestor_ids for a child of parent (a company doc with id and ancestor_ids)"""
+    return parent.get("ancestor_ids", []) + [parent["id"]] if parent else []
+
+async def resolve_company_ancestry(parent_company_id: Optional[str], company_id: Optional[str] = None) -> List[str]:
+    """Validate a parent link and return the new ancestor path; rejects links that form a cycle"""
+    if not parent_company_id:
+        return []
+    if parent_company_id == company_id:
+        raise HTTPException(status_code=400, detail="A company cannot be its own parent")
+    
+    parent = await db.companies.find_one({"id": parent_company_id}, {"_id": 0, "id": 1, "ancestor_ids": 1})
+    if not parent:
+        raise HTTPException(status_code=400, detail="Parent company not found")
+    if company_id and company_id in parent.get("ancestor_ids", []):
+        raise HTTPException(status_code=400, detail="Parent company is a descendant of this company; the link would create a cycle")
+    return company_path_below(parent)
+
+async def move_company_subtree(company_id: str, ancestor_ids: List[str]):
+    """Point a company at a new ancestor path and rewrite every descendant's path prefix"""
+    await db.companies.update_one(
+        {"id": company_id},
+        {"$set": {"ancestor_ids": ancestor_ids, "depth": len(ancestor_ids)}}
+    )
+    # Descendant paths are <old prefix> + [company_id, ...]; keep the part from company_id on
+    await db.companies.update_many(
+        {"ancestor_ids": company_id},
+        [{"$set": {"ancestor_ids": {"$concatArrays": [
+            ancestor_ids,
+            {"$slice": ["$ancestor_ids", {"$indexOfArray": ["$ancestor_ids", company_id]}, {"$size": "$ancestor_ids"}]}
+        ]}}},
+         {"$set": {"depth": {"$size": "$ancestor_ids"}}}]
     )
-    if not has_company_access:
-        raise HTTPException(status_code=403, detail="Access denied. Only Admins and Sales Executives can access companies.")
-    return True
+
+async def backfill_company_hierarchy():
+    """Compute ancestor paths for companies that predate them (runs at startup, idempotent)"""
+    if not await db.companies.count_documents({"ancestor_ids": {"$exists": False}}, limit=1):
+        return
+    
+    companies = await db.companies.find({}, {"_id": 0, "id": 1, "parent_company_id": 1}).to_list(None)
+    parents = {c["id"]: c.get("parent_company_id") for c in companies}
+    paths = {}
+    for company_id in parents:
+        path = []
+        seen = {company_id}
+        current = parents[company_id]
+        while current and current in parents:
+            if current in seen:
+                logger.warning(f"Company hierarchy cycle at {company_id}; treating it as a root")
+                path = []
+                break
+            seen.add(current)
+            path.append(current)
+            current = parents[current]
+        paths[company_id] = path[::-1]
+    
+    await db.companies.bulk_write([
+        UpdateOne({"id": company_id}, {"$set": {"ancestor_ids": path, "depth": len(path)}})
+        for company_id, path in paths.items()
+    ], ordered=False)
+    logger.info(f"Backfilled hierarchy paths for {len(paths)} companies")
+
+@api_router.get("/companies/{company_id}/hierarchy")
+async def get_company_hierarchy(
+    company_id: str,
+    max_depth: Optional[int] = None,
+    include_inactive: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """Ancestor chain, subtree and employee/revenue rollup for a company"""
+    company = await db.companies.find_one({"id": company_id}, HIERARCHY_PROJECTION)
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found")
+    ancestor_ids = company.get("ancestor_ids", [])
+    
+    subtree_query = {"ancestor_ids": company_id}
+    if max_depth is not None:
+        subtree_query["depth"] = {"$lte": company.get("depth", 0) + max_depth}
+    related = await db.companies.find(
+        {"$or": [{"id": {"$in": ancestor_ids}}, subtree_query]},
+        HIERARCHY_PROJECTION
+    ).to_list(None)
+    
+    positions = {ancestor_id: i for i, ancestor_id in enumerate(ancestor_ids)}
+    ancestors = sorted((c for c in related if c["id"] in positions), key=lambda c: positions[c["id"]])
+    descendants = [
+        c for c in related
+        if c["id"] not in positions and (include_inactive or c.get("is_active", True))
+    ]
+    descendants.sort(key=lambda c: (c.get("depth", 0), c.get("name", "")))
+    
+    # Rollup over the company and its (filtered) subtree
+    revenue_by_currency = {}
+    employee_count = 0
+    for c in [company] + descendants:
+        employee_count += c.get("employee_count") or 0
+        currency = c.get("revenue_currency") or "N/A"
+        revenue_by_currency[currency] = revenue_by_currency.get(currency, 0) + (c.get("annual_revenue") or 0)
+    
+    return {
+        "company": company,
+        "ancestors": ancestors,
+        "descendants": descendants,
+        "rollup": {
+            "company_count": 1 + len(descendants),
+            "employee_count": employee_count,
+            "annual_revenue_by_currency": revenue_by_currency
+        }
+    }
+
+# Reference expansion
+# Company reference fields and the master data collection each one points at
+COMPANY_REFERENCE_FIELDS = {
+    "company_type_id": "company_types",
+    "account_type_id": "account_types",
+    "region_id": "regions",
+    "business_type_id": "business_types",
+    "industry_id": "industries",
+    "sub_industry_id": "sub_industries",
+    "country_id": "countries",
+    "state_id": "states",
+    "city_id": "cities",
+}
+COMPANY_EXPANDABLE_FIELDS = {**COMPANY_REFERENCE_FIELDS, "parent_company_id": "companies", "created_by": "users"}
+CONTACT_EXPANDABLE_FIELDS = {
+    "company_id": "companies",
+    "designation_id": "designations",
+    "country_id": "countries",
+    "city_id": "cities",
+    "created_by": "users",
+}
+
+# Small, rarely edited collections whose id -> name maps are cached per worker
+MASTER_DATA_COLLECTIONS = set(COMPANY_REFERENCE_FIELDS.values()) | {"designations"}
+master_data_cache: Dict[str, tuple] = {}  # collection -> (loaded_at, {id: name})
+
+async def get_master_data_names(collection: str) -> Dict[str, str]:
+    """id -> name for a master data collection, including inactive entries (cached)"""
+    cached = master_data_cache.get(collection)
+    if cached and time.monotonic() - cached[0] < MASTER_DATA_CACHE_TTL_SECONDS:
+        return cached[1]
+    docs = await db[collection].find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    names = {doc["id"]: doc.get("name") for doc in docs}
+    master_data_cache[collection] = (time.monotonic(), names)
+    return names
+
+def invalidate_master_data(collection: str):
+    master_data_cache.pop(collection, None)
+
+async def validate_master_references(values: Dict[str, Optional[str]], collections: Dict[str, str]):
+    """Reject ids missing from their master data collection; `collections` maps field -> collection"""
+    fields = [field for field, value in values.items() if value and field in collections]
+    known = await asyncio.gather(*[get_master_data_names(collections[field]) for field in fields])
+    for field, names in zip(fields, known):
+        value = values[field]
+        # A miss may be an entry another worker created after this cache was loaded
+        if value not in names and not await db[collections[field]].count_documents({"id": value}, limit=1):
+            raise HTTPException(status_code=400, detail=f"Unknown {field} '{value}'")
+
+async def resolve_reference_names(ids_by_collection: Dict[str, set]) -> Dict[str, Dict[str, str]]:
+    """Look up display names for ids in several collections at once.
+    Returns {collection: {id: name}}; users resolve to their username."""
+    collections = [c for c, ids in ids_by_collection.items() if ids]
+    results = await asyncio.gather(*[
+        db[collection].find(
+            {"id": {"$in": list(ids_by_collection[collection])}},
+            {"_id": 0, "id": 1, "username" if collection == "users" else "name": 1}
+        ).to_list(None)
+        for collection in collections
+    ])
+    return {
+        collection: {doc["id"]: doc.get("username" if collection == "users" else "name") for doc in docs}
+        for collection, docs in zip(collections, results)
+    }
+
+class ReferenceLoader:
+    """Request-scoped batching loader for reference names.
+    
+    Callers queue ids with want(), then a single load() resolves everything queued:
+    master data from the cache, everything else with one $in query per collection,
+    all concurrently. The query count depends on the collections involved, not on
+    how many documents referenced them.
+    """
+    
+    def __init__(self):
+        self.wanted: Dict[str, set] = {}
+        self.requested: set = set()  # collections asked for since the last load()
+        # Names resolved earlier in the same request are shared, the current user's included
+        context = request_context.get()
+        self.names: Dict[str, Dict[str, str]] = context.reference_names if context else {}
+        if context and context.user:
+            self.names.setdefault("users", {})[context.user.id] = context.user.username
+    
+    def want(self, collection: str, ref_id: Optional[str]):
+        if not ref_id:
+            return
+        self.requested.add(collection)
+        if ref_id not in self.names.get(collection, {}):
+            self.wanted.setdefault(collection, set()).add(ref_id)
+    
+    async def load(self):
+        # Collections whose ids were all resolved earlier in this request need no query
+        record_avoided("references", len(self.requested - set(self.wanted) - MASTER_DATA_COLLECTIONS))
+        self.requested = set()
+        cached = [c for c in self.wanted if c in MASTER_DATA_COLLECTIONS]
+        cache_results = await asyncio.gather(*[get_master_data_names(c) for c in cached])
+        for collection, names in zip(cached, cache_results):
+            self.names.setdefault(collection, {}).update(names)
+        
+        # Ids the cache has not seen yet (created on another worker) fall through to the query
+        missing = {
+            collection: {ref_id for ref_id in ids if ref_id not in self.names.get(collection, {})}
+            for collection, ids in self.wanted.items()
+        }
+        for collection, names in (await resolve_reference_names(missing)).items():
+            self.names.setdefault(collection, {}).update(names)
+        self.wanted = {}
+    
+    def name(self, collection: str, ref_id: Optional[str]) -> Optional[str]:
+        return self.names.get(collection, {}).get(ref_id)
+
+def reference_name_key(field: str) -> str:
+    """Output key for an expanded reference: industry_id -> industry_name, created_by -> created_by_name"""
+    return f"{field.removesuffix('_id')}_name"
+
+def parse_expand(expand: Optional[str], expandable: Dict[str, str]) -> Dict[str, str]:
+    """Turn an expand= value ("industry,city" / "industry_id" / "*") into {field: collection}"""
+    if not expand:
+        return {}
+    requested = [f.strip() for f in expand.split(",") if f.strip()]
+    if "*" in requested:
+        return dict(expandable)
+    
+    fields = {}
+    for name in requested:
+        field = name if name in expandable else f"{name}_id"
+        if field not in expandable:
+            allowed = ", ".join(sorted(f.removesuffix("_id") for f in expandable))
+            raise HTTPException(status_code=400, detail=f"Cannot expand '{name}'. Expandable fields: {allowed}")
+        fields[field] = expandable[field]
+    return fields
+
+async def expand_references(docs: List[dict], fields: Dict[str, str], loader: ReferenceLoader):
+    """Inline <field>_name for each requested reference field across a whole page"""
+    if not fields:
+        return
+    for doc in docs:
+        for field, collection in fields.items():
+            loader.want(collection, doc.get(field))
+    await loader.load()
+    for doc in docs:
+        for field, collection in fields.items():
+            doc[reference_name_key(field)] = loader.name(collection, doc.get(field))
+
+# Company overview (company page in one request)
+OVERVIEW_CONTACT_PROJECTION = {
+    "_id": 0, "id": 1, "salutation": 1, "first_name": 1, "last_name": 1, "email": 1,
+    "primary_phone": 1, "designation_id": 1, "decision_maker": 1, "spoc": 1, "is_active": 1
+}
+OVERVIEW_AUDIT_LIMIT = 10
+OVERVIEW_DECISION_MAKER_LIMIT = 50
+
+@api_router.get("/companies/{company_id}/overview")
+async def get_company_overview(
+    company_id: str,
+    loader: ReferenceLoader = Depends(ReferenceLoader),
+    current_user: User = Depends(get_current_user)
+):
+    """Company with resolved names, key contacts, recent audit trail and child companies.
+    Independent queries run concurrently, then all names resolve in one batched pass."""
+    include_contacts = await check_permission(current_user, "Sales", "Contacts", "View")
+    
+    queries = [
+        db.companies.find_one({"id": company_id}, {"_id": 0}),
+        db.activity_logs.find(
+            {"details.resource_id": company_id, "module_name": "audit"},
+            {"_id": 0, "id": 1, "action": 1, "user_id": 1, "details": 1, "created_at": 1}
+        ).sort("created_at", DESCENDING).limit(OVERVIEW_AUDIT_LIMIT).to_list(None),
+        db.companies.find(
+            {"parent_company_id": company_id, "is_active": {"$ne": False}},
+            {"_id": 0, "id": 1, "name": 1, "employee_count": 1, "annual_revenue": 1, "revenue_currency": 1, "lead_status": 1}
+        ).sort("name", ASCENDING).to_list(None),
+    ]
+    if include_contacts:
+        active_contacts = {"company_id": company_id, "is_deleted": {"$ne": True}}
+        queries += [
+            db.contacts.find_one({**active_contacts, "spoc": True}, OVERVIEW_CONTACT_PROJECTION),
+            db.contacts.find({**active_contacts, "decision_maker": True}, OVERVIEW_CONTACT_PROJECTION)
+                .limit(OVERVIEW_DECISION_MAKER_LIMIT).to_list(None),
+            db.contacts.count_documents(active_contacts),
+        ]
+    results = await asyncio.gather(*queries)
+    company, audit_entries, children = results[:3]
+    spoc, decision_makers, contact_count = results[3:] if include_contacts else (None, [], None)
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found")
+    
+    # Queue every referenced id, then resolve them all in one concurrent pass
+    contacts = ([spoc] if spoc else []) + decision_makers
+    for field, collection in COMPANY_EXPANDABLE_FIELDS.items():
+        loader.want(collection, company.get(field))
+    for contact in contacts:
+        loader.want("designations", contact.get("designation_id"))
+    for entry in audit_entries:
+        loader.want("users", entry.get("user_id"))
+    await loader.load()
+    
+    resolved = {
+        field.removesuffix("_id"): loader.name(collection, company.get(field))
+        for field, collection in COMPANY_EXPANDABLE_FIELDS.items()
+    }
+    for contact in contacts:
+        contact["designation_name"] = loader.name("designations", contact.get("designation_id"))
+    for entry in audit_entries:
+        entry["username"] = loader.name("users", entry.get("user_id"))
+    
+    return {
+        "company": prepare_for_json(company),
+        "names": resolved,
+        "spoc": spoc,
+        "decision_makers": decision_makers,
+        "contact_count": contact_count,
+        "recent_activity": [prepare_for_json(e) for e in audit_entries],
+        "child_companies": children
+    }
 
 @api_router.get("/companies")
-async def get_companies(current_user: User = Depends(get_current_user)):
-    await check_company_access(current_user)
-    companies = await db.companies.find({"$or": [{"is_active": True}, {"active_status": True}]}).to_list(None)
+async def get_companies(
+    expand: Optional[str] = None,
+    loader: ReferenceLoader = Depends(ReferenceLoader),
+    current_user: User = Depends(get_current_user)
+):
+    expand_fields = parse_expand(expand, COMPANY_EXPANDABLE_FIELDS)
+    companies = await read_db().companies.find({"$or": [{"is_active": True}, {"active_status": True}]}).to_list(None)
+    await expand_references(companies, expand_fields, loader)
     return [prepare_for_json(c) for c in companies]
 
 @api_router.get("/companies/{company_id}")
-async def get_company(company_id: str, current_user: User = Depends(get_current_user)):
-    await check_company_access(current_user)
+async def get_company(company_id: str, response: Response, current_user: User = Depends(get_current_user)):
     company = await db.companies.find_one({"id": company_id})
     if not company:
         raise HTTPException(status_code=404, detail="Company not found")
+    response.headers["ETag"] = version_etag(company)
     return prepare_for_json(company)
 
 @api_router.post("/companies")
 async def create_company(company_data: CompanyCreate, current_user: User = Depends(get_current_user)):
-    await check_company_access(current_user)
-    
     # Check for duplicates
-    existing = await db.companies.find_one({
-        "$or": [
-            {"company_name": company_data.company_name},
-            {"gst_number": company_data.gst_number} if company_data.gst_number else {},
-            {"pan_number": company_data.pan_number} if company_data.pan_number else {},
-        ]
-    })
-    if existing:
+    if await find_duplicate_company(company_data.company_name, company_data.gst_number, company_data.pan_number):
         raise HTTPException(status_code=400, detail="Company with this name, GST, or PAN already exists")
     
-    # Validate India-specific requirements
-    if company_data.domestic_international == "Domestic":
-        if not company_data.gst_number and not company_data.pan_number:
-            raise HTTPException(status_code=400, detail="GST or PAN number is required for domestic companies")
+    check_domestic_tax_id(company_data)
+    
+    ancestor_ids = await resolve_company_ancestry(company_data.parent_company_id)
     
     # Calculate score and lead status
     score = await calculate_company_score(company_data)
@@ -2061,53 +4109,24 @@ async def create_company(company_data: CompanyCreate, current_user: User = Depen
     
     logger.info(f"Creating company: {company_data.company_name}, Score: {score}, Lead Status: {lead_status}")
     
-    # Map CompanyCreate fields to Company model fields
     company_dict = {
-        # Use company_name as name for the Company model
-        "name": company_data.company_name,
-        "domestic_international": company_data.domestic_international,
-        "gst_number": company_data.gst_number,
-        "pan_number": company_data.pan_number,
-        "vat_number": company_data.vat_number,
-        "company_type_id": company_data.company_type_id,
-        "account_type_id": company_data.account_type_id,
-        "region_id": company_data.region_id,
-        "business_type_id": company_data.business_type_id,
-        "industry_id": company_data.industry_id,
-        "sub_industry_id": company_data.sub_industry_id,
-        "website": company_data.website,
-        "is_child": company_data.is_child,
-        "parent_company_id": company_data.parent_company_id,
-        "employee_count": company_data.employee_count,
-        "address": company_data.address,
-        "country_id": company_data.country_id,
-        "state_id": company_data.state_id,
-        "city_id": company_data.city_id,
-        "turnover": [t.dict() for t in company_data.turnover],
-        "profit": [p.dict() for p in company_data.profit],
-        "annual_revenue": company_data.annual_revenue,
-        "revenue_currency": company_data.revenue_currency,
-        "company_profile": company_data.company_profile,
-        "documents": [],
+        **map_company_create(company_data),
+        "ancestor_ids": ancestor_ids,
+        "depth": len(ancestor_ids),
+        **EMPTY_COMPANY_COUNTERS,
         "score": score,
         "lead_status": lead_status,
-        "valid_gst": company_data.valid_gst,
-        "active_status": company_data.active_status,
         "is_active": True,  # Add is_active for compatibility
-        "parent_linkage_valid": company_data.parent_linkage_valid,
+        "version": 1,
         "created_by": current_user.id,
         "id": str(uuid.uuid4()),
         "created_at": datetime.now(timezone.utc),
         "updated_at": datetime.now(timezone.utc)
     }
     
-    # Remove only specific None values that should not be stored
-    fields_to_remove_if_none = ['gst_number', 'pan_number', 'vat_number', 'website', 'parent_company_id', 'company_profile']
-    for field in fields_to_remove_if_none:
-        if company_dict.get(field) is None:
-            company_dict.pop(field, None)
-    
     await db.companies.insert_one(company_dict)
+    await update_document_references([], company_dict["documents"])
+    await apply_sales_rollup_changes([(None, company_dict)])
     
     # Log audit trail
     await log_audit_trail(
@@ -2124,78 +4143,54 @@ async def create_company(company_data: CompanyCreate, current_user: User = Depen
     return prepare_for_json(company_dict)
 
 @api_router.put("/companies/{company_id}")
-async def update_company(company_id: str, company_data: CompanyCreate, current_user: User = Depends(get_current_user)):
-    await check_company_access(current_user)
-    
-    # Check if company exists
-    existing_company = await db.companies.find_one({"id": company_id})
-    if not existing_company:
-        raise HTTPException(status_code=404, detail="Company not found")
+async def update_company(
+    company_id: str,
+    company_data: CompanyCreate,
+    response: Response,
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Replace a company. Send If-Match (the ETag from GET) or expected_version to fail with 412
+    instead of overwriting someone else's edit."""
+    expected_version = parse_expected_version(if_match, expected_version)
     
     # Check for duplicates (excluding current company)
-    existing = await db.companies.find_one({
-        "$and": [
-            {"id": {"$ne": company_id}},
-            {"$or": [
-                {"name": company_data.company_name},
-                {"gst_number": company_data.gst_number} if company_data.gst_number else {},
-                {"pan_number": company_data.pan_number} if company_data.pan_number else {},
-            ]}
-        ]
-    })
-    if existing:
+    if await find_duplicate_company(company_data.company_name, company_data.gst_number, company_data.pan_number,
+                                    exclude_id=company_id):
         raise HTTPException(status_code=400, detail="Company with this name, GST, or PAN already exists")
     
-    # Validate India-specific requirements
-    if company_data.domestic_international == "Domestic":
-        if not company_data.gst_number and not company_data.pan_number:
-            raise HTTPException(status_code=400, detail="GST or PAN number is required for domestic companies")
+    check_domestic_tax_id(company_data)
+    
+    ancestor_ids = await resolve_company_ancestry(company_data.parent_company_id, company_id)
     
     # Calculate score and lead status
     score = await calculate_company_score(company_data)
     lead_status = "hot" if score >= 70 else "cold"
     
-    # Map CompanyCreate fields to Company model fields
     update_dict = {
-        "name": company_data.company_name,
-        "domestic_international": company_data.domestic_international,
-        "gst_number": company_data.gst_number,
-        "pan_number": company_data.pan_number,
-        "vat_number": company_data.vat_number,
-        "company_type_id": company_data.company_type_id,
-        "account_type_id": company_data.account_type_id,
-        "region_id": company_data.region_id,
-        "business_type_id": company_data.business_type_id,
-        "industry_id": company_data.industry_id,
-        "sub_industry_id": company_data.sub_industry_id,
-        "website": company_data.website,
-        "is_child": company_data.is_child,
-        "parent_company_id": company_data.parent_company_id,
-        "employee_count": company_data.employee_count,
-        "address": company_data.address,
-        "country_id": company_data.country_id,
-        "state_id": company_data.state_id,
-        "city_id": company_data.city_id,
-        "turnover": [t.dict() for t in company_data.turnover],
-        "profit": [p.dict() for p in company_data.profit],
-        "annual_revenue": company_data.annual_revenue,
-        "revenue_currency": company_data.revenue_currency,
-        "company_profile": company_data.company_profile,
+        **map_company_create(company_data),
         "score": score,
         "lead_status": lead_status,
-        "valid_gst": company_data.valid_gst,
-        "active_status": company_data.active_status,
-        "parent_linkage_valid": company_data.parent_linkage_valid,
         "updated_at": datetime.now(timezone.utc)
     }
     
-    # Remove specific None values that should not be stored
-    fields_to_remove_if_none = ['gst_number', 'pan_number', 'vat_number', 'website', 'parent_company_id', 'company_profile']
-    for field in fields_to_remove_if_none:
-        if update_dict.get(field) is None:
-            update_dict.pop(field, None)
-    
-    await db.companies.update_one({"id": company_id}, {"$set": update_dict})
+    update_ops = {"$set": update_dict, "$inc": {"version": 1}}
+    if "parent_company_id" not in update_dict:
+        update_ops["$unset"] = {"parent_company_id": ""}  # link removed
+    # The pre-update document drives the hierarchy, document and rollup deltas below
+    existing_company = await update_one_and_fetch(
+        db.companies, {"id": company_id}, update_ops, "Company not found",
+        return_document=ReturnDocument.BEFORE, expected_version=expected_version
+    )
+    updated_company = {**existing_company, **update_dict, "version": existing_company.get("version", 1) + 1}
+    if "$unset" in update_ops:
+        updated_company.pop("parent_company_id", None)
+    if ancestor_ids != existing_company.get("ancestor_ids"):
+        await move_company_subtree(company_id, ancestor_ids)
+        updated_company.update(ancestor_ids=ancestor_ids, depth=len(ancestor_ids))
+    await update_document_references(existing_company.get("documents", []), update_dict["documents"])
+    await apply_sales_rollup_changes([(existing_company, updated_company)])
     
     # Log audit trail
     await log_audit_trail(
@@ -2206,30 +4201,116 @@ async def update_company(company_id: str, company_data: CompanyCreate, current_u
         details=f"Updated company: {update_dict['name']}"
     )
     
-    # Get updated company
-    updated_company = await db.companies.find_one({"id": company_id})
+    response.headers["ETag"] = version_etag(updated_company)
     return prepare_for_json(updated_company)
 
-@api_router.delete("/companies/{company_id}")
-async def delete_company(company_id: str, current_user: User = Depends(get_current_user)):
-    await check_company_access(current_user)
-    
-    # Check if company exists
-    company = await db.companies.find_one({"id": company_id})
-    if not company:
+# Inputs of the checks a company patch re-runs; a patch that leaves them alone skips the check and its queries
+COMPANY_DUPLICATE_FIELDS = {"name", "gst_number", "pan_number"}
+COMPANY_TAX_ID_FIELDS = {"domestic_international", "gst_number", "pan_number"}
+COMPANY_SCORE_FIELDS = {"industry_id", "sub_industry_id", "annual_revenue", "employee_count"}
+
+def company_patch_target(company: dict) -> dict:
+    """A stored company in CompanyCreate field names, the document a merge patch applies to"""
+    target = {field: company[field] for field in CompanyCreate.model_fields if field in company}
+    target["company_name"] = company.get("name")
+    return target
+
+@api_router.patch("/companies/{company_id}")
+async def patch_company(
+    company_id: str,
+    response: Response,
+    patch: Dict[str, Any] = Body(..., media_type="application/merge-patch+json"),
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Change some fields of a company with a JSON merge patch (CompanyCreate field names; null
+    removes an optional field). Only changed fields are written, and the duplicate check, scoring
+    and reference validation run only when their inputs change. A patch that changes nothing is
+    not written and keeps the version."""
+    expected_version = parse_expected_version(if_match, expected_version)
+    unknown = sorted(set(patch) - set(CompanyCreate.model_fields))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown company fields: {', '.join(unknown)}")
+    
+    existing_company = await db.companies.find_one({"id": company_id}, {"_id": 0})
+    if not existing_company:
         raise HTTPException(status_code=404, detail="Company not found")
+    current_version = existing_company.get("version", 1)
+    if expected_version is not None and current_version != expected_version:
+        raise version_conflict(current_version)
     
-    # Soft delete - mark as inactive
-    await db.companies.update_one(
-        {"id": company_id}, 
+    try:
+        company_data = CompanyCreate(**apply_merge_patch(company_patch_target(existing_company), patch))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=format_validation_error(e))
+    
+    set_fields, unset_fields = merge_patch_diff(existing_company, map_company_create(company_data), COMPANY_OPTIONAL_FIELDS)
+    changed = set(set_fields) | set(unset_fields)
+    if not changed:
+        response.headers["ETag"] = version_etag(existing_company)
+        return prepare_for_json(existing_company)
+    
+    if changed & COMPANY_DUPLICATE_FIELDS:
+        # Unchanged identifiers were checked when they were set; only the new values can collide
+        if await find_duplicate_company(set_fields.get("name"), set_fields.get("gst_number"),
+                                        set_fields.get("pan_number"), exclude_id=company_id):
+            raise HTTPException(status_code=400, detail="Company with this name, GST, or PAN already exists")
+    if changed & COMPANY_TAX_ID_FIELDS:
+        check_domestic_tax_id(company_data)
+    await validate_master_references(
+        {field: set_fields[field] for field in COMPANY_REFERENCE_FIELDS if field in set_fields}, COMPANY_REFERENCE_FIELDS
+    )
+    ancestor_ids = existing_company.get("ancestor_ids")
+    if "parent_company_id" in changed:
+        ancestor_ids = await resolve_company_ancestry(company_data.parent_company_id, company_id)
+    if changed & COMPANY_SCORE_FIELDS:
+        score = await calculate_company_score(company_data)
+        scored = {"score": score, "lead_status": "hot" if score >= 70 else "cold"}
+        set_fields.update({k: v for k, v in scored.items() if existing_company.get(k) != v})
+    
+    update_ops = {"$set": {**set_fields, "updated_at": datetime.now(timezone.utc)}, "$inc": {"version": 1}}
+    if unset_fields:
+        update_ops["$unset"] = unset_fields
+    # Conditional on the version the diff was computed from, so a write that raced it is a 412, not a blind merge
+    updated_company = await update_one_and_fetch(
+        db.companies, {"id": company_id}, update_ops, "Company not found", expected_version=current_version
+    )
+    if ancestor_ids != existing_company.get("ancestor_ids"):
+        await move_company_subtree(company_id, ancestor_ids)
+        updated_company.update(ancestor_ids=ancestor_ids, depth=len(ancestor_ids))
+    if "documents" in changed:
+        await update_document_references(existing_company.get("documents", []), updated_company.get("documents", []))
+    await apply_sales_rollup_changes([(existing_company, updated_company)])
+    
+    await log_audit_trail(
+        user_id=current_user.id,
+        action="UPDATE",
+        resource_type="Company",
+        resource_id=company_id,
+        details=f"Patched company {updated_company.get('name')}: {', '.join(sorted(changed))}"
+    )
+    
+    response.headers["ETag"] = version_etag(updated_company)
+    return prepare_for_json(updated_company)
+
+@api_router.delete("/companies/{company_id}")
+async def delete_company(company_id: str, current_user: User = Depends(get_current_user)):
+    # Soft delete - mark as inactive. The condition matches exactly the companies that still count
+    # toward the rollups, so only the delete that deactivates the company moves them.
+    company = await update_one_and_fetch(
+        db.companies, {"id": company_id, "is_active": {"$ne": False}},
         {
             "$set": {
                 "is_active": False,
                 "active_status": False,
                 "updated_at": datetime.now(timezone.utc)
-            }
-        }
+            },
+            "$inc": {"version": 1}
+        },
+        "Company not found", return_document=ReturnDocument.BEFORE
     )
+    await apply_sales_rollup_changes([(company, {**company, "is_active": False})])
     
     # Log audit trail
     await log_audit_trail(
@@ -2242,6 +4323,9 @@ async def delete_company(company_id: str, current_user: User = Depends(get_curre
     
     return {"message": "Company deleted successfully"}
 
+# High-value industries get more points
+HIGH_VALUE_INDUSTRIES = ["Technology", "Finance", "Healthcare", "Manufacturing"]
+
 async def calculate_company_score(company_data: CompanyCreate) -> int:
     """Calculate company score based on various factors"""
     score = 0
@@ -2250,9 +4334,7 @@ async def calculate_company_score(company_data: CompanyCreate) -> int:
         # Industry score (40 points)
         industry = await db.industries.find_one({"id": company_data.industry_id})
         if industry:
-            # High-value industries get more points
-            high_value_industries = ["Technology", "Finance", "Healthcare", "Manufacturing"]
-            if industry.get("name") in high_value_industries:
+            if industry.get("name") in HIGH_VALUE_INDUSTRIES:
                 score += 40
             else:
                 score += 20
@@ -2288,41 +4370,45 @@ async def calculate_company_score(company_data: CompanyCreate) -> int:
         logger.error(f"Error calculating company score: {e}")
         return 0
 
+def score_companies(industry_names: List[Optional[str]], has_sub_industry: List[bool],
+                    annual_revenue: List[float], employee_count: List[int]) -> np.ndarray:
+    """Vectorized calculate_company_score for a batch of already-resolved rows
+
+    industry_names holds None where the industry does not exist.
+    """
+    high_value = np.array([name in HIGH_VALUE_INDUSTRIES for name in industry_names], dtype=bool)
+    known = np.array([name is not None for name in industry_names], dtype=bool)
+    revenue = np.asarray(annual_revenue, dtype=float)
+    employees = np.asarray(employee_count, dtype=float)
+    
+    industry_score = np.where(high_value, 40, np.where(known, 20, 0))
+    sub_industry_score = np.where(np.asarray(has_sub_industry, dtype=bool), 20, 0)
+    revenue_score = np.select(
+        [revenue >= 10000000, revenue >= 1000000, revenue >= 100000], [25, 15, 10], default=5
+    )
+    employee_score = np.select(
+        [employees >= 1000, employees >= 100, employees >= 50], [15, 12, 8], default=5
+    )
+    return np.minimum(industry_score + sub_industry_score + revenue_score + employee_score, 100)
+
 # File upload endpoint
 @api_router.post("/companies/upload-document")
 async def upload_company_document(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
-    await check_company_access(current_user)
-    
-    # Validate file
-    if file.size > 10 * 1024 * 1024:  # 10MB limit
-        raise HTTPException(status_code=400, detail="File size exceeds 10MB limit")
-    
-    allowed_types = ["application/pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", 
-                     "image/png", "image/jpeg"]
-    if file.content_type not in allowed_types:
+    if file.content_type not in COMPANY_DOCUMENT_TYPES:
         raise HTTPException(status_code=400, detail="File type not allowed. Only PDF, DOCX, PNG, JPG are supported")
     
-    # Create uploads directory if it doesn't exist
-    upload_dir = Path("uploads/company_documents")
-    upload_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Generate unique filename
-    file_id = str(uuid.uuid4())
-    file_extension = Path(file.filename).suffix
-    filename = f"{file_id}{file_extension}"
-    file_path = upload_dir / filename
-    
-    # Save file
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    # Stream to a private incoming location; the hash decides where (and whether) it is kept.
+    # The size limit is enforced as bytes arrive.
+    incoming_ref, file_size, sha256 = await document_storage.receive(file, COMPANY_DOCUMENT_MAX_BYTES)
+    blob = await store_document_blob(incoming_ref, sha256, file_size, file.content_type)
     
     document = CompanyDocument(
-        filename=filename,
+        filename=sha256,
         original_filename=file.filename,
-        file_path=str(file_path),
-        file_size=len(content),
-        mime_type=file.content_type
+        file_path=blob["file_path"],
+        file_size=file_size,
+        mime_type=file.content_type,
+        sha256=sha256
     )
     
     return document.dict()
@@ -2330,18 +4416,7 @@ async def upload_company_document(file: UploadFile = File(...), current_user: Us
 # Export companies
 @api_router.get("/companies/export")
 async def export_companies(current_user: User = Depends(get_current_user)):
-    await check_company_access(current_user)
-    
-    # Check export permission
-    user_permissions = await get_user_permissions(current_user.id)
-    has_export = any(
-        p.get("module") == "Sales" and p.get("menu") == "Companies" and p.get("permission") == "Export"
-        for p in user_permissions
-    )
-    if not has_export:
-        raise HTTPException(status_code=403, detail="Export permission required")
-    
-    companies = await db.companies.find().to_list(None)
+    companies = await read_db().companies.find().to_list(None)
     return [prepare_for_json(c) for c in companies]
 
 # ================ CONTACT MANAGEMENT MODELS ================
@@ -2376,6 +4451,7 @@ class Contact(BaseAuditModel):
     is_active: bool = Field(default=True)
     is_deleted: bool = Field(default=False)
     deleted_at: Optional[datetime] = None
+    version: int = 1
 
 class ContactCreate(BaseModel):
     # Basic Info
@@ -2424,23 +4500,124 @@ class ContactUpdate(BaseModel):
     # Status fields
     is_active: Optional[bool] = None
 
+class ContactPatch(ContactCreate):
+    """A contact with a merge patch applied, validated as a whole"""
+    is_active: bool = True
+
 class ContactBulkUpdate(BaseModel):
-    contact_ids: List[str] = Field(..., min_items=1)
-    action: str = Field(..., pattern=r"^(activate|deactivate)$")
+    contact_ids: List[str] = Field(..., min_items=1, max_items=CONTACT_BULK_MAX_IDS)
+    action: str = Field(..., pattern=r"^(activate|deactivate|delete|reassign_company|set_designation|set_decision_maker|set_spoc)$")
+    company_id: Optional[str] = None  # reassign_company
+    designation_id: Optional[str] = None  # set_designation
+    value: Optional[bool] = None  # set_decision_maker/set_spoc
+    expected_versions: Dict[str, int] = {}  # contact id -> version the caller last saw
 
 # ================ CONTACT MANAGEMENT ENDPOINTS ================
 
-# Helper function for contact access control
-async def check_contact_access(current_user: User):
-    """Check if user has access to contact operations"""
-    user_permissions = await get_user_permissions(current_user.id)
-    has_contact_access = any(
-        p.get("module") == "Sales" and p.get("menu") == "Contacts" and p.get("permission") in ["View", "Add", "Edit"]
-        for p in user_permissions
+# Per-company contact counters
+# Companies carry contact_count, decision_maker_count and spoc_contact_id over their non-deleted
+# contacts. Every contact write path reports (before, after) states and the counters move with
+# $inc/$set; reconcile_company_counters repairs any drift.
+EMPTY_COMPANY_COUNTERS = {"contact_count": 0, "decision_maker_count": 0, "spoc_contact_id": None}
+
+def contact_counter_state(contact: Optional[dict]) -> Optional[tuple]:
+    """(company_id, decision_maker, spoc) for a contact that counts toward its company, else None"""
+    if not contact or contact.get("is_deleted"):
+        return None
+    return contact.get("company_id"), bool(contact.get("decision_maker")), bool(contact.get("spoc"))
+
+async def apply_company_counter_changes(changes: List[tuple]):
+    """Move company counters for [(contact_id, before, after)] contact states in one bulk_write"""
+    increments: Dict[str, Dict[str, int]] = {}
+    spoc_set = {}
+    spoc_cleared = {}
+    for contact_id, before, after in changes:
+        old_state, new_state = contact_counter_state(before), contact_counter_state(after)
+        if old_state == new_state:
+            continue
+        for state, delta in ((old_state, -1), (new_state, 1)):
+            if not state:
+                continue
+            company_id, decision_maker, spoc = state
+            counters = increments.setdefault(company_id, {"contact_count": 0, "decision_maker_count": 0})
+            counters["contact_count"] += delta
+            if decision_maker:
+                counters["decision_maker_count"] += delta
+            if spoc:
+                (spoc_set if delta > 0 else spoc_cleared)[company_id] = contact_id
+    
+    operations = []
+    for company_id, counters in increments.items():
+        inc = {k: v for k, v in counters.items() if v}
+        if inc:
+            # Companies without counters yet are left for reconcile_company_counters;
+            # incrementing a missing field would store a partial count
+            operations.append(UpdateOne(
+                {"id": company_id, "contact_count": {"$exists": True}},
+                {"$inc": inc}
+            ))
+    for company_id, contact_id in spoc_set.items():
+        operations.append(UpdateOne({"id": company_id}, {"$set": {"spoc_contact_id": contact_id}}))
+    for company_id, contact_id in spoc_cleared.items():
+        if company_id not in spoc_set:
+            # Only clear the pointer if it still points at this contact
+            operations.append(UpdateOne(
+                {"id": company_id, "spoc_contact_id": contact_id},
+                {"$set": {"spoc_contact_id": None}}
+            ))
+    if operations:
+        await db.companies.bulk_write(operations, ordered=False)
+
+async def find_company_spoc_id(company: dict) -> Optional[str]:
+    """Current SPOC of a company from its pointer; companies not yet reconciled fall back to a query"""
+    if "spoc_contact_id" in company:
+        return company["spoc_contact_id"]
+    spoc = await db.contacts.find_one(
+        {"company_id": company["id"], "spoc": True, "is_deleted": {"$ne": True}},
+        {"_id": 0, "id": 1}
     )
-    if not has_contact_access:
-        raise HTTPException(status_code=403, detail="Access denied. Permission required.")
-    return True
+    return spoc["id"] if spoc else None
+
+async def reconcile_company_counters() -> int:
+    """Recompute contact counters from the contacts collection and repair companies that drifted"""
+    actual = {}
+    async for row in db.contacts.aggregate([
+        {"$match": {"is_deleted": {"$ne": True}}},
+        {"$group": {
+            "_id": "$company_id",
+            "contact_count": {"$sum": 1},
+            "decision_maker_count": {"$sum": {"$cond": ["$decision_maker", 1, 0]}},
+            "spoc_count": {"$sum": {"$cond": ["$spoc", 1, 0]}},
+            "spoc_contact_id": {"$max": {"$cond": ["$spoc", "$id", None]}}
+        }}
+    ], allowDiskUse=True):
+        actual[row["_id"]] = row
+    
+    # Always the primary: counters are overwritten from what is read here
+    operations = []
+    async for company in db.companies.find({}, {"_id": 0, "id": 1, **{k: 1 for k in EMPTY_COMPANY_COUNTERS}}):
+        row = actual.get(company["id"], {})
+        if row.get("spoc_count", 0) > 1:
+            logger.warning(f"Company {company['id']} has {row['spoc_count']} SPOC contacts")
+        expected = {k: row.get(k, default) for k, default in EMPTY_COMPANY_COUNTERS.items()}
+        if any(k not in company or company[k] != v for k, v in expected.items()):
+            operations.append(UpdateOne({"id": company["id"]}, {"$set": expected}))
+    
+    for chunk in chunked(operations, CONTACT_BULK_CHUNK_SIZE):
+        await db.companies.bulk_write(chunk, ordered=False)
+    if operations:
+        logger.info(f"Reconciled contact counters on {len(operations)} companies")
+    return len(operations)
+
+async def run_company_counter_reconciler():
+    """Periodically repair company contact counters; one worker at a time via a lease"""
+    while True:
+        try:
+            if await acquire_lease("company_counter_reconciler", COMPANY_COUNTER_RECONCILE_INTERVAL_SECONDS):
+                await reconcile_company_counters()
+        except Exception as e:
+            logger.error(f"Company counter reconciliation error: {e}")
+        await asyncio.sleep(COMPANY_COUNTER_RECONCILE_INTERVAL_SECONDS)
 
 # Contact similarity matching for duplicate detection
 def calculate_contact_similarity(contact1: dict, contact2: dict) -> float:
@@ -2473,6 +4650,39 @@ def calculate_contact_similarity(contact1: dict, contact2: dict) -> float:
     
     return score
 
+async def check_contact_email_available(email: str, exclude_id: Optional[str] = None):
+    query = {"email": {"$regex": f"^{email}$", "$options": "i"}, "is_deleted": {"$ne": True}}
+    if exclude_id:
+        query["id"] = {"$ne": exclude_id}
+    if await db.contacts.find_one(query, {"_id": 0, "id": 1}):
+        raise HTTPException(status_code=400, detail="Email already in use.")
+
+async def find_other_company_spoc(company_id: str, contact_id: str) -> Optional[dict]:
+    """The company's current SPOC contact, unless that is contact_id itself"""
+    company = await db.companies.find_one({"id": company_id}, {"_id": 0, "id": 1, "spoc_contact_id": 1})
+    spoc_id = await find_company_spoc_id(company) if company else None
+    if not spoc_id or spoc_id == contact_id:
+        return None
+    return await db.contacts.find_one({"id": spoc_id, "is_deleted": {"$ne": True}})
+
+def spoc_conflict(existing_spoc: dict) -> HTTPException:
+    return HTTPException(
+        status_code=409, 
+        detail={
+            "message": "Another contact is already SPOC for this company.",
+            "existing_spoc": prepare_for_json(existing_spoc),
+            "requires_confirmation": True
+        }
+    )
+
+async def displace_company_spoc(existing_spoc: dict) -> tuple:
+    """Remove SPOC status from a contact; returns its counter change"""
+    await db.contacts.update_one(
+        {"id": existing_spoc["id"]},
+        {"$set": {"spoc": False, "updated_at": datetime.now(timezone.utc)}, "$inc": {"version": 1}}
+    )
+    return (existing_spoc["id"], existing_spoc, {**existing_spoc, "spoc": False})
+
 async def detect_duplicate_contacts(contact_data: ContactCreate, exclude_id: str = None) -> List[dict]:
     """Detect potential duplicate contacts using similarity matching"""
     # Build query to find similar contacts
@@ -2519,9 +4729,11 @@ async def get_contacts(
     limit: int = 50,
     sort_by: str = "created_at",
     sort_order: str = "desc",
+    expand: Optional[str] = None,
+    loader: ReferenceLoader = Depends(ReferenceLoader),
     current_user: User = Depends(get_current_user)
 ):
-    await check_contact_access(current_user)
+    expand_fields = parse_expand(expand, CONTACT_EXPANDABLE_FIELDS)
     
     # Build query
     query = {"is_deleted": {"$ne": True}}
@@ -2550,11 +4762,12 @@ async def get_contacts(
     skip = (page - 1) * limit
     
     # Get total count
-    total = await db.contacts.count_documents(query)
+    total = await read_db().contacts.count_documents(query)
     
     # Get contacts with sorting
     sort_direction = 1 if sort_order == "asc" else -1
-    contacts = await db.contacts.find(query).sort(sort_by, sort_direction).skip(skip).limit(limit).to_list(None)
+    contacts = await read_db().contacts.find(query).sort(sort_by, sort_direction).skip(skip).limit(limit).to_list(None)
+    await expand_references(contacts, expand_fields, loader)
     
     return {
         "contacts": [prepare_for_json(c) for c in contacts],
@@ -2573,17 +4786,6 @@ async def export_contacts(
     is_active: Optional[bool] = None,
     current_user: User = Depends(get_current_user)
 ):
-    await check_contact_access(current_user)
-    
-    # Check export permission
-    user_permissions = await get_user_permissions(current_user.id)
-    has_export = any(
-        p.get("module") == "Sales" and p.get("menu") == "Contacts" and p.get("permission") == "Export"
-        for p in user_permissions
-    )
-    if not has_export:
-        raise HTTPException(status_code=403, detail="Export permission required")
-    
     # Build query (same as get_contacts)
     query = {"is_deleted": {"$ne": True}}
     
@@ -2598,45 +4800,22 @@ async def export_contacts(
     if is_active is not None:
         query["is_active"] = is_active
     
-    contacts = await db.contacts.find(query).to_list(None)
+    contacts = await read_db().contacts.find(query).to_list(None)
     return [prepare_for_json(c) for c in contacts]
 
 @api_router.get("/contacts/{contact_id}")
-async def get_contact(contact_id: str, current_user: User = Depends(get_current_user)):
-    await check_contact_access(current_user)
-    
+async def get_contact(contact_id: str, response: Response, current_user: User = Depends(get_current_user)):
     contact = await db.contacts.find_one({"id": contact_id, "is_deleted": {"$ne": True}})
     if not contact:
         raise HTTPException(status_code=404, detail="Contact not found")
     
+    response.headers["ETag"] = version_etag(contact)
     return prepare_for_json(contact)
 
 @api_router.post("/contacts")
 async def create_contact(contact_data: ContactCreate, current_user: User = Depends(get_current_user)):
-    await check_contact_access(current_user)
-    
     # Check email uniqueness
-    existing_email = await db.contacts.find_one({
-        "email": {"$regex": f"^{contact_data.email}$", "$options": "i"},
-        "is_deleted": {"$ne": True}
-    })
-    if existing_email:
-        raise HTTPException(status_code=400, detail="Email already in use.")
-    
-    # Check SPOC uniqueness per company
-    if contact_data.spoc:
-        existing_spoc = await db.contacts.find_one({
-            "company_id": contact_data.company_id,
-            "spoc": True,
-            "is_deleted": {"$ne": True}
-        })
-        if existing_spoc:
-            raise HTTPException(status_code=400, detail="Another contact is already SPOC for this company.")
-    
-    # Detect potential duplicates
-    duplicates = await detect_duplicate_contacts(contact_data)
-    if duplicates:
-        raise HTTPException(status_code=400, detail="Possible duplicate contact detected. Review and confirm.")
+    await check_contact_email_available(contact_data.email)
     
     # Verify company exists
     company = await db.companies.find_one({
@@ -2646,6 +4825,15 @@ async def create_contact(contact_data: ContactCreate, current_user: User = Depen
     if not company:
         raise HTTPException(status_code=400, detail="Company not found or inactive")
     
+    # Check SPOC uniqueness per company
+    if contact_data.spoc and await find_company_spoc_id(company):
+        raise HTTPException(status_code=400, detail="Another contact is already SPOC for this company.")
+    
+    # Detect potential duplicates
+    duplicates = await detect_duplicate_contacts(contact_data)
+    if duplicates:
+        raise HTTPException(status_code=400, detail="Possible duplicate contact detected. Review and confirm.")
+    
     try:
         # Create contact
         contact_dict = {
@@ -2655,10 +4843,12 @@ async def create_contact(contact_data: ContactCreate, current_user: User = Depen
             "created_at": datetime.now(timezone.utc),
             "updated_at": datetime.now(timezone.utc),
             "is_active": True,
-            "is_deleted": False
+            "is_deleted": False,
+            "version": 1
         }
         
         await db.contacts.insert_one(contact_dict)
+        await apply_company_counter_changes([(contact_dict["id"], None, contact_dict)])
         
         # Log audit trail
         await log_audit_trail(
@@ -2671,6 +4861,8 @@ async def create_contact(contact_data: ContactCreate, current_user: User = Depen
         
         return prepare_for_json(contact_dict)
         
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         logger.error(f"Failed to create contact: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to save contact. Try again.")
@@ -2679,15 +4871,20 @@ async def create_contact(contact_data: ContactCreate, current_user: User = Depen
 async def update_contact(
     contact_id: str, 
     contact_data: ContactUpdate, 
+    response: Response,
     force_spoc_update: bool = False,
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user)
 ):
-    await check_contact_access(current_user)
+    expected_version = parse_expected_version(if_match, expected_version)
     
     # Check if contact exists
     existing_contact = await db.contacts.find_one({"id": contact_id, "is_deleted": {"$ne": True}})
     if not existing_contact:
         raise HTTPException(status_code=404, detail="Contact not found")
+    if expected_version is not None and existing_contact.get("version", 1) != expected_version:
+        raise version_conflict(existing_contact.get("version", 1))
     
     # Prepare update data (only include non-None values)
     update_data = {k: v for k, v in contact_data.dict().items() if v is not None}
@@ -2697,45 +4894,24 @@ async def update_contact(
     
     # Check email uniqueness if email is being updated
     if "email" in update_data:
-        existing_email = await db.contacts.find_one({
-            "email": {"$regex": f"^{update_data['email']}$", "$options": "i"},
-            "id": {"$ne": contact_id},
-            "is_deleted": {"$ne": True}
-        })
-        if existing_email:
-            raise HTTPException(status_code=400, detail="Email already in use.")
+        await check_contact_email_available(update_data["email"], exclude_id=contact_id)
     
     # Check SPOC uniqueness if SPOC is being set to True
+    counter_changes = []
     if "spoc" in update_data and update_data["spoc"]:
         company_id = update_data.get("company_id", existing_contact["company_id"])
-        existing_spoc = await db.contacts.find_one({
-            "company_id": company_id,
-            "spoc": True,
-            "id": {"$ne": contact_id},
-            "is_deleted": {"$ne": True}
-        })
+        existing_spoc = await find_other_company_spoc(company_id, contact_id)
         
         if existing_spoc and not force_spoc_update:
-            raise HTTPException(
-                status_code=409, 
-                detail={
-                    "message": "Another contact is already SPOC for this company.",
-                    "existing_spoc": prepare_for_json(existing_spoc),
-                    "requires_confirmation": True
-                }
-            )
+            raise spoc_conflict(existing_spoc)
         elif existing_spoc and force_spoc_update:
-            # Remove SPOC status from existing contact
-            await db.contacts.update_one(
-                {"id": existing_spoc["id"]},
-                {"$set": {"spoc": False, "updated_at": datetime.now(timezone.utc)}}
-            )
+            counter_changes.append(await displace_company_spoc(existing_spoc))
     
     # Detect potential duplicates if key fields are being updated
     if any(field in update_data for field in ["email", "first_name", "company_id"]):
         # Create a merged data object for duplicate detection
         merged_data = {**existing_contact, **update_data}
-        contact_create_data = ContactCreate(**{k: v for k, v in merged_data.items() if k in ContactCreate.__fields__})
+        contact_create_data = ContactCreate(**{k: v for k, v in merged_data.items() if k in ContactCreate.model_fields})
         
         duplicates = await detect_duplicate_contacts(contact_create_data, exclude_id=contact_id)
         if duplicates:
@@ -2745,9 +4921,11 @@ async def update_contact(
         # Update contact
         update_data["updated_at"] = datetime.now(timezone.utc)
         
-        await db.contacts.update_one(
-            {"id": contact_id},
-            {"$set": update_data}
+        # Soft-delete and version conditions in the filter catch writes that raced the checks above
+        updated_contact = await update_one_and_fetch(
+            db.contacts, {"id": contact_id, "is_deleted": {"$ne": True}},
+            {"$set": update_data, "$inc": {"version": 1}}, "Contact not found",
+            expected_version=expected_version
         )
         
         # Log audit trail
@@ -2759,35 +4937,123 @@ async def update_contact(
             details=f"Updated contact: {existing_contact['first_name']} {existing_contact.get('last_name', '')} ({existing_contact['email']})"
         )
         
-        # Get updated contact
-        updated_contact = await db.contacts.find_one({"id": contact_id})
+        counter_changes.append((contact_id, existing_contact, updated_contact))
+        await apply_company_counter_changes(counter_changes)
+        response.headers["ETag"] = version_etag(updated_contact)
         return prepare_for_json(updated_contact)
         
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         logger.error(f"Failed to update contact: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to save contact. Try again.")
 
-@api_router.delete("/contacts/{contact_id}")
-async def delete_contact(contact_id: str, current_user: User = Depends(get_current_user)):
-    await check_contact_access(current_user)
-    
-    # Check if contact exists
-    contact = await db.contacts.find_one({"id": contact_id, "is_deleted": {"$ne": True}})
-    if not contact:
+# Inputs of the checks a contact patch re-runs; a patch that leaves them alone skips the check and its queries
+CONTACT_DUPLICATE_FIELDS = {"email", "first_name", "company_id"}
+CONTACT_REFERENCE_FIELDS = {"designation_id": "designations", "country_id": "countries", "city_id": "cities"}
+CONTACT_OPTIONAL_FIELDS = ['middle_name', 'last_name', 'designation_id', 'address', 'country_id', 'city_id', 'comments', 'option']
+
+@api_router.patch("/contacts/{contact_id}")
+async def patch_contact(
+    contact_id: str,
+    response: Response,
+    patch: Dict[str, Any] = Body(..., media_type="application/merge-patch+json"),
+    force_spoc_update: bool = False,
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Change some fields of a contact with a JSON merge patch (null clears an optional field).
+    Only changed fields are written; the email, company, reference, SPOC and duplicate checks run
+    only when their inputs change. A patch that changes nothing is not written and keeps the version."""
+    expected_version = parse_expected_version(if_match, expected_version)
+    unknown = sorted(set(patch) - set(ContactPatch.model_fields))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown contact fields: {', '.join(unknown)}")
+    
+    existing_contact = await db.contacts.find_one({"id": contact_id, "is_deleted": {"$ne": True}}, {"_id": 0})
+    if not existing_contact:
         raise HTTPException(status_code=404, detail="Contact not found")
+    current_version = existing_contact.get("version", 1)
+    if expected_version is not None and current_version != expected_version:
+        raise version_conflict(current_version)
     
+    target = {field: existing_contact[field] for field in ContactPatch.model_fields if field in existing_contact}
     try:
-        # Soft delete - mark as deleted
-        await db.contacts.update_one(
-            {"id": contact_id},
+        contact_data = ContactPatch(**apply_merge_patch(target, patch))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=format_validation_error(e))
+    
+    contact_fields = {k: v for k, v in contact_data.dict().items() if v is not None or k not in CONTACT_OPTIONAL_FIELDS}
+    set_fields, unset_fields = merge_patch_diff(existing_contact, contact_fields, CONTACT_OPTIONAL_FIELDS)
+    changed = set(set_fields) | set(unset_fields)
+    if not changed:
+        response.headers["ETag"] = version_etag(existing_contact)
+        return prepare_for_json(existing_contact)
+    
+    if "email" in set_fields:
+        await check_contact_email_available(contact_data.email, exclude_id=contact_id)
+    if "company_id" in set_fields:
+        company = await db.companies.find_one(
+            {"id": contact_data.company_id, "$or": [{"is_active": True}, {"active_status": True}]}, {"_id": 0, "id": 1}
+        )
+        if not company:
+            raise HTTPException(status_code=400, detail="Company not found or inactive")
+    await validate_master_references(
+        {field: set_fields[field] for field in CONTACT_REFERENCE_FIELDS if field in set_fields}, CONTACT_REFERENCE_FIELDS
+    )
+    if changed & CONTACT_DUPLICATE_FIELDS:
+        if await detect_duplicate_contacts(contact_data, exclude_id=contact_id):
+            raise HTTPException(status_code=400, detail="Possible duplicate contact detected. Review and confirm.")
+    
+    existing_spoc = None
+    if contact_data.spoc and set_fields.keys() & {"spoc", "company_id"}:
+        existing_spoc = await find_other_company_spoc(contact_data.company_id, contact_id)
+        if existing_spoc and not force_spoc_update:
+            raise spoc_conflict(existing_spoc)
+    
+    update_ops = {"$set": {**set_fields, "updated_at": datetime.now(timezone.utc)}, "$inc": {"version": 1}}
+    if unset_fields:
+        update_ops["$unset"] = unset_fields
+    # Conditional on the version the diff was computed from, so a write that raced it is a 412, not a blind merge
+    updated_contact = await update_one_and_fetch(
+        db.contacts, {"id": contact_id, "is_deleted": {"$ne": True}}, update_ops,
+        "Contact not found", expected_version=current_version
+    )
+    counter_changes = [(contact_id, existing_contact, updated_contact)]
+    if existing_spoc:
+        counter_changes.insert(0, await displace_company_spoc(existing_spoc))
+    await apply_company_counter_changes(counter_changes)
+    
+    await log_audit_trail(
+        user_id=current_user.id,
+        action="UPDATE",
+        resource_type="Contact",
+        resource_id=contact_id,
+        details=f"Patched contact {updated_contact['first_name']} {updated_contact.get('last_name') or ''} "
+                f"({updated_contact['email']}): {', '.join(sorted(changed))}"
+    )
+    
+    response.headers["ETag"] = version_etag(updated_contact)
+    return prepare_for_json(updated_contact)
+
+@api_router.delete("/contacts/{contact_id}")
+async def delete_contact(contact_id: str, current_user: User = Depends(get_current_user)):
+    try:
+        # Soft delete - mark as deleted; only the delete that matched moves the company counters
+        contact = await update_one_and_fetch(
+            db.contacts, {"id": contact_id, "is_deleted": {"$ne": True}},
             {
                 "$set": {
                     "is_deleted": True,
                     "deleted_at": datetime.now(timezone.utc),
                     "updated_at": datetime.now(timezone.utc)
-                }
-            }
+                },
+                "$inc": {"version": 1}
+            },
+            "Contact not found", return_document=ReturnDocument.BEFORE
         )
+        await apply_company_counter_changes([(contact_id, contact, {**contact, "is_deleted": True})])
         
         # Log audit trail
         await log_audit_trail(
@@ -2800,54 +5066,1202 @@ async def delete_contact(contact_id: str, current_user: User = Depends(get_curre
         
         return {"message": "Contact deleted successfully"}
         
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         logger.error(f"Failed to delete contact: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to delete contact. Try again.")
 
+def chunked(items: List[Any], size: int):
+    """Split a list into consecutive chunks of at most size items"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+# Field each action writes, and its value when absent from older documents
+CONTACT_BULK_FIELDS = {
+    "activate": ("is_active", True),
+    "deactivate": ("is_active", True),
+    "delete": ("is_deleted", False),
+    "reassign_company": ("company_id", None),
+    "set_designation": ("designation_id", None),
+    "set_decision_maker": ("decision_maker", False),
+    "set_spoc": ("spoc", False),
+}
+
 @api_router.post("/contacts/bulk")
 async def bulk_update_contacts(bulk_data: ContactBulkUpdate, current_user: User = Depends(get_current_user)):
-    await check_contact_access(current_user)
-    
-    if not bulk_data.contact_ids:
+    """Apply one action to many contacts in a single bulk_write with per-id outcomes
+
+    Outcomes are updated, unchanged, not_found, conflict (a second SPOC for the same company) or
+    version_conflict (the contact changed since the version given in expected_versions).
+    """
+    contact_ids = list(dict.fromkeys(bulk_data.contact_ids))
+    if not contact_ids:
         raise HTTPException(status_code=400, detail="No contacts selected")
     
+    action = bulk_data.action
+    if action == "delete":
+        await require_permission(current_user, "Sales", "Contacts", "Delete")
+    field, default = CONTACT_BULK_FIELDS[action]
+    
+    # Validate action parameters and resolve the target value
+    if action in ("activate", "delete"):
+        target = True
+    elif action == "deactivate":
+        target = False
+    elif action == "reassign_company":
+        if not bulk_data.company_id:
+            raise HTTPException(status_code=400, detail="company_id is required to reassign contacts")
+        company = await db.companies.find_one({
+            "id": bulk_data.company_id,
+            "$or": [{"is_active": True}, {"active_status": True}]
+        })
+        if not company:
+            raise HTTPException(status_code=400, detail="Company not found or inactive")
+        target = bulk_data.company_id
+    elif action == "set_designation":
+        if not bulk_data.designation_id:
+            raise HTTPException(status_code=400, detail="designation_id is required to set designation")
+        designation = await db.designations.find_one({"id": bulk_data.designation_id, "is_active": True})
+        if not designation:
+            raise HTTPException(status_code=400, detail="Designation not found")
+        target = bulk_data.designation_id
+    else:
+        if bulk_data.value is None:
+            raise HTTPException(status_code=400, detail="value is required for this action")
+        target = bulk_data.value
+    
     try:
-        # Prepare update based on action
-        if bulk_data.action == "activate":
-            update_data = {"is_active": True}
-        elif bulk_data.action == "deactivate":
-            update_data = {"is_active": False}
-        else:
-            raise HTTPException(status_code=400, detail="Invalid action")
+        # Current state of every selected contact, fetched in chunks
+        contacts = {}
+        for chunk in chunked(contact_ids, CONTACT_BULK_CHUNK_SIZE):
+            docs = await db.contacts.find(
+                {"id": {"$in": chunk}, "is_deleted": {"$ne": True}},
+                {"_id": 0, "id": 1, "company_id": 1, "spoc": 1, "decision_maker": 1, "version": 1, field: 1}
+            ).to_list(None)
+            contacts.update((doc["id"], doc) for doc in docs)
         
-        update_data["updated_at"] = datetime.now(timezone.utc)
+        results = {}
+        expected_versions = bulk_data.expected_versions
+        for contact_id in contact_ids:
+            if contact_id not in contacts:
+                results[contact_id] = "not_found"
+            elif contact_id in expected_versions and contacts[contact_id].get("version", 1) != expected_versions[contact_id]:
+                results[contact_id] = "version_conflict"
         
-        # Update contacts
-        result = await db.contacts.update_many(
-            {
-                "id": {"$in": bulk_data.contact_ids},
-                "is_deleted": {"$ne": True}
-            },
-            {"$set": update_data}
-        )
+        operations = []
+        now = datetime.now(timezone.utc)
+        side_effects = {}  # contact id -> (state before, state after) for contacts changed as a side effect
+        dropped = []  # reassigned SPOCs that lose the flag
+        winners = {}  # company id -> the contact becoming its SPOC
+        existing_spocs = []
         
-        # Log audit trail
-        await log_audit_trail(
-            user_id=current_user.id,
-            action="BULK_UPDATE",
-            resource_type="Contact",
-            resource_id=",".join(bulk_data.contact_ids),
-            details=f"Bulk {bulk_data.action} on {result.modified_count} contacts"
-        )
+        if action == "set_spoc" and target:
+            # The first selected contact per company becomes SPOC and displaces any other SPOC there
+            for contact_id in contact_ids:
+                if contact_id in results:
+                    continue
+                company_id = contacts[contact_id]["company_id"]
+                if company_id in winners:
+                    results[contact_id] = "conflict"
+                else:
+                    winners[company_id] = contact_id
+            
+            existing_spocs = await db.contacts.find(
+                {"company_id": {"$in": list(winners)}, "spoc": True, "is_deleted": {"$ne": True}},
+                {"_id": 0, "id": 1, "company_id": 1, "spoc": 1, "decision_maker": 1}
+            ).to_list(None) if winners else []
+        elif action == "reassign_company":
+            # SPOCs moving into the company lose the flag unless the company has no SPOC yet
+            moving_spocs = [
+                cid for cid in contact_ids
+                if cid in contacts and contacts[cid].get("spoc") and contacts[cid]["company_id"] != target
+            ]
+            if moving_spocs:
+                target_has_spoc = await find_company_spoc_id(company)
+                dropped = moving_spocs if target_has_spoc else moving_spocs[1:]
+                # Part of the same edit as the reassignment below, which bumps the version;
+                # rows with an expected version get the flag cleared in their conditional write
+                unversioned_dropped = [cid for cid in dropped if cid not in bulk_data.expected_versions]
+                if unversioned_dropped:
+                    operations.append(UpdateMany(
+                        {"id": {"$in": unversioned_dropped}},
+                        {"$set": {"spoc": False}}
+                    ))
+        
+        changed = []
+        for contact_id in contact_ids:
+            if contact_id in results:
+                continue
+            if contacts[contact_id].get(field, default) == target:
+                results[contact_id] = "unchanged"
+            else:
+                changed.append(contact_id)
+        
+        update = {field: target, "updated_at": now}
+        if action == "delete":
+            update["deleted_at"] = now
+        unversioned = [cid for cid in changed if cid not in expected_versions]
+        versioned = [cid for cid in changed if cid in expected_versions]
+        for chunk in chunked(unversioned, CONTACT_BULK_CHUNK_SIZE):
+            operations.append(UpdateMany(
+                {"id": {"$in": chunk}, "is_deleted": {"$ne": True}},
+                {"$set": update, "$inc": {"version": 1}}
+            ))
+        
+        if operations:
+            await db.contacts.bulk_write(operations, ordered=False)
+        if versioned:
+            # The version check sits in each row's filter; a row edited since it was read above
+            # simply doesn't match, and only then are the versions re-read to find which rows lost
+            result = await db.contacts.bulk_write([
+                UpdateOne(
+                    {"id": cid, "is_deleted": {"$ne": True}, "version": expected_versions[cid]},
+                    {"$set": {**update, "spoc": False} if cid in dropped else update, "$inc": {"version": 1}}
+                )
+                for cid in versioned
+            ], ordered=False)
+            if result.matched_count < len(versioned):
+                current = await db.contacts.find(
+                    {"id": {"$in": versioned}}, {"_id": 0, "id": 1, "version": 1}
+                ).to_list(None)
+                applied = {
+                    doc["id"] for doc in current if doc.get("version") == expected_versions[doc["id"]] + 1
+                }
+                for contact_id in versioned:
+                    if contact_id not in applied:
+                        results[contact_id] = "version_conflict"
+                changed = [cid for cid in changed if cid not in results]
+        
+        # Displace the other SPOCs only once the winner's own write has gone through
+        displaced = [
+            spoc["id"] for spoc in existing_spocs
+            if winners[spoc["company_id"]] != spoc["id"]
+            and results.get(winners[spoc["company_id"]]) in (None, "unchanged")
+        ]
+        for spoc in existing_spocs:
+            if spoc["id"] in displaced:
+                side_effects[spoc["id"]] = (spoc, {**spoc, "spoc": False})
+        if displaced:
+            await db.contacts.update_many(
+                {"id": {"$in": displaced}},
+                {"$set": {"spoc": False, "updated_at": now}, "$inc": {"version": 1}}
+            )
+        
+        counter_changes = [(cid, before, after) for cid, (before, after) in side_effects.items()]
+        for contact_id in changed:
+            results[contact_id] = "updated"
+            before = contacts[contact_id]
+            after = {**before, field: target}
+            if contact_id in dropped:
+                after["spoc"] = False
+            counter_changes.append((contact_id, before, after))
+        await apply_company_counter_changes(counter_changes)
+        
+        # One compact audit record per affected contact
+        details = f"Bulk {action}" if action in ("activate", "deactivate", "delete") else f"Bulk {action} -> {target}"
+        await log_audit_trail_many([
+            build_audit_entry(current_user.id, "BULK_UPDATE", "Contact", contact_id, details)
+            for contact_id in changed
+        ])
+        
+        summary = {}
+        for outcome in results.values():
+            summary[outcome] = summary.get(outcome, 0) + 1
         
         return {
-            "message": f"Successfully {bulk_data.action}d {result.modified_count} contacts",
-            "updated_count": result.modified_count
+            "message": f"Successfully applied {action} to {len(changed)} contacts",
+            "updated_count": len(changed),
+            "summary": summary,
+            "results": results
         }
         
+    except (HTTPException, PyMongoError):
+        raise
     except Exception as e:
         logger.error(f"Failed to bulk update contacts: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to update contacts. Try again.")
 
+# ================ SALES ROLLUPS ================
+# Pre-aggregated dashboard numbers. Each active company contributes to one rollup document per
+# dimension value (plus an "all" document); company writes apply the difference between the old
+# and new contribution with $inc, and rebuild_sales_rollups recomputes everything from scratch.
+
+SALES_ROLLUP_DIMENSIONS = {
+    "region": "region_id",
+    "industry": "industry_id",
+    "account_type": "account_type_id",
+    "lead_status": "lead_status",
+}
+SALES_ROLLUP_REFERENCES = {"region": "regions", "industry": "industries", "account_type": "account_types"}
+SALES_ROLLUP_PROJECTION = {
+    "_id": 0, "is_active": 1, "lead_status": 1, "score": 1, "annual_revenue": 1,
+    "revenue_currency": 1, "employee_count": 1, **{field: 1 for field in SALES_ROLLUP_DIMENSIONS.values()}
+}
+
+def score_bucket(score: Optional[int]) -> str:
+    """Histogram bucket label: 0-9 -> '0', ..., 90-100 -> '90'"""
+    return str(min(max(int(score or 0), 0) // 10 * 10, 90))
+
+def sales_rollup_contribution(company: Optional[dict]) -> Dict[tuple, Dict[str, float]]:
+    """{(dimension, value): increments} one company adds to the rollups; inactive companies add nothing"""
+    if not company or company.get("is_active") is False:
+        return {}
+    currency = (company.get("revenue_currency") or "N/A").upper().replace(".", "").replace("$", "")
+    increments = {
+        "company_count": 1,
+        f"lead_status.{company.get('lead_status') or 'cold'}": 1,
+        f"score_histogram.{score_bucket(company.get('score'))}": 1,
+        f"revenue_by_currency.{currency}": company.get("annual_revenue") or 0,
+        "employee_count": company.get("employee_count") or 0,
+    }
+    contribution = {("all", "all"): increments}
+    for dimension, field in SALES_ROLLUP_DIMENSIONS.items():
+        contribution[(dimension, company.get(field) or "unknown")] = increments
+    return contribution
+
+def add_rollup_contribution(totals: Dict[tuple, Dict[str, float]], contribution: Dict[tuple, Dict[str, float]], sign: int = 1):
+    """Accumulate a document's signed contribution into per-key totals"""
+    for key, increments in contribution.items():
+        target = totals.setdefault(key, {})
+        for name, amount in increments.items():
+            target[name] = target.get(name, 0) + sign * amount
+
+def rollup_upserts(totals: Dict[tuple, Dict[str, float]], key_fields: tuple) -> List[UpdateOne]:
+    """One upserting $inc per rollup key; the key's parts are stored as key_fields on insert"""
+    operations = []
+    for key, increments in totals.items():
+        inc = {name: amount for name, amount in increments.items() if amount}
+        if inc:
+            operations.append(UpdateOne(
+                {"key": ":".join(str(part) for part in key)},
+                {"$inc": inc, "$setOnInsert": dict(zip(key_fields, key))},
+                upsert=True
+            ))
+    return operations
+
+async def apply_rollup_changes(collection, contribution, key_fields: tuple, changes: List[tuple]):
+    """Apply [(document before, document after)] to a rollup collection in one bulk_write"""
+    deltas: Dict[tuple, Dict[str, float]] = {}
+    for before, after in changes:
+        add_rollup_contribution(deltas, contribution(before), -1)
+        add_rollup_contribution(deltas, contribution(after))
+    
+    operations = rollup_upserts(deltas, key_fields)
+    if operations:
+        try:
+            await collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            # The source write already succeeded; the next rebuild repairs the rollups
+            logger.error(f"Rollup update on {collection.name} failed: {e}")
+
+async def rebuild_rollup_collection(cursor, contribution, collection_name: str, key_fields: tuple) -> int:
+    """Recompute a rollup collection from a source cursor into staging, then swap it in.
+
+    Not isolated from concurrent writes: apply_rollup_changes keeps incrementing the live collection
+    while this runs, and the swap discards those increments. A source write that lands after the
+    cursor has passed its document is therefore missing from the result until the next rebuild, so
+    run rebuilds while writes are quiet. Replaying the increments instead would double count the
+    writes the cursor did see, and the writers may be other processes."""
+    totals: Dict[tuple, Dict[str, float]] = {}
+    async for doc in cursor:
+        add_rollup_contribution(totals, contribution(doc))
+    
+    staging = db[f"{collection_name}_rebuild"]
+    await staging.drop()
+    await staging.create_index([("key", ASCENDING)], name="key", unique=True)
+    operations = rollup_upserts(totals, key_fields)
+    for chunk in chunked(operations, CONTACT_BULK_CHUNK_SIZE):
+        await staging.bulk_write(chunk, ordered=False)
+    if operations:
+        await staging.rename(collection_name, dropTarget=True)
+    else:
+        await db[collection_name].delete_many({})
+    logger.info(f"Rebuilt {len(operations)} {collection_name} documents")
+    return len(operations)
+
+SALES_ROLLUP_KEY_FIELDS = ("dimension", "value")
+
+async def apply_sales_rollup_changes(changes: List[tuple]):
+    """Apply [(company before, company after)] to the sales rollups"""
+    await apply_rollup_changes(db.sales_rollups, sales_rollup_contribution, SALES_ROLLUP_KEY_FIELDS, changes)
+
+async def rebuild_sales_rollups() -> int:
+    """Recompute every sales rollup document from the companies collection"""
+    return await rebuild_rollup_collection(
+        db.companies.find({"is_active": {"$ne": False}}, SALES_ROLLUP_PROJECTION),
+        sales_rollup_contribution, "sales_rollups", SALES_ROLLUP_KEY_FIELDS
+    )
+
+def format_sales_rollup(doc: dict, name: Optional[str] = None) -> dict:
+    return {
+        "value": doc.get("value"),
+        "name": name,
+        "company_count": doc.get("company_count", 0),
+        "hot": doc.get("lead_status", {}).get("hot", 0),
+        "cold": doc.get("lead_status", {}).get("cold", 0),
+        "score_histogram": {b: doc.get("score_histogram", {}).get(b, 0) for b in (str(i) for i in range(0, 100, 10))},
+        "revenue_by_currency": {k: v for k, v in doc.get("revenue_by_currency", {}).items() if v},
+        "employee_count": doc.get("employee_count", 0),
+    }
+
+@api_router.get("/dashboard/sales")
+async def get_sales_dashboard(
+    loader: ReferenceLoader = Depends(ReferenceLoader),
+    current_user: User = Depends(get_current_user)
+):
+    """Company counts, lead status split, score histogram and revenue by region, industry and
+    account type. Reads only the (small, fixed-size per dimension value) rollup documents."""
+    docs = await read_db().sales_rollups.find(
+        {"company_count": {"$gt": 0}}, {"_id": 0}
+    ).to_list(None)
+    for doc in docs:
+        if doc["dimension"] in SALES_ROLLUP_REFERENCES:
+            loader.want(SALES_ROLLUP_REFERENCES[doc["dimension"]], doc["value"])
+    await loader.load()
+    
+    dashboard = {"totals": format_sales_rollup({}), **{f"by_{d}": [] for d in SALES_ROLLUP_DIMENSIONS}}
+    for doc in docs:
+        dimension = doc["dimension"]
+        if dimension == "all":
+            dashboard["totals"] = format_sales_rollup(doc)
+            continue
+        collection = SALES_ROLLUP_REFERENCES.get(dimension)
+        name = loader.name(collection, doc["value"]) if collection else doc["value"]
+        dashboard[f"by_{dimension}"].append(format_sales_rollup(doc, name))
+    for dimension in SALES_ROLLUP_DIMENSIONS:
+        dashboard[f"by_{dimension}"].sort(key=lambda r: r["company_count"], reverse=True)
+    return dashboard
+
+@api_router.post("/dashboard/sales/rebuild")
+async def rebuild_sales_dashboard(current_user: User = Depends(get_current_user)):
+    """Recompute the sales rollups from scratch (repairs drift; company writes made while it runs
+    can be missed, see rebuild_rollup_collection)"""
+    if not await acquire_lease("sales_rollup_rebuild", 300):
+        raise HTTPException(status_code=409, detail="A rebuild is already running")
+    try:
+        rollups = await rebuild_sales_rollups()
+    finally:
+        await release_lease("sales_rollup_rebuild")
+    
+    await log_activity("sales", "sales_rollups", "rebuild", "success", current_user.id, {"rollups": rollups})
+    return {"message": "Sales rollups rebuilt", "rollups": rollups}
+
+# ================ LEADS & OPPORTUNITIES ================
+# Per-stage pipeline totals live in pipeline_stage_totals, one document per (stage, owner, currency),
+# and move with every opportunity write, so pipeline and kanban summaries never scan opportunities.
+
+OPPORTUNITY_STAGES = ["Qualification", "Proposal", "Negotiation", "Won", "Lost"]
+# Close probability per stage, used for the weighted forecast
+OPPORTUNITY_STAGE_PROBABILITY = {"Qualification": 0.1, "Proposal": 0.4, "Negotiation": 0.7, "Won": 1.0, "Lost": 0.0}
+PIPELINE_KEY_FIELDS = ("stage", "owner_user_id", "currency")
+UNASSIGNED_OWNER = "unassigned"
+
+async def validate_sales_references(company_id: Optional[str] = None, contact_id: Optional[str] = None,
+                                    owner_user_id: Optional[str] = None):
+    """Check referenced company, contact and owner exist (concurrently)"""
+    context = request_context.get()
+    if owner_user_id and context and context.user and context.user.id == owner_user_id:
+        context.record_avoided("user")
+        owner_user_id = None  # the authenticated user is known to exist and be active
+    checks = [
+        ("Company not found or inactive", db.companies.find_one(
+            {"id": company_id, "$or": [{"is_active": True}, {"active_status": True}]}, {"_id": 1}) if company_id else None),
+        ("Contact not found", db.contacts.find_one(
+            {"id": contact_id, "is_deleted": {"$ne": True}}, {"_id": 1}) if contact_id else None),
+        ("Owner user not found", db.users.find_one(
+            {"id": owner_user_id, "is_active": True}, {"_id": 1}) if owner_user_id else None),
+    ]
+    pending = [(message, query) for message, query in checks if query is not None]
+    results = await asyncio.gather(*[query for _, query in pending])
+    for (message, _), found in zip(pending, results):
+        if not found:
+            raise HTTPException(status_code=400, detail=message)
+
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Treat naive datetimes as UTC so stored ISO strings compare consistently"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc) if value is not None else None
+
+def pipeline_contribution(opportunity: Optional[dict]) -> Dict[tuple, Dict[str, float]]:
+    """{(stage, owner, currency): increments} one opportunity adds to the stage totals"""
+    if not opportunity or opportunity.get("is_active") is False:
+        return {}
+    stage = opportunity.get("stage") or "Qualification"
+    amount = opportunity.get("amount") or 0
+    key = (stage, opportunity.get("owner_user_id") or UNASSIGNED_OWNER, (opportunity.get("currency") or "USD").upper())
+    return {key: {
+        "count": 1,
+        "amount": amount,
+        "weighted_amount": amount * OPPORTUNITY_STAGE_PROBABILITY.get(stage, 0)
+    }}
+
+async def apply_pipeline_changes(changes: List[tuple]):
+    """Apply [(opportunity before, opportunity after)] to the stage totals"""
+    await apply_rollup_changes(db.pipeline_stage_totals, pipeline_contribution, PIPELINE_KEY_FIELDS, changes)
+
+async def rebuild_pipeline_totals() -> int:
+    """Recompute the stage totals from the opportunities collection"""
+    return await rebuild_rollup_collection(
+        db.opportunities.find(
+            {"is_active": {"$ne": False}},
+            {"_id": 0, "stage": 1, "owner_user_id": 1, "currency": 1, "amount": 1, "is_active": 1}
+        ),
+        pipeline_contribution, "pipeline_stage_totals", PIPELINE_KEY_FIELDS
+    )
+
+def paginate(total: int, page: int, limit: int) -> dict:
+    return {"total": total, "page": page, "limit": limit, "total_pages": (total + limit - 1) // limit}
+
+# Leads
+@api_router.get("/leads")
+async def get_leads(
+    status: Optional[str] = None,
+    owner_user_id: Optional[str] = None,
+    company_id: Optional[str] = None,
+    page: int = 1,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user)
+):
+    query = {"is_active": True}
+    if status:
+        query["status"] = status
+    if owner_user_id:
+        query["owner_user_id"] = owner_user_id
+    if company_id:
+        query["company_id"] = company_id
+    
+    total, leads = await asyncio.gather(
+        read_db().leads.count_documents(query),
+        read_db().leads.find(query, {"_id": 0}).sort("created_at", DESCENDING).skip((page - 1) * limit).limit(limit).to_list(None)
+    )
+    return {"leads": [prepare_for_json(lead) for lead in leads], **paginate(total, page, limit)}
+
+@api_router.get("/leads/{lead_id}")
+async def get_lead(lead_id: str, current_user: User = Depends(get_current_user)):
+    lead = await db.leads.find_one({"id": lead_id, "is_active": True}, {"_id": 0})
+    if not lead:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    return prepare_for_json(lead)
+
+@api_router.post("/leads")
+async def create_lead(lead_data: LeadCreate, current_user: User = Depends(get_current_user)):
+    await validate_sales_references(lead_data.company_id, lead_data.contact_id, lead_data.owner_user_id)
+    
+    lead = Lead(**lead_data.dict(), created_by=current_user.id)
+    lead_dict = prepare_for_mongo(lead.dict())
+    await db.leads.insert_one(lead_dict)
+    
+    await log_audit_trail(current_user.id, "CREATE", "Lead", lead.id, f"Created lead: {lead.title}")
+    return prepare_for_json(lead_dict)
+
+@api_router.put("/leads/{lead_id}")
+async def update_lead(lead_id: str, lead_data: LeadUpdate, current_user: User = Depends(get_current_user)):
+    update_data = {k: v for k, v in lead_data.dict().items() if v is not None}
+    if not update_data:
+        raise HTTPException(status_code=400, detail="No data provided for update")
+    await validate_sales_references(update_data.get("company_id"), update_data.get("contact_id"), update_data.get("owner_user_id"))
+    
+    update_data["updated_by"] = current_user.id
+    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    lead = await update_one_and_fetch(db.leads, {"id": lead_id, "is_active": True}, {"$set": update_data}, "Lead not found")
+    
+    await log_audit_trail(current_user.id, "UPDATE", "Lead", lead_id, f"Updated lead: {lead['title']}")
+    return prepare_for_json(lead)
+
+@api_router.delete("/leads/{lead_id}")
+async def delete_lead(lead_id: str, current_user: User = Depends(get_current_user)):
+    existing = await db.leads.find_one({"id": lead_id, "is_active": True})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    
+    await db.leads.update_one(
+        {"id": lead_id},
+        {"$set": {"is_active": False, "updated_by": current_user.id, "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    await log_audit_trail(current_user.id, "DELETE", "Lead", lead_id, f"Deleted lead: {existing['title']}")
+    return {"message": "Lead deleted successfully"}
+
+@api_router.post("/leads/{lead_id}/convert")
+async def convert_lead(lead_id: str, current_user: User = Depends(get_current_user)):
+    """Turn a lead into an opportunity in the Qualification stage and mark the lead Qualified"""
+    opportunity_id = str(uuid.uuid4())
+    # Claim the lead before creating anything, so concurrent conversions cannot both succeed
+    lead = await db.leads.find_one_and_update(
+        {"id": lead_id, "is_active": True, "converted_opportunity_id": None},
+        {"$set": {"status": "Qualified", "converted_opportunity_id": opportunity_id,
+                  "updated_by": current_user.id, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0}
+    )
+    if not lead:
+        if await db.leads.find_one({"id": lead_id, "is_active": True}, {"_id": 1}):
+            raise HTTPException(status_code=400, detail="Lead has already been converted")
+        raise HTTPException(status_code=404, detail="Lead not found")
+    
+    opportunity = Opportunity(
+        id=opportunity_id,
+        name=lead["title"],
+        company_id=lead.get("company_id"),
+        lead_id=lead_id,
+        amount=lead.get("expected_value"),
+        currency=lead.get("currency") or "USD",
+        owner_user_id=lead.get("owner_user_id"),
+        created_by=current_user.id
+    )
+    opportunity_dict = prepare_for_mongo(opportunity.dict())
+    try:
+        await db.opportunities.insert_one(opportunity_dict)
+    except PyMongoError:
+        # Release the claim so the conversion can be retried
+        await db.leads.update_one(
+            {"id": lead_id, "converted_opportunity_id": opportunity_id},
+            {"$set": {"status": lead.get("status"), "converted_opportunity_id": None}}
+        )
+        raise
+    await apply_pipeline_changes([(None, opportunity_dict)])
+    
+    await log_audit_trail(current_user.id, "CONVERT", "Lead", lead_id, f"Converted lead to opportunity {opportunity.id}")
+    return prepare_for_json(opportunity_dict)
+
+# Opportunities
+@api_router.get("/opportunities")
+async def get_opportunities(
+    stage: Optional[str] = None,
+    owner_user_id: Optional[str] = None,
+    company_id: Optional[str] = None,
+    close_date_from: Optional[datetime] = None,
+    close_date_to: Optional[datetime] = None,
+    page: int = 1,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user)
+):
+    """Opportunities ordered by close date; with stage (+ owner) this is one kanban column"""
+    query = {"is_active": True}
+    if stage:
+        query["stage"] = stage
+    if owner_user_id:
+        query["owner_user_id"] = owner_user_id
+    if company_id:
+        query["company_id"] = company_id
+    if close_date_from or close_date_to:
+        query["close_date"] = {}
+        if close_date_from:
+            query["close_date"]["$gte"] = to_utc(close_date_from).isoformat()
+        if close_date_to:
+            query["close_date"]["$lte"] = to_utc(close_date_to).isoformat()
+    
+    total, opportunities = await asyncio.gather(
+        read_db().opportunities.count_documents(query),
+        read_db().opportunities.find(query, {"_id": 0}).sort("close_date", ASCENDING).skip((page - 1) * limit).limit(limit).to_list(None)
+    )
+    return {"opportunities": [prepare_for_json(o) for o in opportunities], **paginate(total, page, limit)}
+
+@api_router.get("/opportunities/pipeline")
+async def get_opportunity_pipeline(
+    owner_user_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Count, amount and weighted forecast per stage, read from the maintained stage totals"""
+    query = {"count": {"$gt": 0}}
+    if owner_user_id:
+        query["owner_user_id"] = owner_user_id
+    totals = await read_db().pipeline_stage_totals.find(query, {"_id": 0}).to_list(None)
+    
+    stages = {
+        stage: {"stage": stage, "probability": OPPORTUNITY_STAGE_PROBABILITY[stage], "count": 0,
+                "amount_by_currency": {}, "weighted_by_currency": {}}
+        for stage in OPPORTUNITY_STAGES
+    }
+    for row in totals:
+        stage = stages.get(row["stage"])
+        if not stage:
+            continue
+        stage["count"] += row["count"]
+        currency = row["currency"]
+        stage["amount_by_currency"][currency] = stage["amount_by_currency"].get(currency, 0) + row.get("amount", 0)
+        stage["weighted_by_currency"][currency] = stage["weighted_by_currency"].get(currency, 0) + row.get("weighted_amount", 0)
+    
+    # Forecast covers open stages and Won; Lost has probability 0
+    forecast = {}
+    for stage in stages.values():
+        for currency, amount in stage["weighted_by_currency"].items():
+            forecast[currency] = forecast.get(currency, 0) + amount
+    return {"stages": list(stages.values()), "weighted_forecast_by_currency": forecast}
+
+@api_router.get("/opportunities/{opportunity_id}")
+async def get_opportunity(opportunity_id: str, current_user: User = Depends(get_current_user)):
+    opportunity = await db.opportunities.find_one({"id": opportunity_id, "is_active": True}, {"_id": 0})
+    if not opportunity:
+        raise HTTPException(status_code=404, detail="Opportunity not found")
+    return prepare_for_json(opportunity)
+
+@api_router.post("/opportunities")
+async def create_opportunity(opportunity_data: OpportunityCreate, current_user: User = Depends(get_current_user)):
+    await validate_sales_references(opportunity_data.company_id, owner_user_id=opportunity_data.owner_user_id)
+    
+    opportunity = Opportunity(
+        **{**opportunity_data.dict(), "close_date": to_utc(opportunity_data.close_date)},
+        created_by=current_user.id
+    )
+    opportunity_dict = prepare_for_mongo(opportunity.dict())
+    await db.opportunities.insert_one(opportunity_dict)
+    await apply_pipeline_changes([(None, opportunity_dict)])
+    
+    await log_audit_trail(current_user.id, "CREATE", "Opportunity", opportunity.id, f"Created opportunity: {opportunity.name}")
+    return prepare_for_json(opportunity_dict)
+
+@api_router.put("/opportunities/{opportunity_id}")
+async def update_opportunity(opportunity_id: str, opportunity_data: OpportunityUpdate,
+                             current_user: User = Depends(get_current_user)):
+    update_data = {k: v for k, v in opportunity_data.dict().items() if v is not None}
+    if not update_data:
+        raise HTTPException(status_code=400, detail="No data provided for update")
+    await validate_sales_references(update_data.get("company_id"), owner_user_id=update_data.get("owner_user_id"))
+    
+    if "close_date" in update_data:
+        update_data["close_date"] = to_utc(update_data["close_date"])
+    update_data["updated_by"] = current_user.id
+    update_data["updated_at"] = datetime.now(timezone.utc)
+    update_data = prepare_for_mongo(update_data)
+    # The pre-update document gives the stage totals delta
+    existing = await update_one_and_fetch(
+        db.opportunities, {"id": opportunity_id, "is_active": True}, {"$set": update_data},
+        "Opportunity not found", return_document=ReturnDocument.BEFORE
+    )
+    await apply_pipeline_changes([(existing, {**existing, **update_data})])
+    
+    details = f"Updated opportunity: {existing['name']}"
+    if update_data.get("stage", existing.get("stage")) != existing.get("stage"):
+        details += f" (stage {existing.get('stage')} -> {update_data['stage']})"
+    await log_audit_trail(current_user.id, "UPDATE", "Opportunity", opportunity_id, details)
+    return prepare_for_json({**existing, **update_data})
+
+@api_router.delete("/opportunities/{opportunity_id}")
+async def delete_opportunity(opportunity_id: str, current_user: User = Depends(get_current_user)):
+    # Only the delete that flips is_active moves the stage totals
+    existing = await update_one_and_fetch(
+        db.opportunities, {"id": opportunity_id, "is_active": True},
+        {"$set": {"is_active": False, "updated_by": current_user.id, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        "Opportunity not found", return_document=ReturnDocument.BEFORE
+    )
+    await apply_pipeline_changes([(existing, {**existing, "is_active": False})])
+    
+    await log_audit_trail(current_user.id, "DELETE", "Opportunity", opportunity_id, f"Deleted opportunity: {existing['name']}")
+    return {"message": "Opportunity deleted successfully"}
+
+# ================ BULK IMPORT ================
+
+class ImportJob(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    job_type: str  # contacts/companies
+    status: str = "queued"  # queued/running/completed/failed
+    filename: str
+    total_rows: Optional[int] = None  # estimate, known once parsing starts
+    processed_rows: int = 0
+    inserted_rows: int = 0
+    failed_rows: int = 0
+    rows_per_second: Optional[float] = None
+    error: Optional[str] = None
+    created_by: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+IMPORT_FILE_TYPES = {".csv", ".xlsx"}
+
+def normalize_import_header(header: Any) -> str:
+    """'First Name' -> 'first_name'"""
+    return str(header or "").strip().lower().replace(" ", "_").replace("-", "_")
+
+def normalize_import_value(value: Any) -> Any:
+    """Blank cells become None; spreadsheet numbers become the strings a CSV would carry"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    value = str(value).strip()
+    return value or None
+
+def estimate_import_rows(path: Path, filename: str) -> Optional[int]:
+    """Cheap row-count estimate for progress reporting (blocking - call via a thread)"""
+    if Path(filename).suffix.lower() == ".xlsx":
+        import openpyxl
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            max_row = workbook.active.max_row
+            return max_row - 1 if max_row else None
+        finally:
+            workbook.close()
+    
+    lines = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            lines += chunk.count(b"\n")
+    return max(lines - 1, 0)
+
+def iter_import_batches(path: Path, filename: str, batch_size: int):
+    """Yield lists of row dicts from a CSV or XLSX file, batch_size rows at a time"""
+    if Path(filename).suffix.lower() == ".xlsx":
+        import openpyxl
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            headers = [normalize_import_header(h) for h in next(rows, [])]
+            batch = []
+            for values in rows:
+                if not any(v is not None for v in values):
+                    continue
+                batch.append({h: normalize_import_value(v) for h, v in zip(headers, values) if h})
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            workbook.close()
+        return
+    
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        headers = [normalize_import_header(h) for h in next(reader, [])]
+        batch = []
+        for values in reader:
+            if not any(v.strip() for v in values):
+                continue
+            batch.append({h: normalize_import_value(v) for h, v in zip(headers, values) if h})
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+def format_validation_error(error: ValidationError) -> str:
+    """Flatten a pydantic ValidationError into one line for the error report"""
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+async def create_import_job(job_type: str, file: UploadFile, current_user: User) -> tuple:
+    """Validate the upload, spool it to disk and register a queued import job"""
+    suffix = Path(file.filename or "").suffix.lower()
+    if suffix not in IMPORT_FILE_TYPES:
+        raise HTTPException(status_code=400, detail="File type not allowed. Only CSV and XLSX are supported")
+    
+    job = ImportJob(job_type=job_type, filename=file.filename, created_by=current_user.id)
+    path = IMPORT_UPLOAD_DIR / f"{job.id}{suffix}"
+    await stream_upload_to_file(file, path)
+    
+    job_dict = prepare_for_mongo(job.dict())
+    await db.import_jobs.insert_one(job_dict)
+    return job, path
+
+async def run_import_job(job: ImportJob, path: Path, process_batch, current_user: User):
+    """Drive an import: parse the file in batches off the event loop and hand each to process_batch
+
+    process_batch(rows, first_row_number, state, current_user) returns (inserted, errors)
+    where errors is a list of {"row", "errors"} dicts; state is shared across batches
+    for in-file duplicate detection.
+    """
+    started_at = datetime.now(timezone.utc)
+    processed = inserted = failed = 0
+    try:
+        total_rows = await asyncio.to_thread(estimate_import_rows, path, job.filename)
+        await db.import_jobs.update_one({"id": job.id}, {"$set": {
+            "status": "running",
+            "total_rows": total_rows,
+            "started_at": started_at.isoformat()
+        }})
+        
+        batches = iter_import_batches(path, job.filename, IMPORT_BATCH_SIZE)
+        state: Dict[str, Any] = {}
+        row_number = 2  # row 1 is the header
+        while True:
+            rows = await asyncio.to_thread(next, batches, None)
+            if rows is None:
+                break
+            
+            batch_inserted, errors = await process_batch(rows, row_number, state, current_user)
+            if errors:
+                await db.import_job_errors.insert_many(
+                    [{"job_id": job.id, **error} for error in errors], ordered=False
+                )
+            
+            row_number += len(rows)
+            processed += len(rows)
+            inserted += batch_inserted
+            failed += len(errors)
+            await db.import_jobs.update_one({"id": job.id}, {"$set": {
+                "processed_rows": processed,
+                "inserted_rows": inserted,
+                "failed_rows": failed
+            }})
+        
+        final_status = {"status": "completed"}
+    except Exception as e:
+        logger.error(f"Import job {job.id} failed: {e}")
+        final_status = {"status": "failed", "error": str(e)}
+    finally:
+        await asyncio.to_thread(path.unlink, True)
+    
+    finished_at = datetime.now(timezone.utc)
+    elapsed = (finished_at - started_at).total_seconds()
+    await db.import_jobs.update_one({"id": job.id}, {"$set": {
+        **final_status,
+        "finished_at": finished_at.isoformat(),
+        "rows_per_second": round(processed / elapsed, 1) if elapsed > 0 else None
+    }})
+    activity_status = "success" if final_status["status"] == "completed" else "fail"
+    await log_activity("sales", job.job_type, "import", activity_status, current_user.id, {
+        "job_id": job.id,
+        "inserted": inserted,
+        "failed": failed
+    })
+
+async def get_import_job_for_user(job_id: str, current_user: User) -> dict:
+    """Load an import job, applying the access check for its job type"""
+    job = await db.import_jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    menu = "Contacts" if job["job_type"] == "contacts" else "Companies"
+    await require_permission(current_user, "Sales", menu, "View")
+    return job
+
+@api_router.get("/import-jobs/{job_id}")
+async def get_import_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = await get_import_job_for_user(job_id, current_user)
+    return prepare_for_json(job)
+
+@api_router.get("/import-jobs/{job_id}/errors")
+async def export_import_job_errors(job_id: str, current_user: User = Depends(get_current_user)):
+    """Per-row error report for an import job as CSV"""
+    job = await get_import_job_for_user(job_id, current_user)
+    
+    errors = await db.import_job_errors.find({"job_id": job_id}).sort("row", 1).to_list(None)
+    
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["Row", "Errors"])
+    for error in errors:
+        writer.writerow([error["row"], error["errors"]])
+    
+    return {"data": output.getvalue(), "filename": f"{job['job_type']}_import_errors_{job_id}.csv"}
+
+# Contact import
+async def process_contact_import_batch(rows: List[dict], first_row: int, state: Dict[str, Any], current_user: User) -> tuple:
+    """Validate and insert one batch of contact rows with a fixed number of queries"""
+    seen_emails = state.setdefault("emails", set())
+    spoc_companies = state.setdefault("spoc_companies", set())
+    seen_names = state.setdefault("names", set())
+    
+    errors = []
+    valid = []
+    for offset, row in enumerate(rows):
+        try:
+            valid.append((first_row + offset, ContactCreate(**row)))
+        except ValidationError as e:
+            errors.append({"row": first_row + offset, "errors": format_validation_error(e)})
+    
+    if not valid:
+        return 0, errors
+    
+    company_ids = list({c.company_id for _, c in valid})
+    emails = list({c.email for _, c in valid})
+    first_names = list({c.first_name for _, c in valid})
+    
+    # One $in query per concern for the whole batch, run concurrently
+    companies, existing_emails, name_matches = await asyncio.gather(
+        db.companies.find(
+            {"id": {"$in": company_ids}, "$or": [{"is_active": True}, {"active_status": True}]},
+            {"_id": 0, "id": 1, "spoc_contact_id": 1}
+        ).to_list(None),
+        db.contacts.find(
+            {"email": {"$in": emails}, "is_deleted": {"$ne": True}},
+            {"_id": 0, "email": 1},
+            collation=CASE_INSENSITIVE
+        ).to_list(None),
+        db.contacts.find(
+            {"company_id": {"$in": company_ids}, "first_name": {"$in": first_names}, "is_deleted": {"$ne": True}},
+            {"_id": 0, "first_name": 1, "last_name": 1, "email": 1, "company_id": 1},
+            collation=CASE_INSENSITIVE
+        ).to_list(None)
+    )
+    
+    active_company_ids = {c["id"] for c in companies}
+    seen_emails.update(c["email"].lower() for c in existing_emails)
+    spoc_company_ids = {c.company_id for _, c in valid if c.spoc} - spoc_companies
+    for company in companies:
+        if company["id"] in spoc_company_ids and await find_company_spoc_id(company):
+            spoc_companies.add(company["id"])
+    candidates: Dict[tuple, List[dict]] = {}
+    for match in name_matches:
+        candidates.setdefault((match["company_id"], match["first_name"].lower()), []).append(match)
+    
+    now = datetime.now(timezone.utc)
+    documents = []
+    audit_entries = []
+    row_numbers = []
+    for row_number, contact in valid:
+        email_key = contact.email.lower()
+        name_key = (contact.company_id, contact.first_name.lower(), (contact.last_name or "").lower())
+        contact_data = contact.dict()
+        
+        if contact.company_id not in active_company_ids:
+            error = "Company not found or inactive"
+        elif email_key in seen_emails:
+            error = "Email already in use."
+        elif contact.spoc and contact.company_id in spoc_companies:
+            error = "Another contact is already SPOC for this company."
+        elif name_key in seen_names or any(
+            calculate_contact_similarity(contact_data, existing) >= 0.6
+            for existing in candidates.get((contact.company_id, contact.first_name.lower()), [])
+        ):
+            error = "Possible duplicate contact detected."
+        else:
+            error = None
+        
+        if error:
+            errors.append({"row": row_number, "errors": error})
+            continue
+        
+        seen_emails.add(email_key)
+        seen_names.add(name_key)
+        if contact.spoc:
+            spoc_companies.add(contact.company_id)
+        
+        contact_dict = {
+            **contact_data,
+            "id": str(uuid.uuid4()),
+            "created_by": current_user.id,
+            "created_at": now,
+            "updated_at": now,
+            "is_active": True,
+            "is_deleted": False,
+            "version": 1
+        }
+        documents.append(contact_dict)
+        row_numbers.append(row_number)
+        audit_entries.append(build_audit_entry(
+            current_user.id, "CREATE", "Contact", contact_dict["id"],
+            f"Imported contact: {contact_dict['first_name']} {contact_dict.get('last_name') or ''} ({contact_dict['email']})"
+        ))
+    
+    if not documents:
+        return 0, errors
+    
+    failed_indexes = set()
+    try:
+        await db.contacts.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            failed_indexes.add(write_error["index"])
+            errors.append({"row": row_numbers[write_error["index"]], "errors": write_error.get("errmsg", "Insert failed")})
+    
+    await apply_company_counter_changes([
+        (doc["id"], None, doc) for i, doc in enumerate(documents) if i not in failed_indexes
+    ])
+    await log_audit_trail_many([entry for i, entry in enumerate(audit_entries) if i not in failed_indexes])
+    return len(documents) - len(failed_indexes), errors
+
+@api_router.post("/contacts/import")
+async def import_contacts(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    """Start a bulk contact import from a CSV/XLSX file; poll /import-jobs/{id} for progress"""
+    job, path = await create_import_job("contacts", file, current_user)
+    start_background_task(run_import_job(job, path, process_contact_import_batch, current_user))
+    
+    return job.dict()
+
+# Company import
+# Row column -> (master data collection, parent reference on that collection, parent column on the row)
+# Parents come first so hierarchical names (sub-industry, state, city) resolve within their parent.
+COMPANY_IMPORT_REFERENCES = {
+    "company_type": ("company_types", None, None),
+    "account_type": ("account_types", None, None),
+    "region": ("regions", None, None),
+    "business_type": ("business_types", None, None),
+    "industry": ("industries", None, None),
+    "sub_industry": ("sub_industries", "industry_id", "industry"),
+    "country": ("countries", None, None),
+    "state": ("states", "country_id", "country"),
+    "city": ("cities", "state_id", "state"),
+}
+
+async def load_company_import_lookup() -> Dict[str, Any]:
+    """Load every referenced master data collection once into name -> id tables"""
+    fields = list(COMPANY_IMPORT_REFERENCES)
+    results = await asyncio.gather(*[
+        db[collection].find({"is_active": True}, {"_id": 0}).to_list(None)
+        for collection, _, _ in COMPANY_IMPORT_REFERENCES.values()
+    ])
+    
+    lookup = {"by_name": {}, "ids": {}, "industry_names": {}}
+    for field, docs in zip(fields, results):
+        _, parent_attr, _ = COMPANY_IMPORT_REFERENCES[field]
+        lookup["by_name"][field] = {
+            (doc.get(parent_attr) if parent_attr else None, doc["name"].strip().lower()): doc["id"] for doc in docs
+        }
+        lookup["ids"][field] = {doc["id"] for doc in docs}
+        if field == "industry":
+            lookup["industry_names"] = {doc["id"]: doc["name"] for doc in docs}
+    return lookup
+
+def resolve_company_import_row(row: dict, lookup: Dict[str, Any]) -> tuple:
+    """Replace master data names in a row with ids; returns (row, errors)"""
+    data = dict(row)
+    errors = []
+    for field, (_, _, parent_field) in COMPANY_IMPORT_REFERENCES.items():
+        id_field = f"{field}_id"
+        if data.get(id_field):
+            if data[id_field] not in lookup["ids"][field]:
+                errors.append(f"Unknown {field.replace('_', ' ')} id '{data[id_field]}'")
+            continue
+        
+        name = data.get(field)
+        if not name:
+            continue  # reported as missing by CompanyCreate validation
+        parent_id = data.get(f"{parent_field}_id") if parent_field else None
+        resolved = lookup["by_name"][field].get((parent_id, name.lower()))
+        if resolved:
+            data[id_field] = resolved
+        else:
+            errors.append(f"Unknown {field.replace('_', ' ')} '{name}'")
+    return data, errors
+
+def company_name_key(name: str) -> str:
+    """Normalized company name used for duplicate detection"""
+    return " ".join(name.lower().split())
+
+async def process_company_import_batch(rows: List[dict], first_row: int, state: Dict[str, Any], current_user: User) -> tuple:
+    """Resolve, validate, deduplicate, score and insert one batch of company rows"""
+    if "lookup" not in state:
+        state["lookup"] = await load_company_import_lookup()
+    lookup = state["lookup"]
+    seen_names = state.setdefault("names", set())
+    seen_gst = state.setdefault("gst_numbers", set())
+    seen_pan = state.setdefault("pan_numbers", set())
+    
+    errors = []
+    valid = []
+    for offset, row in enumerate(rows):
+        row_number = first_row + offset
+        data, reference_errors = resolve_company_import_row(row, lookup)
+        if reference_errors:
+            errors.append({"row": row_number, "errors": "; ".join(reference_errors)})
+            continue
+        try:
+            company = CompanyCreate(**data)
+        except ValidationError as e:
+            errors.append({"row": row_number, "errors": format_validation_error(e)})
+            continue
+        if company.domestic_international == "Domestic" and not company.gst_number and not company.pan_number:
+            errors.append({"row": row_number, "errors": "GST or PAN number is required for domestic companies"})
+            continue
+        valid.append((row_number, company))
+    
+    if not valid:
+        return 0, errors
+    
+    names = list({c.company_name for _, c in valid})
+    gst_numbers = list({c.gst_number.upper() for _, c in valid if c.gst_number})
+    pan_numbers = list({c.pan_number.upper() for _, c in valid if c.pan_number})
+    existing = await db.companies.find(
+        {"$or": [
+            {"name": {"$in": names}},
+            {"gst_number": {"$in": gst_numbers}},
+            {"pan_number": {"$in": pan_numbers}},
+        ]},
+        {"_id": 0, "name": 1, "gst_number": 1, "pan_number": 1},
+        collation=CASE_INSENSITIVE
+    ).to_list(None)
+    seen_names.update(company_name_key(c["name"]) for c in existing if c.get("name"))
+    seen_gst.update(c["gst_number"].upper() for c in existing if c.get("gst_number"))
+    seen_pan.update(c["pan_number"].upper() for c in existing if c.get("pan_number"))
+    
+    # Parents must already exist (earlier batches or rows count); resolve all paths in one query
+    parent_ids = list({c.parent_company_id for _, c in valid if c.parent_company_id})
+    parents = {
+        p["id"]: p for p in await db.companies.find(
+            {"id": {"$in": parent_ids}}, {"_id": 0, "id": 1, "ancestor_ids": 1}
+        ).to_list(None)
+    } if parent_ids else {}
+    
+    # Only rows that pass every check claim their name, GST and PAN for the rest of the file
+    accepted = []
+    for row_number, company in valid:
+        if company.parent_company_id and company.parent_company_id not in parents:
+            errors.append({"row": row_number, "errors": f"Unknown parent company id '{company.parent_company_id}'"})
+            continue
+        name_key = company_name_key(company.company_name)
+        gst_key = company.gst_number.upper() if company.gst_number else None
+        pan_key = company.pan_number.upper() if company.pan_number else None
+        if name_key in seen_names or (gst_key and gst_key in seen_gst) or (pan_key and pan_key in seen_pan):
+            errors.append({"row": row_number, "errors": "Company with this name, GST, or PAN already exists"})
+            continue
+        seen_names.add(name_key)
+        if gst_key:
+            seen_gst.add(gst_key)
+        if pan_key:
+            seen_pan.add(pan_key)
+        accepted.append((row_number, company))
+    
+    if not accepted:
+        return 0, errors
+    
+    scores = score_companies(
+        [lookup["industry_names"].get(c.industry_id) for _, c in accepted],
+        [c.sub_industry_id in lookup["ids"]["sub_industry"] for _, c in accepted],
+        [c.annual_revenue for _, c in accepted],
+        [c.employee_count for _, c in accepted],
+    )
+    
+    now = datetime.now(timezone.utc)
+    documents = []
+    audit_entries = []
+    for (_, company), score in zip(accepted, scores.tolist()):
+        ancestor_ids = company_path_below(parents.get(company.parent_company_id))
+        company_dict = {
+            **map_company_create(company),
+            "ancestor_ids": ancestor_ids,
+            "depth": len(ancestor_ids),
+            **EMPTY_COMPANY_COUNTERS,
+            "score": score,
+            "lead_status": "hot" if score >= 70 else "cold",
+            "is_active": True,
+            "version": 1,
+            "created_by": current_user.id,
+            "id": str(uuid.uuid4()),
+            "created_at": now,
+            "updated_at": now
+        }
+        documents.append(company_dict)
+        audit_entries.append(build_audit_entry(
+            current_user.id, "CREATE", "Company", company_dict["id"], f"Imported company: {company_dict['name']}"
+        ))
+    
+    failed_indexes = set()
+    try:
+        await db.companies.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            failed_indexes.add(write_error["index"])
+            errors.append({"row": accepted[write_error["index"]][0], "errors": write_error.get("errmsg", "Insert failed")})
+    
+    await apply_sales_rollup_changes([(None, doc) for i, doc in enumerate(documents) if i not in failed_indexes])
+    await log_audit_trail_many([entry for i, entry in enumerate(audit_entries) if i not in failed_indexes])
+    return len(documents) - len(failed_indexes), errors
+
+@api_router.post("/companies/import")
+async def import_companies(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    """Start a bulk company import from a CSV/XLSX file; poll /import-jobs/{id} for progress
+
+    Master data columns (industry, region, city, ...) take names; *_id columns are accepted too.
+    """
+    job, path = await create_import_job("companies", file, current_user)
+    start_background_task(run_import_job(job, path, process_company_import_batch, current_user))
+    
+    return job.dict()
+
 # Include router after all endpoints are defined
 app.include_router(api_router)
\ No newline at end of file
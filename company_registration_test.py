@@ -249,6 +249,107 @@ class CompanyRegistrationTester:
         else:
             return self.log_test("Company Creation", False, f"Status: {status}, Response: {response}")
 
+    def test_company_hierarchy(self):
+        """Test ancestor paths, subtree rollup and cycle rejection"""
+        print("\n🌳 Testing Company Hierarchy...")
+        
+        root_id = self.created_items.get('company_id')
+        base = self.create_test_company_data()
+        if not root_id or not base:
+            return self.log_test("Company Hierarchy", False, "No root company to build on")
+        
+        parent_id = root_id
+        chain = []
+        for level, suffix in enumerate(["CH", "GC"], start=1):
+            child = {**base,
+                     "company_name": f"{base['company_name']} {suffix}",
+                     "gst_number": f"{base['gst_number'][:-3]}{suffix}{level}",
+                     "pan_number": f"{base['pan_number'][:-3]}{suffix}{level}"[:10],
+                     "is_child": True,
+                     "parent_company_id": parent_id}
+            success, status, response = self.make_request('POST', 'companies', child)
+            if not success:
+                return self.log_test("Create Child Company", False, f"Status: {status}, Response: {response}")
+            chain.append(response['id'])
+            parent_id = response['id']
+        self.created_items['child_company_ids'] = chain
+        
+        success, status, tree = self.make_request('GET', f"companies/{root_id}/hierarchy")
+        subtree_ok = success and [c['id'] for c in tree['descendants']] == chain and \
+            tree['rollup']['employee_count'] == base['employee_count'] * 3
+        subtree_test = self.log_test("Subtree And Rollup", subtree_ok,
+                                     f"Descendants: {len(tree.get('descendants', []))}, Rollup: {tree.get('rollup')}")
+        
+        success, status, leaf = self.make_request('GET', f"companies/{chain[-1]}/hierarchy")
+        ancestors_ok = success and [c['id'] for c in leaf['ancestors']] == [root_id, chain[0]]
+        ancestors_test = self.log_test("Ancestor Chain", ancestors_ok, f"Depth: {leaf.get('company', {}).get('depth')}")
+        
+        # Making the root a child of its own grandchild must be rejected
+        success, status, root = self.make_request('GET', f"companies/{root_id}")
+        cyclic = {**base, "company_name": root.get('name'), "gst_number": root.get('gst_number'),
+                  "pan_number": root.get('pan_number'), "is_child": True, "parent_company_id": chain[-1]}
+        success, status, response = self.make_request('PUT', f"companies/{root_id}", cyclic, expected_status=400)
+        cycle_test = self.log_test("Cycle Rejected", success, f"Status: {status}")
+        
+        return subtree_test and ancestors_test and cycle_test
+
+    def test_company_overview(self):
+        """Test the single-request company overview"""
+        print("\n🗂️ Testing Company Overview...")
+        
+        company_id = self.created_items.get('company_id')
+        if not company_id:
+            return self.log_test("Company Overview", False, "No company created")
+        
+        success, status, overview = self.make_request('GET', f"companies/{company_id}/overview")
+        if not success:
+            return self.log_test("Company Overview", False, f"Status: {status}, Response: {overview}")
+        
+        names = overview.get('names', {})
+        names_test = self.log_test("Overview Resolves Names",
+                                   all(names.get(k) for k in ['industry', 'region', 'country', 'city']),
+                                   f"Industry: {names.get('industry')}, City: {names.get('city')}")
+        
+        child_ids = [c['id'] for c in overview.get('child_companies', [])]
+        expected_children = self.created_items.get('child_company_ids', [])[:1]
+        children_test = self.log_test("Overview Child Companies", child_ids == expected_children,
+                                      f"Children: {len(child_ids)}")
+        
+        activity_test = self.log_test("Overview Recent Activity",
+                                      any(e['action'] == 'create' for e in overview.get('recent_activity', [])),
+                                      f"Entries: {len(overview.get('recent_activity', []))}")
+        
+        return names_test and children_test and activity_test
+
+    def test_sales_dashboard(self):
+        """Test the pre-aggregated sales dashboard"""
+        print("\n📊 Testing Sales Dashboard...")
+        
+        success, status, dashboard = self.make_request('GET', 'dashboard/sales')
+        if not success:
+            return self.log_test("Sales Dashboard", False, f"Status: {status}")
+        
+        totals = dashboard['totals']
+        consistent = (
+            totals['hot'] + totals['cold'] == totals['company_count'] and
+            sum(r['company_count'] for r in dashboard['by_region']) == totals['company_count'] and
+            sum(totals['score_histogram'].values()) == totals['company_count']
+        )
+        consistency_test = self.log_test("Dashboard Totals Consistent", consistent and totals['company_count'] > 0,
+                                         f"Companies: {totals['company_count']}")
+        
+        names_test = self.log_test("Dashboard Resolves Names",
+                                   all(r['name'] for r in dashboard['by_industry'] if r['value'] != 'unknown'),
+                                   f"Industries: {len(dashboard['by_industry'])}")
+        
+        success, status, rebuilt = self.make_request('POST', 'dashboard/sales/rebuild')
+        success_after, _, after = self.make_request('GET', 'dashboard/sales')
+        rebuild_test = self.log_test("Rebuild Matches Incremental Rollups",
+                                     success and success_after and after['totals']['company_count'] == totals['company_count'],
+                                     f"Rollups: {rebuilt.get('rollups')}")
+        
+        return consistency_test and names_test and rebuild_test
+
     def test_company_validation(self):
         """Test company validation rules"""
         print("\n✅ Testing Company Validation...")
@@ -460,6 +561,9 @@ class CompanyRegistrationTester:
         test_results.append(("Master Data Relationships", self.test_master_data_relationships()))
         test_results.append(("Company RBAC", self.test_company_rbac()))
         test_results.append(("Company Creation", self.test_company_creation()))
+        test_results.append(("Company Hierarchy", self.test_company_hierarchy()))
+        test_results.append(("Company Overview", self.test_company_overview()))
+        test_results.append(("Sales Dashboard", self.test_sales_dashboard()))
         test_results.append(("Company Validation", self.test_company_validation()))
         test_results.append(("Company Scoring Algorithm", self.test_company_scoring_algorithm()))
         test_results.append(("Company Retrieval", self.test_company_retrieval()))
@@ -405,8 +405,46 @@ class ContactManagementTester:
                                                 f"Activated {response['updated_count']} contacts")
             else:
                 activate_success = self.log_test("Bulk Activate", False, f"Status: {status}")
-            
-            return create_success and deactivate_success and activate_success
+
+            # Test bulk decision maker toggle with an unknown id in the selection
+            bulk_dm_data = {
+                "contact_ids": created_contact_ids + ["missing-contact-id"],
+                "action": "set_decision_maker",
+                "value": True
+            }
+
+            success, status, response = self.make_request('POST', 'contacts/bulk', bulk_dm_data)
+            results = response.get('results', {}) if success else {}
+            dm_success = self.log_test("Bulk Set Decision Maker",
+                                       success and results.get("missing-contact-id") == "not_found" and
+                                       all(results.get(cid) in ("updated", "unchanged") for cid in created_contact_ids),
+                                       f"Summary: {response.get('summary')}")
+
+            # Two contacts of the same company cannot both become SPOC
+            bulk_spoc_data = {
+                "contact_ids": created_contact_ids,
+                "action": "set_spoc",
+                "value": True
+            }
+
+            success, status, response = self.make_request('POST', 'contacts/bulk', bulk_spoc_data)
+            results = response.get('results', {}) if success else {}
+            spoc_success = self.log_test("Bulk Set SPOC Conflict",
+                                         success and results.get(created_contact_ids[0]) in ("updated", "unchanged") and
+                                         results.get(created_contact_ids[1]) == "conflict",
+                                         f"Summary: {response.get('summary')}")
+
+            # Test bulk soft delete
+            bulk_delete_data = {
+                "contact_ids": created_contact_ids,
+                "action": "delete"
+            }
+
+            success, status, response = self.make_request('POST', 'contacts/bulk', bulk_delete_data)
+            delete_success = self.log_test("Bulk Delete", success and response.get('updated_count') == len(created_contact_ids),
+                                           f"Deleted {response.get('updated_count')} contacts")
+
+            return create_success and deactivate_success and activate_success and dm_success and spoc_success and delete_success
         else:
             return self.log_test("CREATE Bulk Test Contacts", False, 
                                f"Only created {len(created_contact_ids)} contacts")
@@ -470,10 +508,102 @@ class ContactManagementTester:
             else:
                 pagination_success = self.log_test("Pagination", False, f"Status: {status}")
             
-            return name_search_success and company_filter_success and decision_maker_filter_success and pagination_success
+            # Test reference expansion
+            success, status, response = self.make_request('GET', f'contacts?company_id={company_id}&expand=company,created_by')
+            contacts = response.get('contacts', []) if success else []
+            expand_success = self.log_test("Expand References",
+                                           len(contacts) > 0 and all(c.get('company_name') == self.companies[0]['name'] for c in contacts),
+                                           f"company_name: {contacts[0].get('company_name') if contacts else None}")
+            
+            success, status, response = self.make_request('GET', 'contacts?expand=bogus', expected_status=400)
+            bad_expand_success = self.log_test("Reject Unknown Expand", success, f"Status: {status}")
+            
+            return name_search_success and company_filter_success and decision_maker_filter_success and \
+                pagination_success and expand_success and bad_expand_success
         else:
             return self.log_test("CREATE Search Test Contact", False, f"Status: {status}")
 
+    def test_company_counters(self):
+        """Test denormalized contact counters on companies"""
+        print("\n🔢 Testing Company Contact Counters...")
+        
+        if not self.companies:
+            return self.log_test("Company Counters", False, "No companies available")
+        
+        all_passed = True
+        for company in self.companies:
+            success, status, listing = self.make_request('GET', f"contacts?company_id={company['id']}&limit=1000")
+            success_company, status_company, stored = self.make_request('GET', f"companies/{company['id']}")
+            if not (success and success_company):
+                all_passed = self.log_test("Company Counters", False, f"Status: {status}/{status_company}") and all_passed
+                continue
+            
+            contacts = listing['contacts']
+            spoc_ids = [c['id'] for c in contacts if c.get('spoc')]
+            expected = {
+                "contact_count": listing['total'],
+                "decision_maker_count": sum(1 for c in contacts if c.get('decision_maker')),
+                "spoc_contact_id": spoc_ids[0] if spoc_ids else None
+            }
+            actual = {k: stored.get(k) for k in expected}
+            all_passed = self.log_test(f"Counters for {company['name']}", actual == expected,
+                                       f"Expected: {expected}, Stored: {actual}") and all_passed
+        return all_passed
+
+    def test_optimistic_concurrency(self):
+        """Test version checks on contact updates (If-Match, expected_version, bulk)"""
+        print("\n🔒 Testing Optimistic Concurrency...")
+        
+        if not self.companies:
+            return self.log_test("Optimistic Concurrency", False, "No companies available")
+        
+        stamp = datetime.now().strftime('%H%M%S%f')
+        success, status, contact = self.make_request('POST', 'contacts', {
+            "company_id": self.companies[0]['id'],
+            "salutation": "Ms.",
+            "first_name": "Version",
+            "last_name": f"Check{stamp}",
+            "email": f"version.{stamp}@example.com",
+            "primary_phone": "+91-9876543210"
+        })
+        if not success:
+            return self.log_test("Create Versioned Contact", False, f"Status: {status}")
+        contact_id = contact['id']
+        
+        headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {self.token}'}
+        response = requests.get(f"{self.api_url}/contacts/{contact_id}", headers=headers, timeout=10)
+        etag = response.headers.get('ETag')
+        all_passed = self.log_test("GET Returns ETag", etag == '"1"', f"ETag: {etag}")
+        
+        response = requests.put(f"{self.api_url}/contacts/{contact_id}", json={"comments": "first edit"},
+                                headers={**headers, 'If-Match': etag}, timeout=10)
+        new_etag = response.headers.get('ETag')
+        all_passed = self.log_test("Conditional Update Applies", response.status_code == 200 and new_etag == '"2"',
+                                   f"Status: {response.status_code}, ETag: {new_etag}") and all_passed
+        
+        # A second writer still holding the old ETag must not overwrite the first edit
+        response = requests.put(f"{self.api_url}/contacts/{contact_id}", json={"comments": "stale edit"},
+                                headers={**headers, 'If-Match': etag}, timeout=10)
+        all_passed = self.log_test("Stale If-Match Rejected", response.status_code == 412,
+                                   f"Status: {response.status_code}") and all_passed
+        
+        success, status, response = self.make_request('PUT', f'contacts/{contact_id}?expected_version=1',
+                                                      {"comments": "stale edit"}, expected_status=412)
+        all_passed = self.log_test("Stale expected_version Rejected", success, f"Status: {status}") and all_passed
+        
+        success, status, response = self.make_request('POST', 'contacts/bulk', {
+            "contact_ids": [contact_id],
+            "action": "set_decision_maker",
+            "value": True,
+            "expected_versions": {contact_id: 1}
+        })
+        outcome = response.get('results', {}).get(contact_id)
+        all_passed = self.log_test("Bulk Reports Version Conflict", success and outcome == "version_conflict",
+                                   f"Outcome: {outcome}") and all_passed
+        
+        self.make_request('DELETE', f'contacts/{contact_id}')
+        return all_passed
+
     def test_export_functionality(self):
         """Test Export Functionality"""
         print("\n📤 Testing Export Functionality...")
@@ -565,6 +695,8 @@ class ContactManagementTester:
         test_results.append(("SPOC Management", self.test_spoc_management()))
         test_results.append(("Bulk Operations", self.test_bulk_operations()))
         test_results.append(("Search and Filtering", self.test_search_and_filtering()))
+        test_results.append(("Company Counters", self.test_company_counters()))
+        test_results.append(("Optimistic Concurrency", self.test_optimistic_concurrency()))
         test_results.append(("Export Functionality", self.test_export_functionality()))
         test_results.append(("Real-world Scenarios", self.test_real_world_scenarios()))
         
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+import requests
+import sys
+import json
+import hashlib
+from datetime import datetime
+
+class DocumentStoreTester:
+    def __init__(self, base_url="https://swayatta-admin.preview.emergentagent.com"):
+        self.base_url = base_url
+        self.api_url = f"{base_url}/api"
+        self.token = None
+        self.tests_run = 0
+        self.tests_passed = 0
+        self.sha256 = None
+        self.payload = f"%PDF-1.4\ndocument store test {datetime.now().isoformat()}\n".encode() * 1024
+
+    def log_test(self, name, success, details=""):
+        """Log test results"""
+        self.tests_run += 1
+        if success:
+            self.tests_passed += 1
+            print(f"✅ {name} - PASSED {details}")
+        else:
+            print(f"❌ {name} - FAILED {details}")
+        return success
+
+    def make_request(self, method, endpoint, data=None, expected_status=200):
+        """Make HTTP request with proper headers"""
+        url = f"{self.api_url}/{endpoint}"
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+
+        try:
+            if method == 'GET':
+                response = requests.get(url, headers=headers, timeout=10)
+            elif method == 'POST':
+                response = requests.post(url, json=data, headers=headers, timeout=10)
+
+            success = response.status_code == expected_status
+            return success, response.status_code, response.json() if response.content else {}
+
+        except requests.exceptions.RequestException as e:
+            return False, 0, {"error": str(e)}
+        except json.JSONDecodeError:
+            return False, response.status_code, {"error": "Invalid JSON response"}
+
+    def upload(self, filename):
+        """Upload the test payload and return the document metadata"""
+        response = requests.post(
+            f"{self.api_url}/companies/upload-document",
+            files={"file": (filename, self.payload, "application/pdf")},
+            headers={'Authorization': f'Bearer {self.token}'},
+            timeout=30
+        )
+        return response.status_code, response.json() if response.content else {}
+
+    def test_login(self):
+        """Test login functionality"""
+        print("\n🔐 Testing Authentication...")
+
+        success, status, response = self.make_request(
+            'POST', 'auth/login',
+            {"username": "admin", "password": "admin123"}
+        )
+
+        if success and 'access_token' in response:
+            self.token = response['access_token']
+            return self.log_test("Admin Login", True, f"Token received")
+        else:
+            return self.log_test("Admin Login", False, f"Status: {status}, Response: {response}")
+
+    def test_dedupe(self):
+        """Uploading the same content twice stores it once"""
+        print("\n📎 Testing Upload Deduplication...")
+
+        success, status, before = self.make_request('GET', 'documents/usage')
+        if not success:
+            return self.log_test("Document Usage", False, f"Status: {status}")
+
+        first_status, first = self.upload("first.pdf")
+        second_status, second = self.upload("second.pdf")
+        expected_hash = hashlib.sha256(self.payload).hexdigest()
+
+        same_blob = (first_status == 200 and second_status == 200 and
+                     first.get('sha256') == second.get('sha256') == expected_hash and
+                     first.get('file_path') == second.get('file_path'))
+        self.log_test("Same Content Same Blob", same_blob, f"Hash: {first.get('sha256')}")
+
+        success, status, after = self.make_request('GET', 'documents/usage')
+        one_blob = success and after['blob_count'] == before['blob_count'] + 1
+        self.log_test("Stored Once", one_blob,
+                      f"Blobs: {before['blob_count']} -> {after.get('blob_count')}")
+        unreferenced = success and after['unreferenced_count'] >= 1
+        self.log_test("Unattached Upload Unreferenced", unreferenced,
+                      f"Unreferenced: {after.get('unreferenced_count')}")
+        self.sha256 = first.get('sha256')
+        return same_blob and one_blob and unreferenced
+
+    def test_download(self):
+        """Full, ranged and conditional downloads"""
+        print("\n📥 Testing Document Download...")
+
+        url = f"{self.api_url}/documents/{self.sha256}"
+        auth = {'Authorization': f'Bearer {self.token}'}
+        etag = f'"{self.sha256}"'
+
+        cached = requests.get(url, headers={**auth, 'If-None-Match': etag}, timeout=30, allow_redirects=False)
+        self.log_test("Conditional Request", cached.status_code == 304, f"Status: {cached.status_code}")
+
+        first = requests.get(url, headers=auth, timeout=30, allow_redirects=False)
+        if first.status_code == 307:
+            # S3 backend: bytes come straight from the bucket via a presigned URL
+            url, auth = first.headers['Location'], {}
+            self.log_test("Presigned Redirect", first.headers.get('Cache-Control') == "private, no-store",
+                          f"Location: {url.split('?')[0]}")
+
+        full = requests.get(url, headers=auth, timeout=30)
+        full_ok = (full.status_code == 200 and full.content == self.payload and
+                   'immutable' in full.headers.get('Cache-Control', ''))
+        self.log_test("Full Download", full_ok, f"Status: {full.status_code}, ETag: {full.headers.get('ETag')}")
+
+        partial = requests.get(url, headers={**auth, 'Range': 'bytes=10-99'}, timeout=30)
+        partial_ok = (partial.status_code == 206 and partial.content == self.payload[10:100] and
+                      partial.headers.get('Content-Range') == f"bytes 10-99/{len(self.payload)}")
+        self.log_test("Range Request", partial_ok, f"Status: {partial.status_code}")
+
+        stale = requests.get(url, headers={**auth, 'Range': 'bytes=0-9', 'If-Range': '"stale"'}, timeout=30)
+        self.log_test("If-Range Mismatch Sends Full File", stale.status_code == 200, f"Status: {stale.status_code}")
+
+        unsatisfiable = requests.get(url, headers={**auth, 'Range': f'bytes={len(self.payload)}-'}, timeout=30)
+        self.log_test("Unsatisfiable Range", unsatisfiable.status_code == 416, f"Status: {unsatisfiable.status_code}")
+
+        return cached.status_code == 304 and full_ok and partial_ok and \
+            stale.status_code == 200 and unsatisfiable.status_code == 416
+
+    def run_document_store_tests(self):
+        """Run all Document Store tests"""
+        print("🚀 Starting Document Store API Tests")
+        print("=" * 60)
+
+        if not self.test_login():
+            print("\n❌ Authentication failed. Cannot proceed with other tests.")
+            return False
+
+        test_results = []
+        test_results.append(("Deduplication", self.test_dedupe()))
+        test_results.append(("Download", self.test_download()))
+
+        print("\n" + "=" * 60)
+        print(f"📊 DOCUMENT STORE TEST SUMMARY")
+        print(f"Tests Run: {self.tests_run}")
+        print(f"Tests Passed: {self.tests_passed}")
+        print(f"Tests Failed: {self.tests_run - self.tests_passed}")
+        print(f"Success Rate: {(self.tests_passed/self.tests_run)*100:.1f}%")
+
+        print(f"\n📋 DOCUMENT STORE TEST RESULTS:")
+        for test_name, result in test_results:
+            status = "✅ PASSED" if result else "❌ FAILED"
+            print(f"   {test_name}: {status}")
+
+        return self.tests_passed == self.tests_run
+
+def main():
+    tester = DocumentStoreTester()
+    success = tester.run_document_store_tests()
+    return 0 if success else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
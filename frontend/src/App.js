@@ -57,6 +57,50 @@ import {
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Access tokens are short-lived. On a 401, renew them once with the refresh token and retry;
+// concurrent failures share one refresh, since each refresh token can only be used once.
+const storeTokens = ({ access_token, refresh_token }) => {
+  localStorage.setItem('token', access_token);
+  localStorage.setItem('refreshToken', refresh_token);
+  axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
+};
+
+const clearTokens = () => {
+  localStorage.removeItem('token');
+  localStorage.removeItem('refreshToken');
+  delete axios.defaults.headers.common['Authorization'];
+};
+
+let refreshing = null;
+
+const refreshTokens = () => {
+  if (!refreshing) {
+    const refresh_token = localStorage.getItem('refreshToken');
+    refreshing = (refresh_token
+      ? axios.post(`${API}/auth/refresh`, { refresh_token }, { skipAuthRefresh: true })
+          .then((response) => storeTokens(response.data))
+      : Promise.reject(new Error('No refresh token'))
+    ).finally(() => { refreshing = null; });
+  }
+  return refreshing;
+};
+
+axios.interceptors.response.use(undefined, async (error) => {
+  const { config, response } = error;
+  if (response?.status !== 401 || !config || config.skipAuthRefresh || config.retriedAfterRefresh) {
+    throw error;
+  }
+  try {
+    await refreshTokens();
+  } catch (refreshError) {
+    clearTokens();
+    throw error;
+  }
+  config.retriedAfterRefresh = true;
+  config.headers.Authorization = axios.defaults.headers.common['Authorization'];
+  return axios(config);
+});
+
 // Auth Context
 const AuthContext = createContext();
 
@@ -87,8 +131,7 @@ const AuthProvider = ({ children }) => {
       const response = await axios.get(`${API}/auth/me`);
       setUser(response.data);
     } catch (error) {
-      localStorage.removeItem('token');
-      delete axios.defaults.headers.common['Authorization'];
+      clearTokens();
     } finally {
       setLoading(false);
     }
@@ -111,10 +154,9 @@ const AuthProvider = ({ children }) => {
       }
       
       const data = await response.json();
-      const { access_token, user: userData } = data;
+      const { user: userData } = data;
       
-      localStorage.setItem('token', access_token);
-      axios.defaults.headers.common['Authorization'] = `Bearer ${access_token}`;
+      storeTokens(data);
       setUser(userData);
       
       toast.success('Login successful!');
@@ -131,8 +173,7 @@ const AuthProvider = ({ children }) => {
     } catch (error) {
       console.error('Logout error:', error);
     } finally {
-      localStorage.removeItem('token');
-      delete axios.defaults.headers.common['Authorization'];
+      clearTokens();
       setUser(null);
       toast.success('Logged out successfully');
     }
@@ -6,6 +6,10 @@ const API = `${BACKEND_URL}/api`;
 
 const PermissionContext = createContext();
 
+// Answers from POST /auth/permissions/check, keyed by the checks asked. Revalidated with the
+// stored ETag, so a repeat costs a 304 until the role's permissions change.
+const permissionCheckCache = new Map();
+
 export const usePermissions = () => {
   const context = useContext(PermissionContext);
   if (!context) {
@@ -86,6 +90,21 @@ export const PermissionProvider = ({ children }) => {
     );
   };
 
+  // checks: [{ path, permission }] or [{ module, menu, permission }]; resolves to booleans in order
+  const checkPermissions = async (checks) => {
+    const key = JSON.stringify(checks);
+    const cached = permissionCheckCache.get(key);
+    const response = await axios.post(`${API}/auth/permissions/check`, { checks }, {
+      headers: cached ? { 'If-None-Match': cached.etag } : {},
+      validateStatus: (status) => status === 200 || status === 304
+    });
+    if (response.status === 304 && cached) {
+      return cached.results;
+    }
+    permissionCheckCache.set(key, { etag: response.headers.etag, results: response.data.results });
+    return response.data.results;
+  };
+
   const canView = (path) => hasPermission(path, 'View');
   const canAdd = (path) => hasPermission(path, 'Add');
   const canEdit = (path) => hasPermission(path, 'Edit');
@@ -97,6 +116,7 @@ export const PermissionProvider = ({ children }) => {
     loading,
     hasPermission,
     hasModulePermission,
+    checkPermissions,
     canView,
     canAdd,
     canEdit,
@@ -303,6 +303,43 @@ class RBACSystemTester:
         else:
             self.log_test("Create Role-Permission Mapping", False, f"Status: {status}, Response: {response}")
 
+    def test_startup_seeding(self):
+        """Test that seeding is idempotent across workers and cold start is reported"""
+        print("\n🚦 Testing Startup Seeding...")
+        
+        # Seeding is keyed by natural keys, so concurrent workers must not leave duplicates
+        for endpoint, key in [('permissions', 'name'), ('modules', 'name'), ('roles', 'name')]:
+            success, status, items = self.make_request('GET', endpoint)
+            if success:
+                names = [item[key] for item in items]
+                duplicates = sorted({n for n in names if names.count(n) > 1})
+                self.log_test(f"No Duplicate Seeded {endpoint.title()}", not duplicates, f"Duplicates: {duplicates}")
+            else:
+                self.log_test(f"No Duplicate Seeded {endpoint.title()}", False, f"Status: {status}")
+        
+        success, status, metrics = self.make_request('GET', 'system/startup-metrics')
+        if success:
+            reported = metrics.get('startup_ms') is not None and metrics.get('first_request_ms') is not None
+            self.log_test("Cold Start Metrics Reported", reported,
+                         f"Startup: {metrics.get('startup_ms')}ms, first request: {metrics.get('first_request_ms')}ms, "
+                         f"seed wait: {metrics.get('seed_wait_ms')}ms, phases: {metrics.get('phases_ms')}")
+        else:
+            self.log_test("Cold Start Metrics Reported", False, f"Status: {status}")
+
+    def test_db_metrics(self):
+        """Test that pool settings and query budgets are reported"""
+        print("\n🗄️ Testing Database Metrics...")
+        
+        success, status, metrics = self.make_request('GET', 'system/db-metrics')
+        if not success:
+            self.log_test("Database Metrics Reported", False, f"Status: {status}")
+            return
+        
+        budgets = {name: c.get('budget_ms') for name, c in metrics.get('route_classes', {}).items()}
+        self.log_test("Database Metrics Reported", 'pool' in metrics and 'timeouts' in metrics,
+                     f"Pool: {metrics.get('pool')}, in use: {metrics.get('checked_out')}, peak: {metrics.get('peak_checked_out')}")
+        self.log_test("Search Routes Have A Query Budget", bool(budgets.get('search')), f"Budgets: {budgets}")
+
     def test_admin_user_setup(self):
         """Test that admin user is properly set up with Super Admin role"""
         print("\n👤 Testing Admin User Setup...")
@@ -339,7 +376,9 @@ class RBACSystemTester:
             ("Permission Enforcement", self.test_permission_enforcement),
             ("RBAC CRUD Operations", self.test_rbac_crud_operations),
             ("Role-Permission Mappings", self.test_role_permission_mappings),
-            ("Admin User Setup", self.test_admin_user_setup)
+            ("Admin User Setup", self.test_admin_user_setup),
+            ("Startup Seeding", self.test_startup_seeding),
+            ("Database Metrics", self.test_db_metrics)
         ]
         
         test_results = []
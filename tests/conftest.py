@@ -0,0 +1,94 @@
+"""Shared stand-ins for the tests: the backend imported without a MongoDB server, and a
+recording replacement for the Motor database."""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "backend_test")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+import server  # noqa: E402
+
+
+class RecordingCursor:
+    def __init__(self, documents=None):
+        self.documents = documents or []
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def skip(self, *args):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    async def to_list(self, length=None):
+        return [dict(d) for d in self.documents]
+
+    async def __aiter__(self):
+        for document in self.documents:
+            yield dict(document)
+
+
+class RecordingCollection:
+    """Records every call; find_one_and_update returns the stored document"""
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+
+    def find(self, *args, **kwargs):
+        self.database.calls.append((self.name, "find"))
+        return RecordingCursor(self.database.find_results.get(self.name))
+
+    def aggregate(self, *args, **kwargs):
+        self.database.calls.append((self.name, "aggregate"))
+        return RecordingCursor()
+
+    def __getattr__(self, method):
+        async def call(*args, **kwargs):
+            self.database.calls.append((self.name, method))
+            if method == "find_one":
+                return dict(self.database.find_one_results.get(self.name) or {}) or None
+            if method == "find_one_and_update":
+                self.database.updates.append(args[1])
+                return dict(self.database.documents.get(self.name) or {}) or None
+            return None
+        return call
+
+
+class RecordingDatabase:
+    def __init__(self, documents=None, find_one_results=None, find_results=None):
+        self.documents = documents or {}
+        self.find_one_results = find_one_results or {}
+        self.find_results = find_results or {}
+        self.calls = []
+        self.updates = []
+
+    def __getattr__(self, name):
+        return RecordingCollection(self, name)
+
+    def __getitem__(self, name):
+        return RecordingCollection(self, name)
+
+    def calls_on(self, collection):
+        return [method for name, method in self.calls if name == collection]
+
+
+async def allow(*args, **kwargs):
+    return True
+
+
+@pytest.fixture
+def recording_db(monkeypatch):
+    def install(**kwargs):
+        database = RecordingDatabase(**kwargs)
+        monkeypatch.setattr(server, "db", database)
+        monkeypatch.setattr(server, "check_permission", allow)
+        return database
+    return install
@@ -0,0 +1,130 @@
+"""Old activity logs move to gzipped NDJSON day partitions and stay searchable from there.
+
+The hot collection is a small in-memory stand-in that honours the created_at range, equality
+filters, sort and limit the archiver and search use.
+"""
+
+import asyncio
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+NOW = datetime.utcnow().replace(microsecond=0)
+
+
+class LogCursor:
+    def __init__(self, logs):
+        self.logs = logs
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.logs.sort(key=lambda log: log[field], reverse=direction == server.DESCENDING)
+        return self
+
+    def limit(self, count):
+        self.logs = self.logs[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return [dict(log) for log in self.logs]
+
+
+class LogCollection:
+    def __init__(self, logs):
+        self.logs = logs
+        self.deleted = []
+
+    def find(self, query):
+        created_at = query.get("created_at", {})
+
+        def matches(log):
+            if "$gte" in created_at and log["created_at"] < server.to_naive_utc(created_at["$gte"]):
+                return False
+            if "$lt" in created_at and log["created_at"] >= server.to_naive_utc(created_at["$lt"]):
+                return False
+            return all(log.get(field) == value for field, value in query.items()
+                       if field not in ("created_at", "$or"))
+        return LogCursor([log for log in self.logs if matches(log)])
+
+    async def delete_many(self, query):
+        ids = set(query["_id"]["$in"])
+        self.deleted.append(len(ids))
+        self.logs[:] = [log for log in self.logs if log["_id"] not in ids]
+
+
+class LogDatabase:
+    def __init__(self, logs):
+        self.activity_logs = LogCollection(logs)
+
+
+def log(index, days_ago, action="login"):
+    return {"_id": index, "id": f"log-{index}", "module_name": "auth", "table_name": "users",
+            "action": action, "status": "success", "user_id": "user-1",
+            "created_at": NOW - timedelta(days=days_ago, minutes=index)}
+
+
+@pytest.fixture
+def archive(monkeypatch, tmp_path):
+    logs = [log(1, 40), log(2, 40, "logout"), log(3, 41), log(4, 41), log(5, 41, "logout"), log(6, 1)]
+    database = LogDatabase(logs)
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "read_db", lambda: database)
+    monkeypatch.setattr(server, "ACTIVITY_LOG_ARCHIVE_DIR", tmp_path)
+    monkeypatch.setattr(server, "ACTIVITY_LOG_ARCHIVE_BATCH_SIZE", 2)
+    monkeypatch.setattr(server, "ACTIVITY_LOG_ARCHIVE_AFTER_DAYS", 30)
+    return database.activity_logs, tmp_path
+
+
+def search(**filters):
+    return asyncio.run(server.search_activity_logs(**{
+        "user_id": None, "module": None, "action": None, "status": None, "start": None, "end": None,
+        "cursor": None, "limit": 50, "current_user": None, **filters
+    }))
+
+
+def test_old_logs_are_copied_to_day_partitions_then_deleted(archive):
+    collection, archive_dir = archive
+    assert asyncio.run(server.archive_activity_logs()) == 5
+
+    # Copied in batches of ARCHIVE_BATCH_SIZE; only the recent entry stays in Mongo
+    assert collection.deleted == [2, 2, 1]
+    assert [entry["id"] for entry in collection.logs] == ["log-6"]
+
+    manifest = json.loads((archive_dir / "manifest.json").read_text())
+    assert sum(part["count"] for parts in manifest["partitions"].values() for part in parts.values()) == 5
+    for day, parts in manifest["partitions"].items():
+        for relative_path, part in parts.items():
+            assert relative_path.startswith(day.replace("-", "/") + "/part-")
+            with gzip.open(archive_dir / relative_path, "rt", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            assert len(records) == part["count"]
+            assert all(record["created_at"].startswith(day) and "_id" not in record for record in records)
+
+
+def test_archiving_again_finds_nothing_to_move(archive):
+    asyncio.run(server.archive_activity_logs())
+    assert asyncio.run(server.archive_activity_logs()) == 0
+
+
+def test_search_falls_back_to_archived_partitions(archive):
+    asyncio.run(server.archive_activity_logs())
+
+    page = search(start=NOW - timedelta(days=50))
+    assert [entry.id for entry in page.logs] == ["log-6", "log-1", "log-2", "log-3", "log-4", "log-5"]
+
+    page = search(start=NOW - timedelta(days=50), action="logout")
+    assert [entry.id for entry in page.logs] == ["log-2", "log-5"]
+
+
+def test_archived_results_page_with_cursors(archive):
+    asyncio.run(server.archive_activity_logs())
+
+    first = search(start=NOW - timedelta(days=50), end=NOW - timedelta(days=30), limit=3)
+    assert [entry.id for entry in first.logs] == ["log-1", "log-2", "log-3"]
+    second = search(start=NOW - timedelta(days=50), end=NOW - timedelta(days=30), limit=3, cursor=first.next_cursor)
+    assert [entry.id for entry in second.logs] == ["log-4", "log-5"]
+    assert second.next_cursor is None
@@ -0,0 +1,69 @@
+"""Contact counter changes only increment companies whose counters already exist, once per change."""
+
+import asyncio
+
+import pytest
+
+import server
+
+ADMIN = server.User(id="admin", username="admin", email="admin@example.com", password_hash="x")
+
+
+class BulkWriteRecorder:
+    def __init__(self):
+        self.operations = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+
+class CounterDatabase:
+    def __init__(self):
+        self.companies = BulkWriteRecorder()
+
+
+def apply(monkeypatch, changes):
+    database = CounterDatabase()
+    monkeypatch.setattr(server, "db", database)
+    asyncio.run(server.apply_company_counter_changes(changes))
+    return [(op._filter, op._doc) for op in database.companies.operations]
+
+
+def test_increment_requires_existing_counters(monkeypatch):
+    contact = {"id": "c-1", "company_id": "co-1", "decision_maker": True}
+    operations = apply(monkeypatch, [("c-1", None, contact)])
+
+    assert operations == [(
+        {"id": "co-1", "contact_count": {"$exists": True}},
+        {"$inc": {"contact_count": 1, "decision_maker_count": 1}},
+    )]
+
+
+def test_spoc_pointer_is_set_without_the_counter_guard(monkeypatch):
+    contact = {"id": "c-1", "company_id": "co-1", "spoc": True}
+    operations = apply(monkeypatch, [("c-1", None, contact)])
+
+    assert ({"id": "co-1"}, {"$set": {"spoc_contact_id": "c-1"}}) in operations
+    assert all("$set" not in update for query, update in operations if "contact_count" in query)
+
+
+def test_moving_a_contact_decrements_the_old_company(monkeypatch):
+    before = {"id": "c-1", "company_id": "co-1"}
+    after = {"id": "c-1", "company_id": "co-2"}
+    operations = dict((query["id"], update) for query, update in apply(monkeypatch, [("c-1", before, after)]))
+
+    assert operations == {"co-1": {"$inc": {"contact_count": -1}}, "co-2": {"$inc": {"contact_count": 1}}}
+
+
+def test_deleting_a_contact_moves_the_counters_once(recording_db):
+    contact = {"id": "c-1", "company_id": "co-1", "first_name": "Asha", "email": "asha@example.com"}
+    database = recording_db(documents={"contacts": contact})
+    asyncio.run(server.delete_contact("c-1", ADMIN))
+    assert database.calls_on("contacts") == ["find_one_and_update"]
+    assert database.calls_on("companies") == ["bulk_write"]
+
+    database = recording_db()
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(server.delete_contact("c-1", ADMIN))
+    assert error.value.status_code == 404
+    assert not database.calls_on("companies")
@@ -0,0 +1,32 @@
+"""Deleting a company claims it in one conditional write; only that write moves the sales rollups."""
+
+import asyncio
+
+import pytest
+
+import server
+
+ADMIN = server.User(id="admin", username="admin", email="admin@example.com", password_hash="x")
+COMPANY = {"id": "co-1", "name": "Acme", "is_active": True, "lead_status": "hot", "score": 72,
+           "annual_revenue": 1000000, "revenue_currency": "INR", "employee_count": 40}
+
+
+def delete():
+    return asyncio.run(server.delete_company("co-1", ADMIN))
+
+
+def test_delete_is_conditional_on_the_company_being_active(recording_db):
+    database = recording_db(documents={"companies": COMPANY})
+    delete()
+
+    assert database.calls_on("companies") == ["find_one_and_update"]
+    assert database.updates[0]["$set"]["is_active"] is False
+    assert database.calls_on("sales_rollups") == ["bulk_write"]
+
+
+def test_repeated_delete_leaves_the_rollups_alone(recording_db):
+    database = recording_db()
+    with pytest.raises(server.HTTPException) as error:
+        delete()
+    assert error.value.status_code == 404
+    assert not database.calls_on("sales_rollups")
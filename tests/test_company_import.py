@@ -0,0 +1,44 @@
+"""A company import row only claims its name, GST and PAN once it passes every check."""
+
+import asyncio
+
+import pytest
+
+import server
+
+ADMIN = server.User(id="admin", username="admin", email="admin@example.com", password_hash="x")
+ROW = {
+    "company_name": "Acme Industries", "domestic_international": "Domestic", "gst_number": "27ABCDE1234F1Z5",
+    "pan_number": "ABCDE1234F", "company_type_id": "ct-1", "account_type_id": "at-1", "region_id": "rg-1",
+    "business_type_id": "bt-1", "industry_id": "in-1", "sub_industry_id": "si-1", "employee_count": 40,
+    "address": "12 Industrial Estate, Pune", "country_id": "c-1", "state_id": "s-1", "city_id": "ci-1",
+    "annual_revenue": 1000000, "revenue_currency": "INR",
+}
+
+
+@pytest.fixture
+def import_batch(recording_db, monkeypatch):
+    database = recording_db()
+    monkeypatch.setattr(server, "resolve_company_import_row", lambda row, lookup: (row, []))
+    state = {"lookup": {"industry_names": {}, "ids": {"sub_industry": set()}}}
+
+    def run(rows):
+        return asyncio.run(server.process_company_import_batch(rows, 2, state, ADMIN))
+    return database, run
+
+
+def test_row_with_unknown_parent_does_not_block_a_later_duplicate(import_batch):
+    database, run = import_batch
+    inserted, errors = run([{**ROW, "parent_company_id": "missing"}, ROW])
+
+    assert inserted == 1
+    assert errors == [{"row": 2, "errors": "Unknown parent company id 'missing'"}]
+    assert database.calls_on("companies").count("insert_many") == 1
+
+
+def test_duplicate_of_an_accepted_row_is_rejected(import_batch):
+    _, run = import_batch
+    inserted, errors = run([ROW, {**ROW, "gst_number": None}])
+
+    assert inserted == 1
+    assert errors == [{"row": 3, "errors": "Company with this name, GST, or PAN already exists"}]
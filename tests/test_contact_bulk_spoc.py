@@ -0,0 +1,135 @@
+"""Bulk set_spoc only displaces a company's SPOC once the new SPOC's own write went through.
+
+The contacts collection is a small in-memory stand-in that honours the id, company, spoc,
+is_deleted and version filters the bulk update uses, and applies $set/$inc writes.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import server
+
+ADMIN = server.User(id="admin", username="admin", email="admin@example.com", password_hash="x")
+
+
+def matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$ne" in condition and value == condition["$ne"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class ContactCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return [dict(doc) for doc in self.docs]
+
+
+class ContactCollection:
+    def __init__(self, docs, deleted_after_read=()):
+        self.docs = docs
+        self.deleted_after_read = deleted_after_read
+        self.update_many_calls = []
+
+    def find(self, query, projection=None):
+        return ContactCursor([doc for doc in self.docs if matches(doc, query)])
+
+    def apply(self, query, update, many):
+        matched = 0
+        for doc in self.docs:
+            if matches(doc, query):
+                doc.update(update.get("$set", {}))
+                for field, delta in update.get("$inc", {}).items():
+                    doc[field] = doc.get(field, 0) + delta
+                matched += 1
+                if not many:
+                    break
+        return matched
+
+    async def bulk_write(self, operations, ordered=True):
+        # Contacts deleted by someone else between the read and the write
+        for doc in self.docs:
+            if doc["id"] in self.deleted_after_read:
+                doc["is_deleted"] = True
+        self.deleted_after_read = ()
+        matched = sum(self.apply(op._filter, op._doc, isinstance(op, server.UpdateMany)) for op in operations)
+        return SimpleNamespace(matched_count=matched)
+
+    async def update_many(self, query, update):
+        self.update_many_calls.append(query)
+        self.apply(query, update, many=True)
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, method):
+        async def call(*args, **kwargs):
+            self.calls.append(args)
+        return call
+
+
+class ContactDatabase:
+    def __init__(self, contacts):
+        self.contacts = contacts
+        self.companies = Recorder()
+        self.activity_logs = Recorder()
+
+
+def spoc_store(monkeypatch, deleted_after_read=()):
+    contacts = ContactCollection([
+        {"id": "S", "company_id": "co-1", "spoc": True, "version": 1},
+        {"id": "A", "company_id": "co-1", "spoc": False, "version": 2},
+    ], deleted_after_read)
+    database = ContactDatabase(contacts)
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def set_spoc(expected_version):
+    return asyncio.run(server.bulk_update_contacts(
+        server.ContactBulkUpdate(contact_ids=["A"], action="set_spoc", value=True,
+                                 expected_versions={"A": expected_version}),
+        ADMIN
+    ))
+
+
+def spocs(database):
+    return [doc["id"] for doc in database.contacts.docs if doc["spoc"]]
+
+
+def test_stale_version_keeps_the_current_spoc(monkeypatch):
+    database = spoc_store(monkeypatch)
+    response = set_spoc(1)
+
+    assert response["results"] == {"A": "version_conflict"}
+    assert spocs(database) == ["S"]
+    assert not database.contacts.update_many_calls
+    assert not database.companies.calls
+
+
+def test_winner_losing_its_conditional_write_keeps_the_current_spoc(monkeypatch):
+    database = spoc_store(monkeypatch, deleted_after_read=("A",))
+    response = set_spoc(2)
+
+    assert response["results"] == {"A": "version_conflict"}
+    assert spocs(database) == ["S"]
+    assert not database.contacts.update_many_calls
+
+
+def test_winner_displaces_the_current_spoc(monkeypatch):
+    database = spoc_store(monkeypatch)
+    response = set_spoc(2)
+
+    assert response["results"] == {"A": "updated"}
+    assert spocs(database) == ["A"]
+    assert database.contacts.update_many_calls == [{"id": {"$in": ["S"]}}]
@@ -0,0 +1,45 @@
+"""A database timeout while authenticating a request is a 503 with Retry-After, not a 401."""
+
+import pytest
+from fastapi.testclient import TestClient
+from pymongo.errors import ExecutionTimeout, WaitQueueTimeoutError
+
+import server
+
+
+class TimingOutCollection:
+    def __init__(self, error):
+        self.error = error
+
+    async def find_one(self, *args, **kwargs):
+        raise self.error
+
+
+class TimingOutDatabase:
+    def __init__(self, error):
+        self.error = error
+
+    def __getattr__(self, name):
+        return TimingOutCollection(self.error)
+
+
+@pytest.mark.parametrize("error", [
+    ExecutionTimeout("operation exceeded time limit", code=50),
+    WaitQueueTimeoutError("timed out while checking out a connection from connection pool"),
+])
+def test_timeout_loading_the_user_is_a_503(monkeypatch, error):
+    monkeypatch.setattr(server, "db", TimingOutDatabase(error))
+    monkeypatch.setattr(server.db_metrics, "timeouts", {})
+    token = server.create_access_token("user-1", "session-1")
+
+    response = TestClient(server.app).get("/api/contacts", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert server.db_metrics.timeouts == {"search": 1, "search /api/contacts": 1}
+
+
+def test_invalid_token_is_still_a_401(monkeypatch):
+    response = TestClient(server.app).get("/api/contacts", headers={"Authorization": "Bearer not-a-token"})
+
+    assert response.status_code == 401
@@ -0,0 +1,40 @@
+"""Converting a lead claims it first, so concurrent conversions create one opportunity."""
+
+import asyncio
+
+import pytest
+
+import server
+
+ADMIN = server.User(id="admin", username="admin", email="admin@example.com", password_hash="x")
+LEAD = {"id": "lead-1", "title": "Website redesign", "expected_value": 250000, "currency": "INR", "status": "New"}
+
+
+def convert():
+    return asyncio.run(server.convert_lead("lead-1", ADMIN))
+
+
+def test_lead_is_claimed_before_the_opportunity_is_created(recording_db):
+    database = recording_db(documents={"leads": LEAD})
+    opportunity = convert()
+
+    claim = database.updates[0]["$set"]
+    assert claim["converted_opportunity_id"] == opportunity["id"]
+    assert database.calls.index(("leads", "find_one_and_update")) < database.calls.index(("opportunities", "insert_one"))
+    assert opportunity["stage"] == "Qualification" and opportunity["amount"] == 250000
+
+
+def test_converted_lead_is_rejected_without_side_effects(recording_db):
+    database = recording_db(find_one_results={"leads": {"id": "lead-1"}})
+    with pytest.raises(server.HTTPException) as error:
+        convert()
+    assert error.value.status_code == 400
+    assert not database.calls_on("opportunities")
+    assert not database.calls_on("pipeline_stage_totals")
+
+
+def test_missing_lead_is_404(recording_db):
+    recording_db()
+    with pytest.raises(server.HTTPException) as error:
+        convert()
+    assert error.value.status_code == 404
@@ -0,0 +1,32 @@
+"""Deleting an opportunity claims it in one conditional write; only that write moves stage totals."""
+
+import asyncio
+
+import pytest
+
+import server
+
+ADMIN = server.User(id="admin", username="admin", email="admin@example.com", password_hash="x")
+OPPORTUNITY = {"id": "opp-1", "name": "Website redesign", "stage": "Qualification", "owner_id": "admin",
+               "amount": 250000, "probability": 20, "currency": "INR", "is_active": True}
+
+
+def delete():
+    return asyncio.run(server.delete_opportunity("opp-1", ADMIN))
+
+
+def test_delete_is_conditional_on_the_opportunity_being_active(recording_db):
+    database = recording_db(documents={"opportunities": OPPORTUNITY})
+    delete()
+
+    assert database.calls_on("opportunities") == ["find_one_and_update"]
+    assert database.updates[0]["$set"]["is_active"] is False
+    assert database.calls_on("pipeline_stage_totals")
+
+
+def test_repeated_delete_leaves_stage_totals_alone(recording_db):
+    database = recording_db()
+    with pytest.raises(server.HTTPException) as error:
+        delete()
+    assert error.value.status_code == 404
+    assert not database.calls_on("pipeline_stage_totals")
@@ -0,0 +1,81 @@
+"""POST /auth/permissions/check answers many checks from the compiled set, versioned by ETag."""
+
+import asyncio
+import json
+
+import pytest
+from starlette.requests import Request
+
+import server
+
+USER = server.User(id="user-1", username="asha", email="asha@example.com", password_hash="x", role_id="role-1")
+ENTRIES = [
+    {"module": "Sales", "menu": "Companies", "permission": "View", "path": "/sales/companies"},
+    {"module": "Sales", "menu": "Companies", "permission": "Edit", "path": "/sales/companies"},
+]
+CHECKS = server.PermissionCheckRequest(checks=[
+    {"module": "Sales", "menu": "Companies", "permission": "Edit"},
+    {"module": "Sales", "menu": "Companies", "permission": "Delete"},
+    {"path": "/sales/companies", "permission": "View"},
+    {"path": "/sales/contacts", "permission": "View"},
+])
+
+
+@pytest.fixture
+def entries(monkeypatch):
+    current = list(ENTRIES)
+
+    async def role_permission_set(role_id):
+        return server.RolePermissionSet(current)
+
+    monkeypatch.setattr(server, "get_role_permission_set", role_permission_set)
+    return current
+
+
+def check(checks=CHECKS, if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    request = Request({"type": "http", "method": "POST", "path": "/api/auth/permissions/check", "headers": headers})
+    return asyncio.run(server.check_current_user_permissions(checks, request, USER))
+
+
+def test_answers_every_check_in_order(entries):
+    response = check()
+    body = json.loads(response.body)
+    assert body["results"] == [True, False, True, False]
+    assert body["version"] == server.RolePermissionSet(ENTRIES).version
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+
+def test_unchanged_permissions_revalidate_with_304(entries):
+    etag = check().headers["ETag"]
+    assert check(if_none_match=etag).status_code == 304
+
+    entries.pop()
+    response = check(if_none_match=etag)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_renamed_menu_path_changes_the_etag(entries):
+    etag = check().headers["ETag"]
+    entries[:] = [{**entry, "path": "/crm/companies"} for entry in entries]
+    response = check(if_none_match=etag)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert json.loads(response.body)["results"] == [True, False, False, False]
+
+
+def test_etag_depends_on_the_checks_asked(entries):
+    fewer = server.PermissionCheckRequest(checks=CHECKS.checks[:1])
+    assert check(fewer).headers["ETag"] != check().headers["ETag"]
+
+
+def test_version_does_not_depend_on_entry_order():
+    assert server.RolePermissionSet(ENTRIES).version == server.RolePermissionSet(ENTRIES[::-1]).version
+
+
+def test_check_needs_a_path_or_a_menu(entries):
+    incomplete = server.PermissionCheckRequest(checks=[{"module": "Sales", "permission": "View"}])
+    with pytest.raises(server.HTTPException) as error:
+        check(incomplete)
+    assert error.value.status_code == 422
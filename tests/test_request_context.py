@@ -0,0 +1,112 @@
+"""Within one request the user, permission sets and reference names are loaded once.
+
+Each test runs inside a RequestContext, as the bind_request_context middleware would set up,
+against the recording database from conftest.
+"""
+
+import asyncio
+
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.requests import Request
+from starlette.responses import Response
+
+import server
+
+# recording_db replaces check_permission; these tests need the real one
+check_permission = server.check_permission
+
+USER_DOCUMENT = {"id": "user-1", "username": "asha", "email": "asha@example.com", "password_hash": "x",
+                 "role_id": "role-1", "is_active": True}
+CREDENTIALS = HTTPAuthorizationCredentials(scheme="Bearer",
+                                           credentials=server.create_access_token("user-1", "session-1"))
+
+
+def in_request(coroutine_function):
+    """Run coroutine_function(context) with a fresh RequestContext bound"""
+    async def run():
+        context = server.RequestContext()
+        token = server.request_context.set(context)
+        try:
+            return context, await coroutine_function(context)
+        finally:
+            server.request_context.reset(token)
+    return asyncio.run(run())
+
+
+def empty_request():
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+
+
+def test_user_is_loaded_once_per_request(recording_db):
+    database = recording_db(find_one_results={"users": USER_DOCUMENT})
+
+    async def load_twice(context):
+        first = await server.get_current_user(empty_request(), CREDENTIALS)
+        second = await server.get_current_user(empty_request(), CREDENTIALS)
+        return first, second
+
+    context, (first, second) = in_request(load_twice)
+    assert first is second
+    assert database.calls_on("users") == ["find_one"]
+    assert context.avoided == {"user": 1}
+
+
+def test_permission_set_is_resolved_once_per_request(recording_db, monkeypatch):
+    database = recording_db()
+    monkeypatch.setattr(server, "role_permission_cache", {})
+    user = server.User(**USER_DOCUMENT)
+
+    async def check_twice(context):
+        return [await check_permission(user, "Sales", "Companies", permission) for permission in ("View", "Edit")]
+
+    context, allowed = in_request(check_twice)
+    assert allowed == [False, False]
+    # Loaded once (one closure lookup), then served from the request for the second check
+    assert database.calls_on("role_permission_closures").count("find_one") == 1
+    assert context.avoided == {"permissions": 1}
+
+
+def test_reference_names_are_shared_across_loaders(recording_db):
+    database = recording_db(find_results={"companies": [{"id": "company-1", "name": "Acme"}]})
+
+    async def load_twice(context):
+        context.user = server.User(**USER_DOCUMENT)
+        first = server.ReferenceLoader()
+        first.want("companies", "company-1")
+        await first.load()
+
+        second = server.ReferenceLoader()
+        second.want("companies", "company-1")
+        second.want("users", "user-1")
+        await second.load()
+        return second
+
+    context, loader = in_request(load_twice)
+    assert loader.name("companies", "company-1") == "Acme"
+    assert loader.name("users", "user-1") == "asha"
+    assert database.calls_on("companies") == ["find"]
+    assert not database.calls_on("users")
+    assert context.avoided == {"references": 2}
+
+
+def test_current_user_as_owner_needs_no_lookup(recording_db):
+    database = recording_db()
+
+    async def validate(context):
+        context.user = server.User(**USER_DOCUMENT)
+        await server.validate_sales_references(owner_user_id="user-1")
+
+    context, _ = in_request(validate)
+    assert not database.calls_on("users")
+    assert context.avoided == {"user": 1}
+
+
+def test_middleware_reports_avoided_lookups():
+    async def call_next(request):
+        server.record_avoided("user")
+        server.record_avoided("references", 2)
+        return Response()
+
+    response = asyncio.run(server.bind_request_context(empty_request(), call_next))
+    assert response.headers["X-Avoided-Queries"] == "references=2, user=1"
+    assert server.request_context.get() is None
@@ -0,0 +1,124 @@
+"""Effective role permissions: own grants plus everything inherited, minus explicit denies.
+
+Closures are computed against the recording database from conftest, seeded with a small role
+tree: staff <- sales <- sales_intern, where the intern is denied Delete.
+"""
+
+import asyncio
+
+import pytest
+
+import server
+
+ROLES = [
+    {"id": "staff"},
+    {"id": "sales", "parent_role_ids": ["staff"]},
+    {"id": "sales_intern", "parent_role_ids": ["sales"]},
+    {"id": "auditor"},
+]
+CATALOG = {
+    "modules": [{"id": "m-sales", "name": "Sales"}],
+    "menus": [{"id": "n-companies", "name": "Companies", "path": "/sales/companies"},
+              {"id": "n-contacts", "name": "Contacts", "path": "/sales/contacts"}],
+    "permissions": [{"id": "p-view", "name": "View"}, {"id": "p-edit", "name": "Edit"},
+                    {"id": "p-delete", "name": "Delete"}],
+}
+ROWS = [
+    {"role_id": "staff", "module_id": "m-sales", "menu_id": "n-companies", "permission_id": "p-view"},
+    {"role_id": "sales", "module_id": "m-sales", "menu_id": "n-companies", "permission_id": "p-edit"},
+    {"role_id": "sales", "module_id": "m-sales", "menu_id": "n-companies", "permission_id": "p-delete"},
+    {"role_id": "sales_intern", "module_id": "m-sales", "menu_id": "n-contacts", "permission_id": "p-view"},
+    {"role_id": "sales_intern", "module_id": "m-sales", "menu_id": "n-companies", "permission_id": "p-delete",
+     "effect": "deny"},
+]
+
+
+@pytest.fixture
+def role_tree(recording_db):
+    return recording_db(find_results={"roles": ROLES, "role_permissions": ROWS, **CATALOG})
+
+
+def granted(closure):
+    return {(menu["menu"], permission) for menu in closure for permission in menu["permissions"]}
+
+
+def test_closure_inherits_transitively_minus_denies(role_tree):
+    closures = asyncio.run(server.recompute_role_permissions())
+    assert granted(closures["staff"]) == {("Companies", "View")}
+    assert granted(closures["sales"]) == {("Companies", "View"), ("Companies", "Edit"), ("Companies", "Delete")}
+    assert granted(closures["sales_intern"]) == {("Companies", "View"), ("Companies", "Edit"), ("Contacts", "View")}
+    assert closures["auditor"] == []
+
+
+def test_closure_is_stored_one_entry_per_menu(role_tree):
+    closures = asyncio.run(server.recompute_role_permissions())
+    assert closures["sales"] == [{"module": "Sales", "menu": "Companies", "path": "/sales/companies",
+                                  "permissions": ["Delete", "Edit", "View"]}]
+    assert role_tree.calls_on("role_permission_closures") == ["delete_many", "bulk_write"]
+
+
+def test_changing_a_base_role_recomputes_its_descendants_in_one_batch(role_tree):
+    closures = asyncio.run(server.recompute_role_permissions(["staff"]))
+    assert set(closures) == {"staff", "sales", "sales_intern"}
+    assert role_tree.calls_on("role_permissions") == ["find"]
+    assert role_tree.calls_on("role_permission_closures") == ["bulk_write"]
+
+
+def test_permission_set_reads_the_stored_closure(recording_db):
+    database = recording_db(find_one_results={"role_permission_closures": {"menus": [
+        {"module": "Sales", "menu": "Companies", "path": "/sales/companies", "permissions": ["Edit", "View"]}
+    ]}})
+    permission_set = asyncio.run(server.compile_role_permissions("sales"))
+    assert permission_set.allows("Sales", "Companies", "Edit")
+    assert not permission_set.allows("Sales", "Companies", "Delete")
+    assert database.calls_on("role_permission_closures") == ["find_one"]
+    assert not database.calls_on("role_permissions")
+
+
+@pytest.mark.parametrize("role_id,parent_role_ids", [
+    ("staff", ["sales_intern"]),
+    ("sales", ["sales"]),
+    ("auditor", ["missing"]),
+])
+def test_parents_must_exist_and_not_form_a_cycle(role_tree, role_id, parent_role_ids):
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(server.validate_parent_roles(role_id, parent_role_ids))
+    assert error.value.status_code == 400
+
+
+def test_any_existing_role_outside_the_subtree_can_be_a_parent(role_tree):
+    asyncio.run(server.validate_parent_roles("auditor", ["sales", "staff"]))
+
+
+ADMIN = server.User(id="admin", username="admin", email="admin@example.com", password_hash="x")
+
+
+def update_role(parent_role_ids):
+    return asyncio.run(server.update_role("sales", server.Role(name="Sales", parent_role_ids=parent_role_ids), ADMIN))
+
+
+@pytest.fixture
+def sales_role(recording_db):
+    return recording_db(documents={"roles": {"id": "sales", "name": "Sales", "parent_role_ids": ["staff"]}},
+                        find_results={"roles": ROLES, "role_permissions": ROWS, **CATALOG})
+
+
+def test_role_update_keeping_its_parents_recomputes_nothing(sales_role):
+    role = update_role(["staff"])
+    assert role.parent_role_ids == ["staff"]
+    assert not sales_role.calls_on("role_permissions")
+    assert not sales_role.calls_on("role_permission_closures")
+
+
+def test_role_update_changing_its_parents_recomputes_the_subtree(sales_role):
+    update_role(["staff", "auditor"])
+    assert sales_role.calls_on("role_permissions") == ["find"]
+    assert sales_role.calls_on("role_permission_closures") == ["bulk_write"]
+
+
+def test_missing_role_with_parents_is_404(recording_db):
+    database = recording_db(find_results={"roles": ROLES})
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(server.update_role("gone", server.Role(name="Gone", parent_role_ids=["staff"]), ADMIN))
+    assert error.value.status_code == 404
+    assert database.calls_on("roles") == ["find"]
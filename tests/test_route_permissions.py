@@ -0,0 +1,144 @@
+"""Every /api route has a declared access rule, and authorize_route enforces exactly that rule.
+
+The tests enumerate the routes registered on the app, so a new endpoint without an entry in
+ROUTE_PERMISSIONS (or an entry whose route was removed) fails here as well as at import.
+"""
+
+import asyncio
+
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.requests import Request
+
+import server
+
+# Seeded by initialize_rbac_system
+MODULE_MENUS = {
+    "User Management": {"Users", "Roles", "Departments", "Designations", "Permissions", "Modules", "Menus",
+                        "Role Permissions"},
+    "Sales": {"Companies", "Contacts", "Channel Partners", "Leads", "Opportunities"},
+    "System": {"Activity Logs"},
+}
+PERMISSIONS = {"View", "Add", "Edit", "Delete", "Export"}
+
+API_ROUTES = [
+    (route, method)
+    for route in server.app.routes if isinstance(route, APIRoute) and route.path.startswith("/api/")
+    for method in sorted(route.methods)
+]
+ROUTE_IDS = [f"{method} {route.path}" for route, method in API_ROUTES]
+PROTECTED_ROUTES = [(route, method) for route, method in API_ROUTES
+                    if route.access_rules[method] not in (server.PUBLIC, server.AUTHENTICATED)]
+
+USER = server.User(id="user-id", username="someone", email="someone@example.com", password_hash="x", role_id="role-1")
+TOKEN = HTTPAuthorizationCredentials(scheme="Bearer", credentials="token")
+
+
+def alternatives(permission):
+    return (permission,) if isinstance(permission, str) else permission
+
+
+def every_grant():
+    return [(module, menu, permission)
+            for module, menus in MODULE_MENUS.items() for menu in menus for permission in PERMISSIONS]
+
+
+def request_for(route, method):
+    return Request({"type": "http", "method": method, "path": route.path, "headers": [], "route": route})
+
+
+@pytest.fixture
+def grants(monkeypatch):
+    """Authorize as USER whose role holds the given (module, menu, permission) grants"""
+    def install(granted):
+        permission_set = server.RolePermissionSet([
+            {"module": module, "menu": menu, "permission": permission, "path": "/"}
+            for module, menu, permission in granted
+        ])
+
+        async def current_user(request, credentials):
+            return USER
+
+        async def role_permission_set(role_id):
+            return permission_set
+
+        monkeypatch.setattr(server, "get_current_user", current_user)
+        monkeypatch.setattr(server, "get_role_permission_set", role_permission_set)
+    return install
+
+
+def authorize(route, method, credentials=TOKEN):
+    return asyncio.run(server.authorize_route(request_for(route, method), credentials))
+
+
+def test_every_rule_belongs_to_a_route():
+    declared = set(server.ROUTE_PERMISSIONS)
+    registered = {(method, route.path.removeprefix("/api")) for route, method in API_ROUTES}
+    assert declared == registered
+
+
+@pytest.mark.parametrize("route,method", API_ROUTES, ids=ROUTE_IDS)
+def test_rule_names_a_seeded_menu_and_permission(route, method):
+    rule = route.access_rules[method]
+    if rule in (server.PUBLIC, server.AUTHENTICATED):
+        return
+    module, menu, permission = rule
+    assert menu in MODULE_MENUS[module]
+    assert set(alternatives(permission)) <= PERMISSIONS
+
+
+@pytest.mark.parametrize("route,method", PROTECTED_ROUTES,
+                         ids=[f"{method} {route.path}" for route, method in PROTECTED_ROUTES])
+def test_route_requires_exactly_its_permission(grants, route, method):
+    module, menu, permission = route.access_rules[method]
+    required = {(module, menu, p) for p in alternatives(permission)}
+
+    grants([grant for grant in every_grant() if grant not in required])
+    with pytest.raises(server.HTTPException) as error:
+        authorize(route, method)
+    assert error.value.status_code == 403
+
+    for grant in required:
+        grants([grant])
+        authorize(route, method)
+
+
+@pytest.mark.parametrize("route,method", API_ROUTES, ids=ROUTE_IDS)
+def test_only_public_routes_skip_authentication(grants, route, method):
+    grants([])
+    if route.access_rules[method] == server.PUBLIC:
+        authorize(route, method, credentials=None)
+        return
+    with pytest.raises(server.HTTPException) as error:
+        authorize(route, method, credentials=None)
+    assert error.value.status_code == 403
+
+
+def test_authenticated_routes_need_no_grants(grants):
+    grants([])
+    for route, method in API_ROUTES:
+        if route.access_rules[method] == server.AUTHENTICATED:
+            authorize(route, method)
+
+
+def test_user_without_role_is_denied(monkeypatch, grants):
+    grants(every_grant())
+    roleless = USER.copy(update={"role_id": None})
+
+    async def current_user(request, credentials):
+        return roleless
+
+    monkeypatch.setattr(server, "get_current_user", current_user)
+    route, method = PROTECTED_ROUTES[0]
+    with pytest.raises(server.HTTPException) as error:
+        authorize(route, method)
+    assert error.value.status_code == 403
+
+
+def test_unlisted_route_fails_registration():
+    router = server.APIRouter(prefix="/api", route_class=server.DatabaseBudgetRoute)
+    with pytest.raises(RuntimeError):
+        @router.get("/not-in-the-table")
+        async def not_in_the_table():
+            return {}
@@ -0,0 +1,48 @@
+"""The sidebar lists exactly the menus the role's effective permission set can View."""
+
+import asyncio
+
+import server
+
+USER = server.User(id="user-1", username="asha", email="asha@example.com", password_hash="x",
+                   role_id="sales_intern")
+ROLES = [{"id": "sales"}, {"id": "sales_intern", "parent_role_ids": ["sales"]}]
+MENUS = [
+    {"id": "n-companies", "name": "Companies", "path": "/sales/companies", "module_id": "m-sales", "order_index": 1},
+    {"id": "n-contacts", "name": "Contacts", "path": "/sales/contacts", "module_id": "m-sales", "order_index": 2},
+]
+
+
+def sidebar_for(recording_db, monkeypatch, rows):
+    database = recording_db(find_results={
+        "roles": ROLES, "role_permissions": rows, "menus": MENUS,
+        "modules": [{"id": "m-sales", "name": "Sales"}], "permissions": [{"id": "p-view", "name": "View"}]
+    })
+    closures = asyncio.run(server.recompute_role_permissions())
+    database.find_one_results["role_permission_closures"] = {"menus": closures["sales_intern"]}
+    monkeypatch.setattr(server, "role_permission_cache", {})
+    sidebar = asyncio.run(server.get_sidebar_navigation(USER))
+    return database, [menu["path"] for module in sidebar["modules"] for menu in module["menus"]]
+
+
+def test_sidebar_shows_inherited_menus_and_hides_denied_ones(recording_db, monkeypatch):
+    rows = [
+        # View on Companies comes only from the parent role
+        {"role_id": "sales", "module_id": "m-sales", "menu_id": "n-companies", "permission_id": "p-view"},
+        {"role_id": "sales", "module_id": "m-sales", "menu_id": "n-contacts", "permission_id": "p-view"},
+        {"role_id": "sales_intern", "module_id": "m-sales", "menu_id": "n-contacts", "permission_id": "p-view",
+         "effect": "deny"},
+    ]
+    database, paths = sidebar_for(recording_db, monkeypatch, rows)
+    assert paths == ["/sales/companies"]
+
+
+def test_sidebar_is_built_in_a_fixed_number_of_queries(recording_db, monkeypatch):
+    rows = [{"role_id": "sales_intern", "module_id": "m-sales", "menu_id": menu["id"], "permission_id": "p-view"}
+            for menu in MENUS]
+    database, paths = sidebar_for(recording_db, monkeypatch, rows)
+    assert paths == ["/sales/companies", "/sales/contacts"]
+    database.calls.clear()
+    monkeypatch.setattr(server, "role_permission_cache", {})
+    asyncio.run(server.get_sidebar_navigation(USER))
+    assert database.calls == [("role_permission_closures", "find_one"), ("modules", "find"), ("menus", "find")]
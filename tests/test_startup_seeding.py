@@ -0,0 +1,43 @@
+"""The startup_seed lease is renewed for as long as seeding runs, so no second worker seeds."""
+
+import asyncio
+
+import server
+
+
+def test_seed_lease_is_renewed_until_seeding_finishes(recording_db, monkeypatch):
+    recording_db()
+    leases = []
+
+    async def acquire_lease(name, ttl_seconds):
+        leases.append(name)
+        return True
+
+    async def release_lease(name):
+        leases.append(f"release {name}")
+
+    async def slow_seed():
+        await asyncio.sleep(0.1)
+
+    async def no_op():
+        return None
+
+    monkeypatch.setattr(server, "acquire_lease", acquire_lease)
+    monkeypatch.setattr(server, "release_lease", release_lease)
+    monkeypatch.setattr(server, "initialize_rbac_system", slow_seed)
+    monkeypatch.setattr(server, "initialize_company_master_data", no_op)
+    monkeypatch.setattr(server, "recompute_role_permissions", no_op)
+    monkeypatch.setattr(server, "STARTUP_SEED_LEASE_SECONDS", 0.03)
+
+    async def seed_then_idle():
+        seeded = await server.run_startup_seeding()
+        renewals = len(leases)
+        await asyncio.sleep(0.05)
+        return seeded, renewals
+
+    seeded, renewals = asyncio.run(seed_then_idle())
+    assert seeded
+    # Acquired once, renewed while seeding ran, then released, and never renewed afterwards
+    assert leases[0] == "startup_seed" and leases.count("startup_seed") >= 3
+    assert leases[-1] == "release startup_seed"
+    assert len(leases) == renewals
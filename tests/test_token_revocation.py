@@ -0,0 +1,123 @@
+"""Revoked tokens are denied from the worker's in-memory denylist, and refresh tokens rotate.
+
+Token ids are checked without MongoDB; revocation and refresh run against the recording database
+from conftest.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def denylist(monkeypatch):
+    fresh = server.TokenDenylist(capacity=100)
+    monkeypatch.setattr(server, "token_denylist", fresh)
+    return fresh
+
+
+def claims(token, token_type="access"):
+    return server.decode_jwt_token(token, token_type)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = server.BloomFilter(1000)
+    keys = [f"token-{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 50
+
+
+def test_denylist_confirms_bloom_hits_and_forgets_expired_ids(denylist):
+    now = time.time()
+    denylist.add("revoked", now + 60)
+    denylist.add("expired", now - 1)
+    assert denylist.is_revoked(None, "revoked")
+    assert not denylist.is_revoked("unknown", None)
+
+    denylist.prune(now)
+    assert denylist.is_revoked("revoked")
+    assert not denylist.is_revoked("expired")
+
+
+def test_denylist_grows_past_its_capacity(denylist):
+    ids = [f"token-{i}" for i in range(250)]
+    for token_id in ids:
+        denylist.add(token_id, time.time() + 60)
+    assert denylist.capacity >= 250
+    assert all(denylist.is_revoked(token_id) for token_id in ids)
+
+
+def test_revoked_session_or_token_id_is_denied(denylist):
+    token = server.create_access_token("user-1", "session-1")
+    assert claims(token)["user_id"] == "user-1"
+
+    denylist.add(claims(token)["jti"], time.time() + 60)
+    with pytest.raises(server.HTTPException) as error:
+        claims(token)
+    assert error.value.detail == "Token revoked"
+
+    other = server.create_access_token("user-1", "session-1")
+    denylist.add("session-1", time.time() + 60)
+    with pytest.raises(server.HTTPException):
+        claims(other)
+
+
+def test_refresh_token_is_not_a_bearer_token(denylist):
+    refresh_token = server.create_refresh_token("user-1", "session-1", "refresh-1")
+    with pytest.raises(server.HTTPException) as error:
+        claims(refresh_token)
+    assert error.value.status_code == 401
+    assert claims(refresh_token, "refresh")["jti"] == "refresh-1"
+
+
+def test_revoking_sessions_denies_their_tokens_at_once(recording_db, denylist):
+    database = recording_db(find_results={"auth_sessions": [{"id": "session-1", "user_id": "user-1"}]})
+    token = server.create_access_token("user-1", "session-1")
+
+    assert asyncio.run(server.revoke_sessions({"user_id": "user-1"})) == 1
+    assert database.calls_on("auth_sessions") == ["find", "update_many"]
+    assert database.calls_on("revoked_tokens") == ["insert_many"]
+    with pytest.raises(server.HTTPException):
+        claims(token)
+
+
+def test_refresh_rotates_the_refresh_token(recording_db, denylist):
+    database = recording_db(documents={"auth_sessions": {"id": "session-1"}},
+                            find_one_results={"users": {"id": "user-1"}})
+    refresh_token = server.create_refresh_token("user-1", "session-1", "refresh-1")
+
+    tokens = asyncio.run(server.refresh_tokens(server.RefreshRequest(refresh_token=refresh_token)))
+    new_jti = database.updates[0]["$set"]["refresh_jti"]
+    assert new_jti != "refresh-1"
+    assert claims(tokens.refresh_token, "refresh")["jti"] == new_jti
+    assert claims(tokens.access_token)["sid"] == "session-1"
+
+
+def test_reused_refresh_token_ends_the_session(recording_db, denylist):
+    # find_one_and_update matches nothing: the token was already rotated out
+    database = recording_db(find_results={"auth_sessions": [{"id": "session-1", "user_id": "user-1"}]})
+    refresh_token = server.create_refresh_token("user-1", "session-1", "refresh-1")
+
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(server.refresh_tokens(server.RefreshRequest(refresh_token=refresh_token)))
+    assert error.value.status_code == 401
+    assert "update_many" in database.calls_on("auth_sessions")
+    assert denylist.is_revoked("session-1")
+
+
+def test_sync_pulls_ids_revoked_by_other_workers(recording_db, denylist):
+    revoked_at = datetime.utcnow()
+    recording_db(find_results={"revoked_tokens": [
+        {"jti": "session-2", "revoked_at": revoked_at, "expires_at": revoked_at + timedelta(minutes=15)}
+    ]})
+
+    asyncio.run(server.sync_token_denylist())
+    assert denylist.is_revoked("session-2")
+    assert denylist.synced_through == revoked_at
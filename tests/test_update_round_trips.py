@@ -0,0 +1,254 @@
+"""Update handlers write and read back their document in a single find_one_and_update,
+and merge patches only write, validate and rescore what they change.
+
+The handlers run against a recording stand-in for the Motor database, so the test counts
+the calls each handler makes on its own collection without a MongoDB server.
+"""
+
+import asyncio
+
+import pytest
+
+import server
+
+
+ADMIN = server.User(id="admin-id", username="admin", email="admin@example.com", password_hash="x")
+
+BASE_DOCUMENT = {"id": "doc-1", "name": "Existing", "is_active": True,
+                 "created_at": "2024-01-01T00:00:00+00:00", "updated_at": "2024-01-01T00:00:00+00:00"}
+
+
+def assert_single_round_trip(database, collection, reads_before=0):
+    calls = database.calls_on(collection)
+    assert calls.count("find_one_and_update") == 1, calls
+    assert "update_one" not in calls, calls
+    # Only validation reads may precede the write; nothing reads the document back
+    assert calls.index("find_one_and_update") == reads_before, calls
+    assert calls[-1] == "find_one_and_update", calls
+
+
+RBAC_UPDATES = [
+    ("roles", lambda: server.update_role("doc-1", server.Role(name="Renamed"), ADMIN)),
+    ("departments", lambda: server.update_department("doc-1", server.Department(name="Renamed"), ADMIN)),
+    ("designations", lambda: server.update_designation("doc-1", server.Designation(name="Renamed"), ADMIN)),
+    ("permissions", lambda: server.update_permission("doc-1", server.Permission(name="Renamed"), ADMIN)),
+    ("modules", lambda: server.update_module("doc-1", server.Module(name="Renamed"), ADMIN)),
+    ("menus", lambda: server.update_menu(
+        "doc-1", server.Menu(name="Renamed", path="/renamed", module_id="module-1"), ADMIN)),
+    ("role_permissions", lambda: server.update_role_permission("doc-1", server.RolePermission(
+        role_id="role-1", module_id="module-1", menu_id="menu-1", permission_id="perm-1"), ADMIN)),
+]
+
+
+@pytest.mark.parametrize("collection,update", RBAC_UPDATES, ids=[c for c, _ in RBAC_UPDATES])
+def test_rbac_update_is_one_round_trip(recording_db, collection, update):
+    document = {**BASE_DOCUMENT, "path": "/renamed", "module_id": "module-1", "role_id": "role-1",
+                "menu_id": "menu-1", "permission_id": "perm-1"}
+    database = recording_db(documents={collection: document})
+    asyncio.run(update())
+    assert_single_round_trip(database, collection)
+
+
+@pytest.mark.parametrize("collection,update", RBAC_UPDATES, ids=[c for c, _ in RBAC_UPDATES])
+def test_rbac_update_of_missing_document_is_404(recording_db, collection, update):
+    database = recording_db()
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(update())
+    assert error.value.status_code == 404
+    assert database.calls_on(collection) == ["find_one_and_update"]
+
+
+def test_update_user_is_one_round_trip(recording_db):
+    database = recording_db(documents={"users": {**BASE_DOCUMENT, "username": "someone", "password_hash": "x"}})
+    result = asyncio.run(server.update_user("doc-1", server.UserUpdate(department_id="dept-2"), ADMIN))
+    assert "password_hash" not in result
+    assert_single_round_trip(database, "users")
+
+
+def test_update_company_is_one_round_trip(recording_db):
+    company = {**BASE_DOCUMENT, "ancestor_ids": [], "documents": [], "active_status": True}
+    database = recording_db(documents={"companies": company})
+    payload = server.CompanyCreate(
+        company_name="Renamed Company", domestic_international="Domestic", gst_number="22AAAAA0000A1Z5",
+        company_type_id="t", account_type_id="a", region_id="r", business_type_id="b", industry_id="i",
+        sub_industry_id="s", employee_count=10, address="1 Long Enough Street", country_id="c",
+        state_id="st", city_id="ci", annual_revenue=1000, revenue_currency="INR"
+    )
+    result = asyncio.run(server.update_company(
+        "doc-1", payload, response=server.Response(), expected_version=None, if_match=None, current_user=ADMIN
+    ))
+    assert result["name"] == "Renamed Company"
+    # The duplicate check is the only read ahead of the write
+    assert_single_round_trip(database, "companies", reads_before=1)
+
+
+def test_update_contact_is_one_round_trip(recording_db):
+    contact = {**BASE_DOCUMENT, "company_id": "company-1", "first_name": "Asha", "last_name": "Old",
+               "email": "asha@example.com", "spoc": False, "decision_maker": False}
+    database = recording_db(documents={"contacts": {**contact, "last_name": "New"}},
+                            find_one_results={"contacts": contact})
+    result = asyncio.run(server.update_contact(
+        "doc-1", server.ContactUpdate(last_name="New"), response=server.Response(), force_spoc_update=False,
+        expected_version=None, if_match=None, current_user=ADMIN
+    ))
+    assert result["last_name"] == "New"
+    # The pre-read feeds the duplicate and SPOC checks; the result comes from the write
+    assert_single_round_trip(database, "contacts", reads_before=1)
+
+
+def test_stale_contact_version_is_412_without_writing(recording_db):
+    contact = {**BASE_DOCUMENT, "company_id": "company-1", "first_name": "Asha", "email": "asha@example.com",
+               "version": 3}
+    database = recording_db(find_one_results={"contacts": contact})
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(server.update_contact(
+            "doc-1", server.ContactUpdate(last_name="New"), response=server.Response(), force_spoc_update=False,
+            expected_version=None, if_match='"2"', current_user=ADMIN
+        ))
+    assert error.value.status_code == 412
+    assert error.value.detail["current_version"] == 3
+    assert database.calls_on("contacts") == ["find_one"]
+
+
+def test_conditional_write_that_matches_is_one_round_trip(recording_db):
+    database = recording_db(documents={"companies": {**BASE_DOCUMENT, "version": 5}})
+    asyncio.run(server.update_one_and_fetch(
+        database.companies, {"id": "doc-1"}, {"$inc": {"version": 1}}, "Company not found", expected_version=4
+    ))
+    assert database.calls_on("companies") == ["find_one_and_update"]
+
+
+def test_conditional_write_conflict_is_412(recording_db):
+    database = recording_db(find_one_results={"companies": {"version": 5}})
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(server.update_one_and_fetch(
+            database.companies, {"id": "doc-1"}, {"$inc": {"version": 1}}, "Company not found", expected_version=4
+        ))
+    assert error.value.status_code == 412
+    # The extra read only happens on the failure path, to tell a conflict from a missing document
+    assert database.calls_on("companies") == ["find_one_and_update", "find_one"]
+
+
+@pytest.mark.parametrize("if_match,expected_version,version", [
+    (None, None, None),
+    ("*", None, None),
+    ('"7"', None, 7),
+    ('W/"7"', None, 7),
+    (None, 7, 7),
+    ('"7"', 7, 7),
+])
+def test_parse_expected_version(if_match, expected_version, version):
+    assert server.parse_expected_version(if_match, expected_version) == version
+
+
+@pytest.mark.parametrize("if_match,expected_version", [('"abc"', None), ('"7"', 6)])
+def test_parse_expected_version_rejects_bad_input(if_match, expected_version):
+    with pytest.raises(server.HTTPException) as error:
+        server.parse_expected_version(if_match, expected_version)
+    assert error.value.status_code == 400
+
+
+COMPANY_PAYLOAD = dict(
+    company_name="Patched Company", domestic_international="Domestic", gst_number="22AAAAA0000A1Z5",
+    company_type_id="t", account_type_id="a", region_id="r", business_type_id="b", industry_id="i",
+    sub_industry_id="s", employee_count=10, address="1 Long Enough Street", country_id="c",
+    state_id="st", city_id="ci", annual_revenue=1000, revenue_currency="INR", website="https://old.example.com"
+)
+STORED_COMPANY = {**BASE_DOCUMENT, **server.map_company_create(server.CompanyCreate(**COMPANY_PAYLOAD)),
+                  "ancestor_ids": [], "depth": 0, "score": 10, "lead_status": "cold", "version": 2}
+STORED_CONTACT = {**BASE_DOCUMENT, "company_id": "company-1", "salutation": "Ms.", "first_name": "Asha",
+                  "middle_name": None, "last_name": "Old", "email": "asha@example.com", "primary_phone": "9876543210",
+                  "designation_id": None, "decision_maker": False, "spoc": False, "address": None, "country_id": None,
+                  "city_id": None, "comments": None, "option": None, "is_deleted": False, "version": 2}
+
+
+def patch_company(patch, **kwargs):
+    return server.patch_company("doc-1", response=server.Response(), patch=patch, expected_version=None,
+                                if_match=kwargs.get("if_match"), current_user=ADMIN)
+
+
+def patch_contact(patch):
+    return server.patch_contact("doc-1", response=server.Response(), patch=patch, force_spoc_update=False,
+                                expected_version=None, if_match=None, current_user=ADMIN)
+
+
+def test_noop_company_patch_is_not_written(recording_db):
+    database = recording_db(find_one_results={"companies": STORED_COMPANY})
+    result = asyncio.run(patch_company({"website": "https://old.example.com", "annual_revenue": 1000}))
+    assert result["version"] == 2
+    assert database.calls_on("companies") == ["find_one"]
+
+
+def test_company_website_patch_skips_checks_and_scoring(recording_db):
+    database = recording_db(find_one_results={"companies": STORED_COMPANY},
+                            documents={"companies": {**STORED_COMPANY, "website": "https://new.example.com"}})
+    asyncio.run(patch_company({"website": "https://new.example.com"}))
+    assert database.calls_on("companies") == ["find_one", "find_one_and_update"]
+    assert not database.calls_on("industries") and not database.calls_on("sub_industries")
+    update = database.updates[0]
+    assert set(update["$set"]) == {"website", "updated_at"}
+    assert "$unset" not in update
+
+
+def test_company_patch_null_unsets_optional_field(recording_db):
+    database = recording_db(find_one_results={"companies": STORED_COMPANY}, documents={"companies": STORED_COMPANY})
+    asyncio.run(patch_company({"website": None}))
+    assert database.updates[0]["$unset"] == {"website": ""}
+
+
+def test_company_revenue_patch_rescores(recording_db):
+    database = recording_db(find_one_results={"companies": STORED_COMPANY}, documents={"companies": STORED_COMPANY})
+    asyncio.run(patch_company({"annual_revenue": 20000000}))
+    assert database.calls_on("industries") == ["find_one"]
+    assert database.calls_on("sub_industries") == ["find_one"]
+    assert database.calls_on("companies") == ["find_one", "find_one_and_update"]
+    # Unknown industry (0) + no sub-industry (0) + 10M+ revenue (25) + under 50 employees (5)
+    assert database.updates[0]["$set"]["score"] == 30
+
+
+def test_company_patch_rejects_unknown_fields_and_stale_versions(recording_db):
+    database = recording_db(find_one_results={"companies": STORED_COMPANY})
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(patch_company({"name": "Not A CompanyCreate Field"}))
+    assert error.value.status_code == 400
+    with pytest.raises(server.HTTPException) as error:
+        asyncio.run(patch_company({"website": "https://new.example.com"}, if_match='"1"'))
+    assert error.value.status_code == 412
+    assert "find_one_and_update" not in database.calls_on("companies")
+
+
+def test_noop_contact_patch_is_not_written(recording_db):
+    database = recording_db(find_one_results={"contacts": STORED_CONTACT})
+    asyncio.run(patch_contact({"last_name": "Old", "spoc": False}))
+    assert database.calls_on("contacts") == ["find_one"]
+
+
+def test_contact_patch_writes_only_changed_fields(recording_db):
+    database = recording_db(find_one_results={"contacts": STORED_CONTACT},
+                            documents={"contacts": {**STORED_CONTACT, "last_name": "New", "version": 3}})
+    result = asyncio.run(patch_contact({"last_name": "New", "comments": None}))
+    assert result["last_name"] == "New"
+    # No email, company, reference or duplicate checks for a last name change
+    assert database.calls_on("contacts") == ["find_one", "find_one_and_update"]
+    assert not database.calls_on("companies")
+    assert set(database.updates[0]["$set"]) == {"last_name", "updated_at"}
+
+
+def test_contact_patch_null_unsets_optional_field(recording_db):
+    stored = {**STORED_CONTACT, "comments": "Prefers email"}
+    database = recording_db(find_one_results={"contacts": stored}, documents={"contacts": STORED_CONTACT})
+    asyncio.run(patch_contact({"comments": None}))
+    assert database.updates[0]["$unset"] == {"comments": ""}
+    assert set(database.updates[0]["$set"]) == {"updated_at"}
+
+
+@pytest.mark.parametrize("target,patch,result", [
+    ({"a": "b"}, {"a": "c"}, {"a": "c"}),
+    ({"a": "b"}, {"b": "c"}, {"a": "b", "b": "c"}),
+    ({"a": "b"}, {"a": None}, {}),
+    ({"a": ["b"]}, {"a": "c"}, {"a": "c"}),
+    ({"a": {"b": "c"}}, {"a": {"b": "d", "c": None}}, {"a": {"b": "d"}}),
+    ({"a": [{"b": "c"}]}, {"a": [1]}, {"a": [1]}),
+])
+def test_apply_merge_patch(target, patch, result):
+    assert server.apply_merge_patch(target, patch) == result